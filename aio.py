@@ -0,0 +1,390 @@
+import asyncio
+import os
+import socket
+import time
+from proto import (
+    MAX_RETRIES, PACKET_SIZE, HEADER_SIZE, Packet, PacketType, clamp_payload,
+    create_request_packet, create_error_packet, encode_into, ack_payload
+)
+from errorsim import ErrorSim
+from pmtu import choose_payload, set_receive_buffer
+from compress import FrameWriter
+from filehash import HashWriter, verify, accepted, describe
+from filesource import CACHE_BYTES
+from sessions import SessionMux
+
+# asyncio transport: ใช้ state machine ของ session เดิม (SWSession/GBNSession/SRSession)
+# แต่ขับเคลื่อนด้วย DatagramProtocol + TimerHandle แทนการ block ที่ recvfrom/settimeout
+#   server: await serve(port, 'gbn')  หรือ  await send_file(port, filename)
+#   client: await fetch_file(host, port, filename, save_as, 'gbn')
+
+PROTOCOLS = ('sw', 'gbn', 'sr')
+IDLE_TIMEOUT = 60.0      # server: ไม่มี session และไม่มี request ใหม่นานเท่านี้ → ปิด
+CLIENT_TIMEOUT = 10.0    # client: ไม่ได้รับอะไรจาก server นานเท่านี้ → ถือว่าล้มเหลว
+REQUEST_RETRY = 1.0      # client: ส่ง REQUEST ซ้ำถ้ายังไม่ได้ packet แรก
+ACK_DELAY = 0.01         # client: delayed ACK รอได้นานสุดเท่านี้ก่อนส่ง cumulative ACK
+
+def session_factory(protocol='gbn', **opts):
+    # คืน factory(mux, client, request_pkt) ของ server ตามโปรโตคอล (import ตอนใช้เพื่อเลี่ยง import วน)
+    if protocol == 'sw':
+        import server
+        if 'cache_mb' in opts:
+            server.set_cache_size(opts['cache_mb'])
+        return server.open_session
+    if protocol == 'gbn':
+        from server_gbn import GBNServer
+        return GBNServer(0, cc=opts.get('cc', 'fixed'), window=opts.get('window'),
+                         cache_mb=opts.get('cache_mb', CACHE_BYTES >> 20), pace=opts.get('pace')).open_session
+    if protocol == 'sr':
+        from server_sr import SRServer, WINDOW_SIZE
+        return SRServer(0, window=opts.get('window') or WINDOW_SIZE,
+                        cache_mb=opts.get('cache_mb', CACHE_BYTES >> 20), pace=opts.get('pace')).open_session
+    raise ValueError(f"Unknown protocol: {protocol}")
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    # เทียบเท่า SessionMux แต่ไม่มี loop ของตัวเอง: datagram เข้ามาทาง datagram_received
+    # และแต่ละ session มี TimerHandle ของตัวเองตาม next_deadline()
+    def __init__(self, sim, factory, idle_timeout=IDLE_TIMEOUT, max_sessions=None):
+        self.sim = sim
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions   # ปิด server หลังจบครบจำนวนนี้ (None = ไม่จำกัด)
+        self.sessions = {}   # client address -> session
+        self.timers = {}     # client address -> TimerHandle
+        self.transport = None
+        self.loop = asyncio.get_running_loop()
+        self.closed = self.loop.create_future()
+        self._idle = None
+        self._pkt = Packet(PacketType.ACK, 0)
+
+        # สถิติ
+        self.completed = 0
+        self.succeeded = 0
+        self.max_concurrent = 0
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.first_request = None
+        self.last_done = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._arm_idle()
+
+    def connection_lost(self, exc):
+        for handle in self.timers.values():
+            handle.cancel()
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+        if self._idle is not None:
+            self._idle.cancel()
+        if not self.closed.done():
+            self.closed.set_result(self.completed)
+
+    def error_received(self, exc):
+        pass  # เช่น ICMP port unreachable จาก client ที่ปิดไปแล้ว
+
+    # --- interface เดียวกับ SessionMux ที่ session เรียกใช้ ---
+    def send(self, raw, client, seq=None):
+        simd = self.sim.process(raw, seq)
+        if simd is None:
+            return False
+        self.transport.sendto(simd, client)
+        self.sent_packets += 1
+        self.sent_bytes += len(simd)
+        return True
+
+    def flush(self):
+        pass   # transport.sendto ส่งทันทีอยู่แล้ว ไม่มีคิว batch
+
+    def send_direct(self, raw, client):
+        self.transport.sendto(raw, client)
+
+    def send_error(self, client, msg):
+        self.send_direct(create_error_packet(msg).to_bytes(), client)
+
+    def datagram_received(self, data, addr):
+        pkt = self._pkt
+        if not pkt.load(data):
+            return
+        if pkt.type == PacketType.PROBE:
+            self.transport.sendto(Packet(PacketType.PROBE, pkt.seq_num).to_bytes(), addr)
+            return
+        session = self.sessions.get(addr)
+        if session is not None:
+            session.on_packet(pkt)
+        elif pkt.type == PacketType.REQUEST:
+            session = self.factory(self, addr, pkt)
+            if session is None:
+                return
+            self.sessions[addr] = session
+            self.max_concurrent = max(self.max_concurrent, len(self.sessions))
+            if self.first_request is None:
+                self.first_request = time.time()
+            if self._idle is not None:
+                self._idle.cancel()
+                self._idle = None
+            session.start()
+        else:
+            return
+        self._reschedule(addr)
+
+    def _fire(self, addr):
+        self.timers.pop(addr, None)
+        session = self.sessions.get(addr)
+        if session is not None:
+            session.on_timer(time.time())
+            self._reschedule(addr)
+
+    def _reschedule(self, addr):
+        # ตั้ง TimerHandle ของ session ใหม่ตาม deadline ล่าสุด (หรือปิด session ที่จบแล้ว)
+        handle = self.timers.pop(addr, None)
+        if handle is not None:
+            handle.cancel()
+        session = self.sessions[addr]
+        if session.done:
+            session.close()
+            del self.sessions[addr]
+            self.completed += 1
+            self.succeeded += session.ok
+            self.last_done = time.time()
+            if self.max_sessions is not None and self.completed >= self.max_sessions:
+                self.transport.close()
+            elif not self.sessions:
+                self._arm_idle()
+            return
+        deadline = session.next_deadline()
+        if deadline is not None:
+            self.timers[addr] = self.loop.call_later(max(0.0, deadline - time.time()), self._fire, addr)
+
+    stats = SessionMux.stats   # ตัวนับชื่อเดียวกับ SessionMux
+
+    def _arm_idle(self):
+        if self.idle_timeout is not None:
+            self._idle = self.loop.call_later(self.idle_timeout, self.transport.close)
+
+async def serve(port, protocol='gbn', loss_rate=0.0, corrupt_rate=0.0, host='0.0.0.0',
+                idle_timeout=IDLE_TIMEOUT, max_sessions=None, sock=None, **opts):
+    # รัน server แบบ asyncio จนกว่าจะ idle (หรือจบครบ max_sessions) คืนค่า ServerProtocol (มีสถิติ)
+    # sock: socket ที่ bind ไว้แล้ว (เช่น SO_REUSEPORT ของ workers.py) แทนการ bind port เอง
+    loop = asyncio.get_running_loop()
+    sim = ErrorSim(loss_rate, corrupt_rate)
+    factory = session_factory(protocol, **opts)
+    addr = {'sock': sock} if sock is not None else {'local_addr': (host, port)}
+    transport, proto = await loop.create_datagram_endpoint(
+        lambda: ServerProtocol(sim, factory, idle_timeout, max_sessions), **addr)
+    try:
+        await proto.closed
+    finally:
+        transport.close()
+    return proto
+
+async def send_file(port, protocol='gbn', loss_rate=0.0, corrupt_rate=0.0, host='0.0.0.0',
+                    idle_timeout=IDLE_TIMEOUT, **opts):
+    # ส่งไฟล์ให้ client รายแรกที่ขอเข้ามา แล้วปิด (คืน True ถ้าส่งครบ)
+    proto = await serve(port, protocol, loss_rate, corrupt_rate, host,
+                        idle_timeout=idle_timeout, max_sessions=1, **opts)
+    return proto.succeeded > 0
+
+class ReceiverProtocol(asyncio.DatagramProtocol):
+    # ฝั่งรับแบบเรียงลำดับ (ใช้ได้ทั้ง Stop-and-Wait และ GBN): ACK แบบ cumulative (seq ล่าสุดที่รับครบ)
+    # ack_every/ack_delay: delayed ACK สำหรับ GBN (ดู client_gbn.py) — Stop-and-Wait ต้องใช้ ack_every=1
+    def __init__(self, server, filename, out, rwnd=None, timeout=CLIENT_TIMEOUT, payload=PACKET_SIZE,
+                 ack_every=1, ack_delay=ACK_DELAY, compress=None):
+        self.server = server
+        self.filename = filename
+        self.payload = payload
+        self.out = out
+        self.timeout = timeout
+        self.transport = None
+        self.loop = asyncio.get_running_loop()
+        self.done = self.loop.create_future()
+        self.expected = 0
+        self._pkt = Packet(PacketType.DATA, 0)
+        self._ack_buf = bytearray(64)
+        self._ack_view = memoryview(self._ack_buf)
+        self.rwnd = rwnd
+        self._ack_data = ack_payload(rwnd)
+        self._request_tries = 0
+        self._request_timer = None
+        self._idle_timer = None
+        self.compress = compress   # ขอ server บีบอัด DATA (out ต้องเป็น FrameWriter)
+        self.ack_every = max(1, ack_every)
+        self.ack_delay = ack_delay
+        self._pending = 0
+        self._ack_timer = None
+        self.file_hash = None   # hash ที่ server แนบมากับ EOF (ตรวจใน fetch_file)
+
+        # สถิติ
+        self.start_time = time.time()
+        self.recv_packets = 0
+        self.dup_packets = 0
+        self.corrupted = 0
+        self.bytes = 0
+        self.acks_sent = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.rwnd is not None:
+            # ประกาศ rwnd ไม่เกินจำนวน datagram ที่ receive buffer เก็บได้จริง (เหมือน client_gbn)
+            dgram = HEADER_SIZE + self.payload
+            fit = set_receive_buffer(transport.get_extra_info('socket'), self.rwnd * dgram) // dgram
+            self._ack_data = ack_payload(max(1, min(self.rwnd, fit)))
+        self._send_request()
+        self._touch()
+
+    def connection_lost(self, exc):
+        self._cancel_timers()
+        self._finish(False)
+
+    def error_received(self, exc):
+        pass
+
+    def _send_request(self):
+        # ส่ง REQUEST ซ้ำจนกว่าจะได้ packet แรก (REQUEST เองก็หายได้)
+        if self._request_tries >= MAX_RETRIES:
+            return
+        self._request_tries += 1
+        req = create_request_packet(self.filename, payload=self.payload if self.payload != PACKET_SIZE else None,
+                                    compress=self.compress)
+        self.transport.sendto(req.to_bytes(), self.server)
+        self._request_timer = self.loop.call_later(REQUEST_RETRY, self._send_request)
+
+    def _touch(self):
+        # รีเซ็ต timer ของการเงียบหาย
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = self.loop.call_later(self.timeout, self._finish, False)
+
+    def _cancel_timers(self):
+        for handle in (self._request_timer, self._idle_timer, self._ack_timer):
+            if handle is not None:
+                handle.cancel()
+
+    def _finish(self, ok):
+        if not self.done.done():
+            self._cancel_timers()
+            self.done.set_result(ok)
+
+    def _send_ack(self, seq):
+        # ACK แบบ cumulative ครอบคลุม packet ที่หน่วงไว้ทั้งหมดด้วย
+        self._pending = 0
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+        self.acks_sent += 1
+        n = encode_into(self._ack_buf, PacketType.ACK, seq, self._ack_data)
+        self.transport.sendto(self._ack_view[:n], self.server)
+
+    def _delayed_ack(self):
+        self._ack_timer = None
+        if self._pending and not self.done.done():
+            self._send_ack(self.expected - 1)
+
+    def datagram_received(self, data, addr):
+        if addr != self.server or self.done.done():
+            return
+        pkt = self._pkt
+        if not pkt.load(memoryview(data)):
+            self.corrupted += 1
+            return
+        # packet ใดก็ได้จาก server (รวม INFO keepalive ระหว่าง server บีบอัดไฟล์) = server รับ REQUEST แล้ว
+        # → หยุดส่ง REQUEST ซ้ำและรีเซ็ต timer ของการเงียบหาย
+        if self._request_timer is not None:
+            self._request_timer.cancel()
+            self._request_timer = None
+        self._touch()
+
+        if pkt.type == PacketType.ERROR:
+            print(f"[CLIENT-AIO] Server error: {str(pkt.data, 'utf-8', errors='ignore')}")
+            self._finish(False)
+
+        elif pkt.type == PacketType.DATA:
+            self.recv_packets += 1
+            if pkt.seq_num == self.expected:
+                self.out.write(pkt.data)
+                self.bytes += len(pkt.data)
+                self.expected += 1
+                self._pending += 1
+                if self._pending >= self.ack_every:
+                    self._send_ack(self.expected - 1)
+                elif self._ack_timer is None:
+                    self._ack_timer = self.loop.call_later(self.ack_delay, self._delayed_ack)
+            else:
+                # ซ้ำหรือมาก่อนลำดับ → ACK ตัวล่าสุดที่รับครบ (ยังไม่ได้ #0 ห้าม ACK)
+                if pkt.seq_num < self.expected:
+                    self.dup_packets += 1
+                if self.expected > 0:
+                    self._send_ack(self.expected - 1)
+
+        elif pkt.type == PacketType.EOF:
+            if pkt.seq_num == self.expected:
+                self.file_hash = bytes(pkt.data)
+                self._send_ack(pkt.seq_num)
+                self._finish(True)
+            elif self.expected > 0:
+                self._send_ack(self.expected - 1)
+
+def _probe(server, payload):
+    # วัด path MTU ด้วย socket แบบ blocking แยกต่างหาก (รันใน executor)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        return choose_payload(sock, server, payload, probe=True)
+    finally:
+        sock.close()
+
+async def fetch_file(host, port, filename, save_as=None, protocol='gbn', rwnd=None,
+                     timeout=CLIENT_TIMEOUT, payload=None, probe=False, ack_every=1, ack_delay=ACK_DELAY,
+                     compress=None):
+    # ขอไฟล์จาก server แบบ asyncio (protocol 'sw' หรือ 'gbn') คืน True ถ้าได้ไฟล์ครบ
+    # payload/probe: ขนาด data ต่อ packet ที่ขอ และการวัด path MTU ก่อนขอ (ดู pmtu.py)
+    # ack_every/ack_delay: delayed ACK (เฉพาะ 'gbn' — Stop-and-Wait ACK ทุก packet เสมอ)
+    # compress: 'zlib'/'lzma' ขอให้ server บีบอัด DATA ทีละบล็อก (แตกระหว่างเขียน)
+    if protocol not in ('sw', 'gbn'):
+        raise ValueError(f"Unsupported client protocol: {protocol}")
+    if protocol == 'sw':
+        ack_every = 1
+    if save_as is None:
+        save_as = f"recv_{os.path.basename(filename)}"
+    loop = asyncio.get_running_loop()
+    if probe:
+        payload = await loop.run_in_executor(None, _probe, (host, port), payload)
+    payload = clamp_payload(payload or PACKET_SIZE)
+    with open(save_as, 'wb') as f:
+        hashed = HashWriter(f)   # hash ของข้อมูลดิบ สะสมระหว่างเขียน (ตรวจกับ hash ใน EOF)
+        out = FrameWriter(hashed) if compress else hashed
+        transport, proto = await loop.create_datagram_endpoint(
+            lambda: ReceiverProtocol((host, port), filename, out, rwnd, timeout, payload,
+                                             ack_every, ack_delay, compress),
+            local_addr=('0.0.0.0', 0))
+        try:
+            ok = await proto.done
+        finally:
+            transport.close()
+        if ok and compress and not out.complete():
+            print("[CLIENT-AIO] Compressed stream ended mid-frame")
+            ok = False
+        hash_ok = verify(proto.file_hash, hashed.hash) if ok else None
+        if not accepted(hash_ok):
+            print(f"[CLIENT-AIO] File hash: {describe(hash_ok)}, received file rejected")
+            ok = False
+
+    if not ok:
+        if os.path.exists(save_as):
+            os.remove(save_as)
+        print(f"[CLIENT-AIO] Failed to fetch '{filename}'")
+        return False
+
+    dur = time.time() - proto.start_time
+    print("========== STATS ==========")
+    print(f"Received bytes   : {proto.bytes:,}")
+    print(f"Received packets : {proto.recv_packets}")
+    print(f"Duplicates       : {proto.dup_packets}")
+    print(f"Corrupted        : {proto.corrupted}")
+    print(f"ACKs sent        : {proto.acks_sent} ({proto.recv_packets / max(1, proto.acks_sent):.1f} DATA/ACK)")
+    print(f"File hash        : {describe(hash_ok)}")
+    if compress:
+        print(f"Compression      : {compress}, {out.summary()}")
+        print(f"Effective rate   : {out.raw_bytes / dur / 1024 if dur > 0 else 0:.2f} KB/s")
+    print(f"Elapsed          : {dur:.2f}s")
+    return True
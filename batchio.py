@@ -0,0 +1,331 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import socket
+import struct
+import sys
+import time
+from proto import MAX_PACKET_SIZE
+
+# ส่ง/รับ datagram ทีละหลายตัวต่อ syscall
+#   BatchSender.send([(buf, addr), ...])   ส่งทั้ง burst ของหน้าต่าง
+#   BatchReceiver.drain()                  ดึงทุก datagram ที่ค้างอยู่โดยไม่ block
+# โหมดส่ง:
+#   'gso'  : sendmsg() ครั้งเดียวต่อกลุ่ม packet ขนาดเท่ากันที่ไปปลายทางเดียวกัน + UDP_SEGMENT (Linux UDP GSO)
+#            kernel ตัดเป็น datagram ขนาด segment ให้เอง (ไม่ copy รวม buffer ใน Python)
+#   'mmsg' : sendmmsg() ผ่าน ctypes (หลายปลายทางได้ แต่ต้องเตรียม struct ทีละ packet ใน Python)
+#   'loop' : sendto() ทีละ packet (ใช้ได้ทุกระบบ)
+# โหมดรับ: 'mmsg' = recvmmsg() ผ่าน ctypes, 'loop' = recvfrom_into() แบบ non-blocking จนหมด
+# ค่าเริ่มต้นเลือกจากผล benchmark (python batchio.py): GSO สำหรับส่ง และ loop สำหรับรับ
+# เพราะ overhead ของ ctypes ต่อ packet มากกว่า syscall ที่ประหยัดได้
+# หมายเหตุ: socket.sendmsg() ที่ให้หลาย buffer โดยไม่มี UDP_SEGMENT จะรวมเป็น datagram เดียว
+
+MAX_BATCH = 64          # จำนวน datagram สูงสุดต่อ syscall (ขีดจำกัดของ UDP GSO ด้วย)
+MAX_GSO_BYTES = 65000   # ขนาดรวมสูงสุดต่อ sendmsg แบบ GSO (ต้องไม่เกินขนาด datagram ของ IP)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+
+class _iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+class _sockaddr_in(ctypes.Structure):
+    _fields_ = [('sin_family', ctypes.c_ushort), ('sin_port', ctypes.c_char * 2),
+                ('sin_addr', ctypes.c_char * 4), ('sin_zero', ctypes.c_char * 8)]
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_iovec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _msghdr), ('msg_len', ctypes.c_uint)]
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        libc.sendmmsg, libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_mmsghdr), ctypes.c_uint, ctypes.c_int]
+    libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    return libc
+
+_libc = _load_libc()
+HAVE_MMSG = _libc is not None
+HAVE_GSO = sys.platform.startswith('linux') and hasattr(socket.socket, 'sendmsg')
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+
+SEND_MODES = ('loop', 'mmsg', 'gso')
+RECV_MODES = ('loop', 'mmsg')
+
+def _send_mode(sock, mode):
+    if mode is None:
+        mode = 'gso' if HAVE_GSO else 'loop'
+    if mode not in SEND_MODES:
+        raise ValueError(f"Unknown send mode: {mode}")
+    if sock.family != socket.AF_INET or (mode == 'mmsg' and not HAVE_MMSG) or (mode == 'gso' and not HAVE_GSO):
+        return 'loop'
+    return mode
+
+def _buffer_address(buf, keep):
+    # คืน address ของข้อมูลใน buf โดยไม่ copy (bytes / bytearray / memoryview ที่เขียนได้)
+    if type(buf) is bytes:
+        keep.append(buf)
+        return ctypes.cast(buf, ctypes.c_void_p).value
+    try:
+        arr = (ctypes.c_char * len(buf)).from_buffer(buf)
+    except TypeError:   # buffer อ่านอย่างเดียว (เช่น memoryview ของ bytes)
+        buf = bytes(buf)
+        keep.append(buf)
+        return ctypes.cast(buf, ctypes.c_void_p).value
+    keep.append(arr)
+    return ctypes.addressof(arr)
+
+class BatchSender:
+    def __init__(self, sock, mode=None, max_batch=MAX_BATCH):
+        self.sock = sock
+        self.mode = _send_mode(sock, mode)
+        self.max_batch = max_batch
+        self._names = {}   # (host, port) -> (sockaddr_in, address) สำหรับ sendmmsg
+        if self.mode == 'mmsg':
+            self._msgs = (_mmsghdr * max_batch)()
+            self._iov = (_iovec * max_batch)()
+            self._hdrs = [m.msg_hdr for m in self._msgs]
+            for hdr, iov in zip(self._hdrs, self._iov):
+                hdr.msg_iov = ctypes.pointer(iov)
+                hdr.msg_iovlen = 1
+                hdr.msg_namelen = ctypes.sizeof(_sockaddr_in)
+        self._gso_cmsg = {}  # segment size -> ancillary data ของ UDP_SEGMENT
+
+        # สถิติ
+        self.syscalls = 0
+        self.packets = 0
+
+    def send(self, items):
+        # items: list ของ (buf, addr) — buf ต้องไม่ถูกแก้ระหว่างเรียก
+        if self.mode == 'gso':
+            self._send_gso(items)
+        elif self.mode == 'mmsg':
+            for i in range(0, len(items), self.max_batch):
+                self._send_mmsg(items[i:i + self.max_batch])
+        else:
+            self._send_loop(items)
+
+    def _send_loop(self, items):
+        sendto = self.sock.sendto
+        for buf, addr in items:
+            sendto(buf, addr)
+        self.syscalls += len(items)
+        self.packets += len(items)
+
+    def _send_gso(self, items):
+        # รวม packet ติดกันที่ไปปลายทางเดียวกันและยาวเท่ากัน (ตัวสุดท้ายของกลุ่มสั้นกว่าได้) เป็น sendmsg เดียว
+        i, n = 0, len(items)
+        while i < n:
+            buf, addr = items[i]
+            size = len(buf)
+            group = [buf]
+            total = size
+            j = i + 1
+            while j < n and len(group) < self.max_batch:
+                nbuf, naddr = items[j]
+                nlen = len(nbuf)
+                if naddr != addr or nlen > size or total + nlen > MAX_GSO_BYTES:
+                    break
+                group.append(nbuf)
+                total += nlen
+                j += 1
+                if nlen < size:
+                    break
+            if len(group) == 1:
+                self.sock.sendto(buf, addr)
+            else:
+                try:
+                    self.sock.sendmsg(group, self._cmsg(size), 0, addr)
+                except OSError as e:
+                    if e.errno not in (errno.EIO, errno.EINVAL, errno.ENOPROTOOPT, errno.EOPNOTSUPP):
+                        raise
+                    # kernel/อุปกรณ์ไม่รองรับ GSO → ใช้ sendto ทีละ packet ต่อจากนี้
+                    self.mode = 'loop'
+                    self._send_loop(items[i:])
+                    return
+            self.syscalls += 1
+            self.packets += len(group)
+            i = j
+
+    def _cmsg(self, size):
+        cmsg = self._gso_cmsg.get(size)
+        if cmsg is None:
+            cmsg = self._gso_cmsg[size] = [(SOL_UDP, UDP_SEGMENT, struct.pack('=H', size))]
+        return cmsg
+
+    def _sockaddr(self, addr):
+        # คืน address ของ sockaddr_in ของ addr (สร้างครั้งเดียวต่อปลายทาง)
+        entry = self._names.get(addr)
+        if entry is None:
+            host, port = addr
+            name = _sockaddr_in(socket.AF_INET, struct.pack('!H', port),
+                                socket.inet_aton(socket.gethostbyname(host)), b'')
+            entry = self._names[addr] = (name, ctypes.addressof(name))
+        return entry[1]
+
+    def _send_mmsg(self, items):
+        keep = []   # กัน buffer ถูกเก็บกวาดก่อน syscall
+        iov, hdrs = self._iov, self._hdrs
+        for i, (buf, addr) in enumerate(items):
+            v = iov[i]
+            v.iov_base = _buffer_address(buf, keep)
+            v.iov_len = len(buf)
+            hdrs[i].msg_name = self._sockaddr(addr)
+
+        fd = self.sock.fileno()
+        sent, total = 0, len(items)
+        while sent < total:
+            msgs_at = ctypes.cast(ctypes.byref(self._msgs, sent * ctypes.sizeof(_mmsghdr)), ctypes.POINTER(_mmsghdr))
+            n = _libc.sendmmsg(fd, msgs_at, total - sent, 0)
+            self.syscalls += 1
+            if n < 0:
+                err = ctypes.get_errno()
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    # socket เป็น non-blocking (settimeout) และ send buffer เต็ม → รอจนเขียนได้
+                    select.select([], [self.sock], [], self.sock.gettimeout())
+                    continue
+                if err == errno.EINTR:
+                    continue
+                raise OSError(err, os.strerror(err))
+            sent += n
+        self.packets += total
+
+class BatchReceiver:
+    def __init__(self, sock, mode='loop', count=MAX_BATCH, size=MAX_PACKET_SIZE):
+        if mode not in RECV_MODES:
+            raise ValueError(f"Unknown receive mode: {mode}")
+        self.sock = sock
+        self.mode = mode if (mode == 'loop' or (HAVE_MMSG and sock.family == socket.AF_INET)) else 'loop'
+        self.count = count
+        self.bufs = [bytearray(size) for _ in range(count)]
+        self.views = [memoryview(b) for b in self.bufs]
+        self._addrs = {}   # sockaddr (bytes) -> (host, port) (cache)
+        if self.mode == 'mmsg':
+            self._msgs = (_mmsghdr * count)()
+            self._iov = (_iovec * count)()
+            self._names = (_sockaddr_in * count)()
+            self._arrs = [(ctypes.c_char * size).from_buffer(b) for b in self.bufs]
+            for i in range(count):
+                self._iov[i].iov_base = ctypes.addressof(self._arrs[i])
+                self._iov[i].iov_len = size
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_name = ctypes.addressof(self._names[i])
+                hdr.msg_iov = ctypes.pointer(self._iov[i])
+                hdr.msg_iovlen = 1
+
+        # สถิติ
+        self.syscalls = 0
+        self.packets = 0
+
+    def drain(self):
+        # คืน list ของ (view, nbytes, addr) ของทุก datagram ที่ค้างอยู่ (ไม่เกิน count) โดยไม่ block
+        # view ใช้ได้จนกว่าจะเรียก drain() ครั้งถัดไป
+        if self.mode == 'mmsg':
+            return self._drain_mmsg()
+        out = []
+        timeout = self.sock.gettimeout()
+        self.sock.settimeout(0)
+        try:
+            recv = self.sock.recvfrom_into
+            while len(out) < self.count:
+                i = len(out)
+                self.syscalls += 1
+                try:
+                    nbytes, addr = recv(self.bufs[i])
+                except (BlockingIOError, InterruptedError):
+                    break
+                except ConnectionError:
+                    continue   # ICMP error จาก datagram ก่อนหน้า
+                out.append((self.views[i], nbytes, addr))
+        finally:
+            self.sock.settimeout(timeout)
+        self.packets += len(out)
+        return out
+
+    def _drain_mmsg(self):
+        for i in range(self.count):
+            self._msgs[i].msg_hdr.msg_namelen = ctypes.sizeof(_sockaddr_in)
+        n = _libc.recvmmsg(self.sock.fileno(), self._msgs, self.count, _MSG_DONTWAIT, None)
+        self.syscalls += 1
+        if n <= 0:
+            return []
+        out = []
+        for i in range(n):
+            out.append((self.views[i], self._msgs[i].msg_len, self._addr(self._names[i])))
+        self.packets += n
+        return out
+
+    def _addr(self, name):
+        key = bytes(name)[2:8]   # port + IPv4
+        addr = self._addrs.get(key)
+        if addr is None:
+            addr = (socket.inet_ntoa(key[2:]), struct.unpack('!H', key[:2])[0])
+            self._addrs[key] = addr
+        return addr
+
+def _bench_send(mode, count, payload):
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(('127.0.0.1', 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    tx.settimeout(1.0)
+    sender = BatchSender(tx, mode)
+    items = [(payload, rx.getsockname())] * MAX_BATCH
+    start = time.perf_counter()
+    for _ in range(count // MAX_BATCH):
+        sender.send(items)
+    dur = time.perf_counter() - start
+    tx.close()
+    rx.close()
+    return sender.mode, sender.packets / dur, sender.syscalls
+
+def _bench_recv(mode, count, payload):
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+    rx.bind(('127.0.0.1', 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver = BatchReceiver(rx, mode)
+    got, dur = 0, 0.0
+    # เติม receive buffer ทีละ 1024 packet แล้วจับเวลาเฉพาะตอนดึงออก
+    while got < count:
+        for _ in range(1024):
+            tx.sendto(payload, rx.getsockname())
+        start = time.perf_counter()
+        while True:
+            batch = receiver.drain()
+            if not batch:
+                break
+            got += len(batch)
+        dur += time.perf_counter() - start
+    tx.close()
+    rx.close()
+    return receiver.mode, got / dur, receiver.syscalls
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Benchmark per-packet vs batched datagram I/O on loopback")
+    ap.add_argument("--count", type=int, default=200000)
+    ap.add_argument("--size", type=int, default=MAX_PACKET_SIZE, help="datagram size (bytes)")
+    args = ap.parse_args()
+    payload = os.urandom(args.size)
+
+    print(f"sendmmsg/recvmmsg: {HAVE_MMSG}, UDP GSO: {HAVE_GSO}")
+    for mode in SEND_MODES:
+        used, pps, calls = _bench_send(mode, args.count, payload)
+        print(f"send {mode:5s} ({used:4s}): {pps:12,.0f} pkt/s ({calls} syscalls)")
+    for mode in RECV_MODES:
+        used, pps, calls = _bench_recv(mode, args.count, payload)
+        print(f"recv {mode:5s} ({used:4s}): {pps:12,.0f} pkt/s ({calls} syscalls)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import json
+import os
+import socket
+import threading
+import time
+from proto import MAX_PACKET_SIZE, MAX_RETRIES, Packet, PacketType, create_request_packet, parse_info
+
+# checkpoint สำหรับรับไฟล์ต่อจากที่ค้าง: ระหว่างรับ client เขียนลง <output>.part และบันทึกช่วง byte
+# ที่ลงดิสก์แล้วไว้ใน sidecar <output>.part.ckpt (JSON) เมื่อรับใหม่ด้วยคำสั่งเดิมจะขอเฉพาะส่วนที่ยังขาด
+# (REQUEST option range=START-END) แทนการเริ่มจาก seq 0 — ไฟล์ที่รับครบแล้วจะลบ sidecar ทิ้ง
+# checkpoint จำขนาดและ mtime ของไฟล์บน server (จาก INFO ตอนเริ่มส่ง) ไว้ด้วย และเทียบกับไฟล์ปัจจุบัน (query_source)
+# ก่อนรับต่อ ถ้าไฟล์ต้นทางเปลี่ยนไปแล้วต้องเริ่มใหม่ทั้งไฟล์ (ตรวจได้ก่อนรับส่วนที่เหลือ ไม่ต้องรอ hash ตอนจบ)
+# ตอนจบ client ตรวจทั้งไฟล์ (ส่วนเดิมใน .part + ส่วนที่รับต่อ) กับ hash ของทั้งไฟล์ที่ server แนบมากับ EOF
+# (ถาม server เฉพาะเมื่อมีช่วงเดิมให้รับต่อ การรับครั้งแรกไม่เสีย round trip เพิ่ม)
+
+PART_SUFFIX = '.part'          # ไฟล์ชั่วคราวระหว่างรับ (เปลี่ยนชื่อเมื่อรับครบ)
+CKPT_SUFFIX = '.ckpt'
+CHECKPOINT_BYTES = 4 * 1024 * 1024   # บันทึก checkpoint ทุกครั้งที่ลงดิสก์เพิ่มอย่างน้อยเท่านี้
+STAT_TIMEOUT = 1.0   # รอ INFO ตอบคำขอข้อมูลไฟล์ (ส่งซ้ำได้ MAX_RETRIES ครั้ง)
+
+class Checkpoint:
+    # ranges: ช่วง [start, end) ที่อยู่ในไฟล์ .part แล้ว (เรียงและรวมช่วงที่ติดกัน)
+    # ใช้จากหลาย thread ได้ (fetch_parallel แต่ละ stream บันทึกช่วงของตัวเอง)
+    def __init__(self, part_path, filename, size=None, mtime=None):
+        self.path = part_path + CKPT_SUFFIX
+        self.part_path = part_path
+        self.filename = filename
+        self.size = size     # ขนาดไฟล์เต็มบน server (None = ไม่รู้)
+        self.mtime = mtime   # mtime (ns) ของไฟล์บน server (None = ไม่รู้)
+        self.ranges = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, part_path, filename):
+        # อ่าน sidecar ของ part_path (checkpoint ว่างถ้าไม่มี, อ่านไม่ได้ หรือเป็นของไฟล์อื่น)
+        # ช่วงที่เกินขนาดจริงของ .part ถูกตัดทิ้ง (เช่นเครื่องดับก่อนข้อมูลลงดิสก์)
+        ckpt = cls(part_path, filename)
+        try:
+            with open(ckpt.path) as f:
+                state = json.load(f)
+            have = os.path.getsize(part_path)
+        except (OSError, ValueError):
+            return ckpt
+        if state.get('file') != filename:
+            return ckpt
+        ckpt.size = state.get('size')
+        ckpt.mtime = state.get('mtime')
+        for start, end in state.get('ranges', []):
+            if start < min(end, have):
+                ckpt.add(start, min(end, have))
+        return ckpt
+
+    def matches(self, source):
+        # เป็น checkpoint ของไฟล์ต้นทางเวอร์ชันเดียวกับที่ server มีตอนนี้หรือไม่ (source จาก query_source)
+        return (source is not None and self.size is not None and self.mtime is not None
+                and (self.size, self.mtime) == (source['size'], source['mtime']))
+
+    def identify(self, source):
+        # จำไฟล์ต้นทาง (source จาก source_info) ถ้ายังไม่รู้ — INFO หายก็แค่รับต่อครั้งหน้าไม่ได้ (เริ่มใหม่)
+        if self.size is None and source is not None:
+            self.size, self.mtime = source['size'], source['mtime']
+
+    @property
+    def offset(self):  # จำนวน byte ที่ได้ต่อเนื่องจากต้นไฟล์ (จุดที่ต้องรับต่อ)
+        with self._lock:
+            return self.ranges[0][1] if self.ranges and self.ranges[0][0] == 0 else 0
+
+    def add(self, start, end):
+        if end <= start:
+            return
+        with self._lock:
+            merged = []
+            for s, e in sorted(self.ranges + [[start, end]]):
+                if merged and s <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], e)
+                else:
+                    merged.append([s, e])
+            self.ranges = merged
+
+    def missing(self, start, end):  # ช่วงใน [start, end) ที่ยังไม่ได้รับ
+        gaps = []
+        with self._lock:
+            for s, e in self.ranges:
+                if s > start:
+                    gaps.append((start, min(s, end)))
+                start = max(start, e)
+                if start >= end:
+                    break
+        if start < end:
+            gaps.append((start, end))
+        return [g for g in gaps if g[0] < g[1]]
+
+    def save(self):
+        # เขียนไฟล์ใหม่แล้ว replace (ไม่มี sidecar ที่เขียนค้างครึ่งเดียว)
+        with self._lock:
+            state = {'file': self.filename, 'size': self.size, 'mtime': self.mtime, 'ranges': self.ranges}
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def open_checkpoint(part_path, filename, query, restart=False):
+    # checkpoint ของ part_path ที่จะใช้รับ filename: ใช้ของเดิมถ้าเป็นไฟล์ต้นทางเวอร์ชันเดียวกับที่ server มีตอนนี้
+    # query(): ข้อมูลไฟล์บน server (เช่น query_source) เรียกเฉพาะเมื่อมีช่วงเดิมให้รับต่อ
+    # ไม่งั้น (หรือ restart) เริ่ม checkpoint ใหม่ คืน (checkpoint, ทิ้งของเดิมเพราะไฟล์เปลี่ยนหรือไม่)
+    ckpt = Checkpoint.load(part_path, filename)
+    if restart or not ckpt.ranges:
+        return Checkpoint(part_path, filename), False
+    source = query()
+    if ckpt.matches(source):
+        return ckpt, False
+    fresh = Checkpoint(part_path, filename)
+    fresh.identify(source)
+    return fresh, True
+
+def source_info(info):
+    # ขนาดและ mtime ของไฟล์จาก INFO (parse_info) → {'size': int, 'mtime': int หรือ None} หรือ None ถ้าไม่มีขนาด
+    size, mtime = info.get('size', ''), info.get('mtime', '')
+    if not size.isdigit():
+        return None
+    return {'size': int(size), 'mtime': int(mtime) if mtime.isdigit() else None}
+
+def query_source(server, filename, timeout=STAT_TIMEOUT, tries=MAX_RETRIES):
+    # ขอขนาดและ mtime ของไฟล์จาก server (REQUEST option stat → ตอบ INFO อย่างเดียว ไม่เปิด session)
+    # คืน {'size': int, 'mtime': int หรือ None} หรือ None ถ้าไม่ได้คำตอบ / server ตอบ ERROR
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    buf = bytearray(MAX_PACKET_SIZE)
+    pkt = Packet(PacketType.INFO, 0)
+    req = create_request_packet(filename, stat=1).to_bytes()
+    try:
+        for _ in range(tries):
+            sock.sendto(req, server)
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                sock.settimeout(max(0.001, deadline - time.time()))
+                try:
+                    nbytes, addr = sock.recvfrom_into(buf)
+                except socket.timeout:
+                    break
+                if addr != server or not pkt.load(memoryview(buf), nbytes):
+                    continue
+                if pkt.type == PacketType.ERROR:
+                    return None
+                source = source_info(parse_info(pkt.data)) if pkt.type == PacketType.INFO else None
+                if source is not None:
+                    return source
+        return None
+    finally:
+        sock.close()
@@ -0,0 +1,136 @@
+import random
+import sys
+import time
+from array import array
+
+try:
+    import numpy as np  # optional: ถ้ามีจะใช้รวม word แบบ vectorized
+except ImportError:
+    np = None
+
+# Internet checksum (RFC 1071): ผลรวม one's complement ของ word 16-bit แบบ big-endian
+# ทุก engine ต้องให้ผลตรงกับ sum16_python ทุก bit (byte สุดท้ายที่เหลือเดี่ยวจะถูก pad ด้วย 0)
+
+_LITTLE = sys.byteorder == 'little'
+
+def _fold(s):  # พับ carry ที่เกิน 16 bit กลับมาบวก (end-around carry)
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    return s
+
+def _swap16(s):  # สลับ byte ของ word 16-bit
+    return ((s & 0xFF) << 8) | (s >> 8)
+
+def sum16_python(data):
+    # วนทีละ 2 bytes แบบเดิม (ใช้เป็น reference และ fallback)
+    checksum = 0
+    for i in range(0, len(data), 2):
+        if i + 1 < len(data):
+            word = (data[i] << 8) + data[i + 1]
+        else:
+            word = data[i] << 8
+        checksum += word
+        checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    return checksum
+
+def sum16_array(data):
+    # รวม word ด้วย memoryview.cast('H') → sum() ทำงานใน C
+    # ผลรวม one's complement สลับ byte order ได้ จึงรวมแบบ native แล้วค่อย swap ทีเดียว
+    mv = memoryview(data)
+    n = len(mv)
+    tail = 0
+    if n & 1:
+        tail = mv[n - 1] << 8
+        mv = mv[:n - 1]
+    s = _fold(sum(mv.cast('H'))) if n > 1 else 0
+    if _LITTLE:
+        s = _swap16(s)
+    return _fold(s + tail)
+
+def sum16_numpy(data):
+    # เหมือน sum16_array แต่ให้ numpy รวมทั้ง buffer ในครั้งเดียว
+    mv = memoryview(data)
+    n = len(mv)
+    tail = 0
+    if n & 1:
+        tail = mv[n - 1] << 8
+        mv = mv[:n - 1]
+    s = _fold(int(np.frombuffer(mv, dtype=np.uint16).sum(dtype=np.uint64))) if n > 1 else 0
+    if _LITTLE:
+        s = _swap16(s)
+    return _fold(s + tail)
+
+# เรียงตามลำดับความเร็ว (เลือกตัวแรกที่ใช้ได้และผ่านการตรวจ)
+ENGINES = {
+    'numpy': sum16_numpy,
+    'array': sum16_array,
+    'python': sum16_python,
+}
+
+ENGINE = 'python'
+sum16 = sum16_python
+
+def available_engines():
+    names = []
+    for name in ENGINES:
+        if name == 'numpy' and np is None:
+            continue
+        if name == 'array' and array('H').itemsize != 2:
+            continue
+        names.append(name)
+    return names
+
+def verify_engine(fn, trials=64, max_len=2100, seed=1071):
+    # เทียบกับ sum16_python บน payload สุ่ม (ทั้งความยาวคู่/คี่ และกรณีขอบ)
+    rnd = random.Random(seed)
+    samples = [b'', b'\x00', b'\xff', b'\xff\xff', b'\xff' * 3, b'\x00' * 8]
+    for _ in range(trials):
+        n = rnd.randrange(max_len)
+        samples.append(bytes(rnd.getrandbits(8) for _ in range(n)))
+    try:
+        for data in samples:
+            if fn(data) != sum16_python(data):
+                return False
+            if fn(bytearray(data)) != sum16_python(data):
+                return False
+    except Exception:
+        return False
+    return True
+
+def set_engine(name=None):
+    # name=None → เลือกอัตโนมัติ, ถ้าระบุชื่อแล้วใช้ไม่ได้จะ raise ValueError
+    global ENGINE, sum16
+    candidates = available_engines()
+    if name is not None:
+        if name not in candidates:
+            raise ValueError(f"Checksum engine not available: {name}")
+        candidates = [name]
+    for cand in candidates:
+        fn = ENGINES[cand]
+        if cand == 'python' or verify_engine(fn):
+            ENGINE, sum16 = cand, fn
+            return cand
+    raise ValueError(f"Checksum engine failed verification: {name}")
+
+def internet_checksum(data):  # one's complement ของผลรวม
+    return ~sum16(data) & 0xFFFF
+
+set_engine()
+
+def main():
+    # ตรวจทุก engine เทียบกับ reference และวัดความเร็วคร่าวๆ
+    payload = bytes(random.Random(0).getrandbits(8) for _ in range(1031))
+    rounds = 2000
+    print(f"Selected engine: {ENGINE}")
+    for name in available_engines():
+        fn = ENGINES[name]
+        ok = verify_engine(fn, trials=256)
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            fn(payload)
+        dt = time.perf_counter() - t0
+        rate = (len(payload) * rounds / dt) / (1024 * 1024) if dt > 0 else 0
+        print(f"{name:<7} verify={'OK' if ok else 'MISMATCH'}  {rate:8.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
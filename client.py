@@ -4,24 +4,48 @@ import sys
 import time
 import os
 from proto import (
-    Packet, PacketType, PACKET_SIZE, TIMEOUT, MAX_PACKET_SIZE,
-    create_request_packet, create_ack_packet  
+    Packet, PacketType, PACKET_SIZE, MAX_PACKET_SIZE, HEADER_SIZE,
+    create_request_packet, encode_into, parse_info
 )
+from pmtu import choose_payload
+from compress import METHODS, FrameWriter
+from filehash import HashWriter, hash_prefix, split_eof, verify, accepted, describe
+from checkpoint import CHECKPOINT_BYTES, PART_SUFFIX, Checkpoint, open_checkpoint, query_source, source_info
 
 # ขนาด buffer สำหรับรับ packet (กำหนดตามโปรโตคอล)
 BUF_SIZE = MAX_PACKET_SIZE
+WRITE_BUFFER = 1024 * 1024   # buffer ของไฟล์ปลายทาง (รวม packet เล็กๆ เป็นการเขียนก้อนใหญ่)
 
 class FileTransferClient:
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, payload=None, probe=False, compress=None, restart=False):
         # เก็บ address ของ server
         self.server_addr = (server_ip, server_port)
         self.socket = None
+        self.payload = payload   # ขนาด data ต่อ packet ที่ขอ (None = PACKET_SIZE)
+        self.probe = probe       # วัด path MTU ก่อนขอไฟล์
+        self.compress = compress # ขอให้ server บีบอัด DATA ('zlib'/'lzma')
+
+        # รับต่อจาก checkpoint ของ <save_as>.part (restart=True → เริ่มใหม่ทั้งไฟล์) ดู checkpoint.py
+        self.restart = restart
+        self.checkpoint = None
+        self.resume_from = 0     # byte แรกที่ขอจาก server (REQUEST option range)
+        self._part_file = None
+        self._frames = None
+        self._ckpt_saved = 0
+
+        # buffer รับ/ส่ง ACK ที่ใช้ซ้ำ (zero-copy)
+        self._rx_buf = bytearray(BUF_SIZE)
+        self._rx_view = memoryview(self._rx_buf)
+        self._ack_buf = bytearray(BUF_SIZE)
+        self._ack_view = memoryview(self._ack_buf)
 
         # ตัวแปรเก็บสถิติ 
         self.start_time = None
         self.total_packets = 0
         self.corrupted_packets = 0
         self.duplicate_packets = 0
+        self.received_bytes = 0
+        self.file_hash_received = None   # hash ของไฟล์ที่ server แนบมากับ EOF
 
     def request_file(self, filename, save_as=None):
         # ส่ง REQUEST ไปยัง server เพื่อขอไฟล์ และรับไฟล์นั้น
@@ -38,10 +62,23 @@ class FileTransferClient:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.socket.settimeout(5.0)  # timeout สำหรับ response แรก
 
+            # เลือกขนาด data ต่อ packet (วัด path MTU ถ้าขอ) แล้วจอง buffer รับให้พอดี
+            self.payload = choose_payload(self.socket, self.server_addr, self.payload, self.probe)
+            self._rx_buf = bytearray(HEADER_SIZE + self.payload)
+            self._rx_view = memoryview(self._rx_buf)
+
+            # รับต่อจาก checkpoint (ถ้ามี) → ขอเฉพาะ byte ที่ยังขาด (ส่วนที่รับต่อไม่บีบอัด)
+            self._prepare_resume(filename, save_as)
+            if self.resume_from and self.compress:
+                print(f"[CLIENT] Resumed transfers are not compressed")
+                self.compress = None
+
             # สร้างและส่ง REQUEST packet
-            req = create_request_packet(filename)
+            req = create_request_packet(filename, payload=self.payload if self.payload != PACKET_SIZE else None,
+                                        compress=self.compress,
+                                        range=f"{self.resume_from}-" if self.resume_from else None)
             self.socket.sendto(req.to_bytes(), self.server_addr)
-            print(f"[CLIENT] Sent REQUEST for '{filename}'")
+            print(f"[CLIENT] Sent REQUEST for '{filename}' (payload={self.payload})")
 
             # เริ่มรับไฟล์
             success = self.receive_file(save_as)
@@ -50,10 +87,8 @@ class FileTransferClient:
                 print(f"\n[CLIENT] File transfer completed successfully!")
                 print(f"[CLIENT] Saved as: '{save_as}'")
             else:
+                # ไฟล์ชั่วคราวถูกลบไปแล้ว และไฟล์ชื่อ save_as (ถ้ามีอยู่ก่อน) ไม่ถูกแตะ
                 print(f"\n[CLIENT] File transfer failed")
-                # ถ้าไฟล์เสียหาย → ลบทิ้ง
-                if os.path.exists(save_as):
-                    os.remove(save_as)
 
         except socket.timeout:
             print(f"[CLIENT] Timeout - No response from server")
@@ -63,28 +98,109 @@ class FileTransferClient:
             if self.socket:
                 self.socket.close()
 
+    def _prepare_resume(self, filename, save_filename):
+        # รับต่อได้เฉพาะเมื่อไฟล์บน server ยังมีขนาดและ mtime เท่ากับตอนบันทึก checkpoint
+        # (ไฟล์เปลี่ยนแล้ว hash ของทั้งไฟล์ใน EOF ย่อมไม่ตรง → รู้ก่อนจะได้ไม่ต้องรับส่วนที่เหลือไปเปล่าๆ)
+        part_filename = save_filename + PART_SUFFIX
+        self.checkpoint, changed = open_checkpoint(part_filename, filename,
+                                                   lambda: query_source(self.server_addr, filename), self.restart)
+        if changed:
+            print(f"[CLIENT] '{filename}' changed on the server since the checkpoint, restarting from byte 0")
+        self.resume_from = self.checkpoint.offset
+        self.checkpoint.ranges = [[0, self.resume_from]] if self.resume_from else []
+        if self.resume_from:
+            print(f"[CLIENT] Resuming from byte {self.resume_from:,} ('{part_filename}')")
+
     def receive_file(self, save_filename):
-        # รับไฟล์จาก server ทีละ packet
-        received_data = {}
+        # รับไฟล์จาก server แล้วเขียน data ที่ถูกลำดับลงไฟล์ชั่วคราวทันที (หน่วยความจำคงที่ไม่ขึ้นกับขนาดไฟล์)
+        # เปลี่ยนชื่อเป็นไฟล์จริงเมื่อรับสำเร็จเท่านั้น → ไม่มีไฟล์ที่รับมาครึ่งเดียวค้างอยู่ในชื่อจริง
+        # ระหว่างรับบันทึก checkpoint ไว้ ถ้าไม่สำเร็จ .part จะถูกเก็บไว้ให้รับต่อในครั้งหน้า
+        part_filename = save_filename + PART_SUFFIX
+        if self.checkpoint is None:
+            self.checkpoint = Checkpoint(part_filename, save_filename)
+        start = self.resume_from
+        frames = self._frames = None
+        self._ckpt_saved = 0
+        ok = corrupt = False
+        try:
+            with open(part_filename, 'r+b' if start else 'wb', buffering=WRITE_BUFFER) as f:
+                out = hashed = HashWriter(f)   # hash ของข้อมูลดิบ สะสมระหว่างเขียน (ตรวจกับ hash ใน EOF)
+                if start:
+                    f.seek(start)
+                    f.truncate()   # ทิ้งส่วนที่เขียนเกิน checkpoint
+                    # รับต่อ: เริ่ม hash จากส่วนที่เก็บไว้ใน .part → ตรวจทั้งไฟล์กับ hash ของทั้งไฟล์ใน EOF
+                    hash_prefix(f, start, hashed.hash)
+                    f.seek(start)
+                self._part_file = f
+                if self.compress:
+                    out = frames = self._frames = FrameWriter(hashed)   # แตก frame ที่บีบอัดไว้ทีละบล็อกระหว่างเขียน
+                try:
+                    ok = self._receive_into(out)
+                    if ok and frames is not None and not frames.complete():
+                        print(f"[CLIENT] Compressed stream ended mid-frame")
+                        ok = False
+                    if ok:
+                        sent_hash, full_hash = split_eof(self.file_hash_received or b'')
+                        hash_ok = verify(full_hash if start else sent_hash, hashed.hash)
+                        print(f"[CLIENT] File hash: {describe(hash_ok)}")
+                        if not accepted(hash_ok):
+                            # ไม่ตรง หรือ EOF ไม่มี hash (ตรวจไม่ได้) → ไม่ใช้ไฟล์นี้
+                            ok = False
+                            corrupt = True
+                finally:
+                    if not ok and not corrupt:
+                        self._save_checkpoint(final=True)
+                    self._part_file = None
+            if ok:
+                self.checkpoint.remove()
+                os.replace(part_filename, save_filename)
+        except OSError as e:
+            print(f"[CLIENT] Error saving file: {e}")
+            ok = False
+        finally:
+            if not ok and (corrupt or not self.checkpoint.ranges):
+                # ไม่มีข้อมูลที่ใช้ต่อได้ → ไม่ทิ้งไฟล์ค้างไว้
+                self.checkpoint.remove()
+                if os.path.exists(part_filename):
+                    os.remove(part_filename)
+        if not ok:
+            if self.checkpoint.ranges:
+                print(f"[CLIENT] Kept {self.checkpoint.offset:,} bytes in '{part_filename}', run again to resume")
+            return False
+
+        file_size = self.received_bytes
+        if frames is not None:
+            print(f"[CLIENT] Compression: {self.compress}, {frames.summary()}")
+            file_size = frames.raw_bytes
+        print(f"[CLIENT] File saved: {save_filename} ({file_size:,} bytes)")
+
+        # แสดงสถิติการโอนถ่าย
+        self.print_statistics(file_size)
+        return True
+
+    def _receive_into(self, out):
+        # รับ DATA ทีละ packet แบบ Stop-and-Wait แล้วเขียนลง out ตามลำดับ คืน True ถ้ารับสำเร็จ
         expected_seq = 0
         file_complete = False
-        file_hash_received = None
+        self.file_hash_received = None
 
         # รีเซ็ตสถิติใหม่
         self.start_time = time.time()
         self.total_packets = 0
         self.corrupted_packets = 0
         self.duplicate_packets = 0
+        self.received_bytes = 0
 
         # ใช้นับ timeout ติดกัน (กันกรณี EOF หาย)
         consecutive_timeouts = 0
 
         print(f"\n[CLIENT] Receiving file...")
+        packet = Packet(PacketType.DATA, 0)
 
         while not file_complete:
             try:
                 # รับ packet จาก server
-                pkt_bytes, addr = self.socket.recvfrom(BUF_SIZE)
+                nbytes, addr = self.socket.recvfrom_into(self._rx_buf)
                 consecutive_timeouts = 0  # reset timeout counter
 
                 # ถ้า packet มาจากที่อื่น → ทิ้ง
@@ -93,54 +209,55 @@ class FileTransferClient:
                     continue
 
                 # แปลง bytes → Packet และตรวจ checksum
-                parsed = Packet.from_bytes(pkt_bytes)
-                if isinstance(parsed, tuple):
-                    packet, ok = parsed
-                    if not ok:
-                        self.corrupted_packets += 1
-                        print(f"[CLIENT] Corrupted packet (checksum failed)")
-                        continue
-                else:
-                    packet = parsed
+                if not packet.load(self._rx_view, nbytes):
+                    self.corrupted_packets += 1
+                    print(f"[CLIENT] Corrupted packet (checksum failed)")
+                    continue
 
                 self.total_packets += 1
 
                 #  จัดการ packet แต่ละประเภท 
                 if packet.type == PacketType.ERROR:
                     # server แจ้ง error 
-                    msg = packet.data.decode('utf-8', errors='ignore')
+                    msg = str(packet.data, 'utf-8', errors='ignore')
                     print(f"[CLIENT] Server error: {msg}")
                     return False
 
                 elif packet.type == PacketType.DATA:
                     seq = packet.seq_num
                     if seq == expected_seq:
-                        # ได้ packet ที่ถูกต้อง → เก็บข้อมูล + ส่ง ACK
-                        received_data[seq] = packet.data
+                        # ได้ packet ที่ถูกต้อง → เขียนต่อท้ายไฟล์ทันที (data เป็น view ของ buffer รับ
+                        # แต่ write จะ copy ลง buffer ของไฟล์ก่อนรับ packet ถัดไป) + ส่ง ACK
+                        out.write(packet.data)
+                        self.received_bytes += len(packet.data)
+                        self._save_checkpoint()
                         print(f"[CLIENT] Received packet #{seq} ({len(packet.data)} bytes)")
-                        ack = create_ack_packet(seq)
-                        self.socket.sendto(ack.to_bytes(), self.server_addr)
+                        self._send_ack(seq)
                         print(f"[CLIENT] Sent ACK for #{seq}")
                         expected_seq += 1
                     elif seq < expected_seq:
                         # duplicate packet → ส่ง ACK ซ้ำ
                         self.duplicate_packets += 1
                         print(f"[CLIENT] Duplicate #{seq} (expected #{expected_seq})")
-                        dup = create_ack_packet(seq)
-                        self.socket.sendto(dup.to_bytes(), self.server_addr)
+                        self._send_ack(seq)
                         print(f"[CLIENT] Resent ACK for #{seq}")
                     else:
                         # out-of-order (ไม่ควรเกิดใน Stop-and-Wait)
                         print(f"[CLIENT] Out of order: got #{seq}, expected #{expected_seq}")
 
+                elif packet.type == PacketType.INFO:
+                    # ขนาด/mtime ของไฟล์บน server → จำไว้ใน checkpoint ใหม่ (ใช้ตรวจก่อนรับต่อครั้งหน้า)
+                    # INFO keepalive ระหว่าง server บีบอัดไฟล์ไม่มีขนาด (ได้แค่รีเซ็ต consecutive_timeouts ข้างบน)
+                    if not self.resume_from:
+                        self.checkpoint.identify(source_info(parse_info(packet.data)))
+
                 elif packet.type == PacketType.EOF:
                     # ได้ EOF → จบการรับไฟล์
                     print(f"[CLIENT] Received EOF")
                     if packet.data:
-                        file_hash_received = packet.data
+                        self.file_hash_received = bytes(packet.data)
                         print(f"[CLIENT] File hash received")
-                    eof_ack = create_ack_packet(packet.seq_num)
-                    self.socket.sendto(eof_ack.to_bytes(), self.server_addr)
+                    self._send_ack(packet.seq_num)
                     print(f"[CLIENT] Sent ACK for EOF")
                     file_complete = True
 
@@ -150,43 +267,41 @@ class FileTransferClient:
             except socket.timeout:
                 # timeout → อาจรอ EOF อยู่
                 consecutive_timeouts += 1
-                if len(received_data) == 0:
+                if expected_seq == 0:
                     if consecutive_timeouts >= 3:
                         print(f"[CLIENT] Timeout x3 - no data received, abort")
                         return False
                     continue
                 else:
                     if consecutive_timeouts >= 3:
-                        print(f"[CLIENT] Timeout x3 - assuming transfer complete")
-                        file_complete = True
-                        break
+                        # ไม่มี EOF = ไม่รู้ว่าครบหรือไม่ และไม่มี hash ให้ตรวจ → ถือว่าไม่สำเร็จ (เก็บ .part ไว้รับต่อ)
+                        print(f"[CLIENT] Timeout x3 - no EOF after #{expected_seq - 1}, transfer incomplete")
+                        return False
                     continue
 
             except Exception as e:
                 print(f"[CLIENT] Error receiving packet: {e}")
                 return False
 
-        # ประกอบไฟล์จาก packet ที่ได้ 
-        if not received_data:
-            print(f"[CLIENT] No data received")
-            return False
-
-        print(f"\n[CLIENT] Assembling file from {len(received_data)} packets...")
-        file_data = b''.join(received_data[i] for i in sorted(received_data))
-
-        # เขียนไฟล์ลง disk
-        try:
-            with open(save_filename, 'wb') as f:
-                f.write(file_data)
-            print(f"[CLIENT] File saved: {save_filename} ({len(file_data):,} bytes)")
-        except Exception as e:
-            print(f"[CLIENT] Error saving file: {e}")
-            return False
-
-        # แสดงสถิติการโอนถ่าย
-        self.print_statistics(len(file_data))
+        print(f"\n[CLIENT] Received {expected_seq} packets ({self.received_bytes:,} bytes)")
         return True
 
+    def _save_checkpoint(self, final=False):
+        # บันทึกจำนวน byte ดิบที่ลงไฟล์แล้ว (ทุก CHECKPOINT_BYTES หรือเมื่อหยุดรับ)
+        if self.checkpoint is None or self._part_file is None:
+            return
+        done = self._frames.raw_bytes if self._frames is not None else self.received_bytes
+        if final or done - self._ckpt_saved >= CHECKPOINT_BYTES:
+            self._part_file.flush()
+            self.checkpoint.add(0, self.resume_from + done)
+            if self.checkpoint.ranges:
+                self.checkpoint.save()
+            self._ckpt_saved = done
+
+    def _send_ack(self, seq):
+        n = encode_into(self._ack_buf, PacketType.ACK, seq)
+        self.socket.sendto(self._ack_view[:n], self.server_addr)
+
     def print_statistics(self, file_size):
         # แสดงสถิติการโอนถ่ายไฟล์
         if self.start_time:
@@ -212,9 +327,24 @@ def main():
     parser.add_argument("server_port", type=int)
     parser.add_argument("filename")
     parser.add_argument("-o", "--output")
+    parser.add_argument("--asyncio", action="store_true", help="ใช้ asyncio transport (aio.py)")
+    parser.add_argument("--payload", type=int, default=None, help=f"ขนาด data ต่อ packet ที่ขอ (ค่าเริ่มต้น {PACKET_SIZE})")
+    parser.add_argument("--probe", action="store_true", help="วัดขนาด payload ใหญ่สุดที่ผ่านเส้นทางได้ (ไม่เกิน --payload)")
+    parser.add_argument("--compress", choices=sorted(METHODS), default=None,
+                        help="ขอให้ server บีบอัด DATA ทีละบล็อก (ไฟล์ที่บีบอัดมาแล้วจะส่งแบบดิบ)")
+    parser.add_argument("--restart", action="store_true", help="ไม่รับต่อจาก checkpoint เดิม เริ่มรับใหม่ทั้งไฟล์")
     args = parser.parse_args()
 
-    client = FileTransferClient(args.server_ip, args.server_port)
+    if args.asyncio:
+        import asyncio
+        import aio
+        save_as = args.output or f"receive_test/recv_{os.path.basename(args.filename)}"
+        ok = asyncio.run(aio.fetch_file(args.server_ip, args.server_port, args.filename, save_as, 'sw',
+                                        payload=args.payload, probe=args.probe, compress=args.compress))
+        sys.exit(0 if ok else 1)
+
+    client = FileTransferClient(args.server_ip, args.server_port, args.payload, args.probe, args.compress,
+                                args.restart)
     try:
         client.request_file(args.filename, args.output)
     except KeyboardInterrupt:
@@ -3,127 +3,487 @@ import socket
 import sys
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from proto import (
-    MAX_PACKET_SIZE, Packet, PacketType,
-    create_request_packet, create_ack_packet
+    MAX_PACKET_SIZE, PACKET_SIZE, HEADER_SIZE, MAX_PAYLOAD, MIN_PAYLOAD, Packet, PacketType,
+    create_request_packet, encode_into, ack_payload, sack_blocks, parse_info
 )
+from batchio import BatchSender, BatchReceiver, MAX_BATCH
+from pmtu import choose_payload, set_receive_buffer
+from fec import FEC_OVERHEAD, MAX_K, FecDecoder, parse_fec
+from compress import METHODS, FrameWriter
+from writebehind import ALIGN, BUFFER_SIZE, WriteBehind, preallocate
+from checkpoint import CHECKPOINT_BYTES, PART_SUFFIX, open_checkpoint, query_source, source_info
+from filehash import hash_prefix, new_hash, split_eof, verify, accepted, describe
+
+RWND = 64   # receiver-advertised window เริ่มต้น (จำนวน packet ที่ยอมให้ server ส่งค้างไว้)
+ACK_EVERY = 4      # delayed ACK: ส่ง cumulative ACK ทุก N packet ที่รับเรียงลำดับ
+ACK_DELAY = 0.01   # ...หรือเมื่อ packet แรกที่ยังไม่ได้ ACK รอนานเกินนี้ (ต้องน้อยกว่า MIN_RTO ของ server)
 
 class GBNClient:
-    def __init__(self, server_ip, server_port, timeout=1.0):
+    def __init__(self, server_ip, server_port, timeout=1.0, rwnd=RWND, payload=None, probe=False,
+                 ack_every=ACK_EVERY, ack_delay=ACK_DELAY, sack=True, fec=None, compress=None,
+                 write_buffer=BUFFER_SIZE, write_thread=False, restart=False):
         self.server = (server_ip, server_port)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.settimeout(timeout)
+        self.timeout = timeout
+        self.payload = payload   # ขนาด data ต่อ packet ที่ขอ (None = PACKET_SIZE)
+        self.probe = probe       # วัด path MTU ก่อนขอไฟล์
+        self.rwnd = rwnd
+
+        # buffer รับ/ส่ง ACK ที่ใช้ซ้ำ (zero-copy)
+        self._rx_buf = bytearray(MAX_PACKET_SIZE)
+        self._rx_view = memoryview(self._rx_buf)
+        self._ack_data = ack_payload(rwnd)  # แนบ rwnd ไปกับทุก ACK ให้ server จำกัดหน้าต่าง
+
+        # รับ DATA ที่ค้างอยู่ทั้งหมดในรอบเดียว แล้วส่ง ACK ของรอบนั้นรวดเดียว (batchio)
+        self._rx_batch = None
+        self._tx_batch = BatchSender(self.sock)
+        self._ack_bufs = [bytearray(64) for _ in range(MAX_BATCH + 1)]
+        self._ack_views = [memoryview(b) for b in self._ack_bufs]
+        self._acks = []   # ACK ที่รอส่งในรอบนี้
+
+        # delayed ACK: packet ที่รับเรียงแล้วแต่ยังไม่ได้ ACK และเวลาที่ต้อง ACK อย่างช้าที่สุด
+        # (ack_every=1 คือ ACK ทุก packet แบบเดิม) ถ้ามีช่องว่างหรือซ้ำจะ ACK ทันที
+        self.ack_every = max(1, ack_every)
+        self.ack_delay = ack_delay
+        self._pending = 0
+        self._ack_deadline = None
+
+        # SACK: เก็บ packet ที่มาก่อนลำดับไว้ (ไม่เกิน rwnd) แล้วแจ้งช่วงที่มีแล้วใน ACK
+        # ให้ server ส่งซ้ำเฉพาะช่องว่าง (sack=False คือ GBN แท้ ทิ้ง packet ที่มาก่อนลำดับ)
+        self.sack = sack
+        self._adv_rwnd = rwnd
+        self._ooo = {}   # seq -> data
+
+        # FEC (K, M): ขอให้ server ส่ง PARITY แล้วกู้ packet ที่หายเอง (ดู fec.py) ได้ผลดีที่สุดคู่กับ SACK
+        self.fec = fec
+        self._fec = None
+
+        # บีบอัด DATA ('zlib'/'lzma'): server ส่ง stream ของ frame แล้ว client แตกทีละบล็อกขณะเขียน (compress.py)
+        self.compress = compress
+        self._frames = None
+
+        # เขียนลงดิสก์ผ่าน write-behind buffer (writebehind.py) ไม่ให้ดิสก์ช้าหน่วงการส่ง ACK
+        self.write_buffer = write_buffer
+        self.write_thread = write_thread
+        self._disk = None
+        self.byte_range = None   # (start, end) เมื่อรับแค่ช่วงหนึ่งของไฟล์ (รับต่อ/fetch_parallel)
+
+        # รับต่อจาก checkpoint ของ <save_as>.part (restart=True → เริ่มใหม่ทั้งไฟล์) ดู checkpoint.py
+        self.restart = restart
+        self.checkpoint = None
+        self._ckpt_saved = 0
+        self._corrupt = False
+        self._stopped = False
+        self._file_hash = None   # hash ที่ server แนบมากับ EOF
+        self._resumed = False    # รับต่อจาก .part ของตัวเอง → ตรวจ hash ของทั้งไฟล์แทนเฉพาะช่วงที่รับ
+        self.full_hash = None    # hash ของทั้งไฟล์จาก EOF ของช่วง byte (fetch_parallel ใช้ตรวจไฟล์ที่ประกอบเสร็จ)
 
         # สถิติ
         self.start_time = None
         self.recv_packets = 0
         self.dup_packets = 0
         self.corrupted = 0
+        self.acks_sent = 0
+        self.sack_buffered = 0
 
-    def request(self, filename, save_as=None):
+    def request(self, filename, save_as=None, byte_range=None, checkpoint=None):
+        # byte_range=(start, end): ขอเฉพาะช่วง byte นี้แล้วเขียนลงไฟล์ save_as ที่มีอยู่แล้ว ณ offset start
+        # และบันทึกความคืบหน้าลง checkpoint (ใช้โดย fetch_parallel — ผู้เรียกจัดการไฟล์เอง)
         if save_as is None:
             save_as = f"recv_{os.path.basename(filename)}"
+        path = save_as
+        if byte_range is None:
+            # รับลง .part ก่อน ถ้ามี checkpoint ของไฟล์นี้ค้างอยู่ → ขอเฉพาะส่วนที่ยังขาด
+            # (เฉพาะเมื่อไฟล์บน server ยังมีขนาดและ mtime เดิม ไม่งั้นเริ่มใหม่ทั้งไฟล์)
+            path = save_as + PART_SUFFIX
+            checkpoint, changed = open_checkpoint(path, filename, lambda: query_source(self.server, filename),
+                                                  self.restart)
+            if changed:
+                print(f"[CLIENT-GBN] '{filename}' changed on the server since the checkpoint, restarting from byte 0")
+            start = checkpoint.offset
+            checkpoint.ranges = [[0, start]] if start else []
+            if start:
+                os.truncate(path, start)   # ทิ้งส่วนที่เขียนเกิน checkpoint (ไม่รู้ว่าครบหรือไม่)
+                byte_range = (start, None)
+                self._resumed = True
+                print(f"[CLIENT-GBN] Resuming '{filename}' from byte {start:,}")
+                if self.compress:
+                    print("[CLIENT-GBN] Resumed transfers are not compressed")
+                    self.compress = None
+        self.byte_range = byte_range
+        self.checkpoint = checkpoint
 
-        print(f"[CLIENT-GBN] Request '{filename}' -> {self.server}")
-        req = create_request_packet(filename)
+        self.payload = choose_payload(self.sock, self.server, self.payload, self.probe)
+        extra = 0
+        if self.fec:
+            # PARITY ยาวกว่า DATA FEC_OVERHEAD bytes → ลด payload ให้ PARITY ยังผ่านเส้นทางได้
+            extra = FEC_OVERHEAD
+            self.payload = min(self.payload, MAX_PAYLOAD - FEC_OVERHEAD)
+            if self.probe:
+                self.payload = max(MIN_PAYLOAD, self.payload - FEC_OVERHEAD)
+            self._fec = FecDecoder(*self.fec, self.payload)
+        self._rx_buf = bytearray(HEADER_SIZE + self.payload + extra)
+        self._rx_view = memoryview(self._rx_buf)
+        self._rx_batch = BatchReceiver(self.sock, size=HEADER_SIZE + self.payload + extra)
+
+        # ให้ socket เก็บ datagram ที่ค้างได้ทั้งหน้าต่าง และประกาศ rwnd ไม่เกินที่ buffer รับได้จริง
+        # (packet ใหญ่ + rwnd เต็ม อาจเกิน SO_RCVBUF แล้วถูก kernel ทิ้งเหมือน packet loss)
+        dgram = HEADER_SIZE + self.payload
+        fit = set_receive_buffer(self.sock, self.rwnd * dgram) // dgram
+        self._adv_rwnd = max(1, min(self.rwnd, fit))
+        self._ack_data = ack_payload(self._adv_rwnd)
+
+        span = f"{byte_range[0]}-{'' if byte_range[1] is None else byte_range[1]}" if byte_range else None
+        print(f"[CLIENT-GBN] Request '{filename}' -> {self.server} (payload={self.payload}, range={span})")
+        req = create_request_packet(filename, payload=self.payload if self.payload != PACKET_SIZE else None,
+                                    fec=f"{self.fec[0]}:{self.fec[1]}" if self.fec else None,
+                                    compress=self.compress, range=span)
         self.sock.sendto(req.to_bytes(), self.server)
 
-        ok = self._receive_gbn(filename, save_as)
-        self.sock.close()
+        ok = False
+        try:
+            ok = self._receive_gbn(filename, path)
+        finally:
+            self.sock.close()
+            if not ok:
+                self._save_checkpoint(final=True)
+                if path != save_as and (self._corrupt or not checkpoint.ranges):
+                    # ไม่มีข้อมูลที่ใช้ต่อได้ → ไม่ทิ้งไฟล์ค้างไว้
+                    checkpoint.remove()
+                    if os.path.exists(path):
+                        os.remove(path)
 
+        if path != save_as:
+            if ok:
+                checkpoint.remove()
+                os.replace(path, save_as)
+            elif checkpoint.ranges:
+                print(f"[CLIENT-GBN] Kept {checkpoint.offset:,} bytes in '{path}', run again to resume")
         if ok:
             print(f"[CLIENT-GBN] Done. Saved as '{save_as}'")
             return 0
-        else:
-            if os.path.exists(save_as):
-                os.remove(save_as)
-            print("[CLIENT-GBN] Failed.")
-            return 1
+        print("[CLIENT-GBN] Failed.")
+        return 1
+
+    def stop(self):
+        # ให้ _receive_loop หยุด (เรียกจาก thread อื่นได้ มีผลภายใน timeout ของ socket)
+        self._stopped = True
+
+    def _save_checkpoint(self, final=False):
+        # บันทึกช่วงที่ลงดิสก์แล้วของ stream นี้ (ทุก CHECKPOINT_BYTES หรือเมื่อหยุดรับ)
+        if self.checkpoint is None or self._disk is None or self._corrupt:
+            return
+        done = self._disk.flushed
+        if final or done - self._ckpt_saved >= CHECKPOINT_BYTES:
+            start = self.byte_range[0] if self.byte_range else 0
+            self.checkpoint.add(start, start + done)
+            if self.checkpoint.ranges:
+                self.checkpoint.save()
+            self._ckpt_saved = done
 
     def _receive_gbn(self, filename, save_as):
-        expected = 0            # ลำดับที่คาดว่าจะได้รับ "ตัวถัดไป"
-        received = {}           # เก็บเฉพาะ in-order ที่จะเขียน (สามารถเขียนทันทีได้)
         self.start_time = time.time()
 
-        with open(save_as, "wb") as out:
-            while True:
-                try:
-                    data, addr = self.sock.recvfrom(MAX_PACKET_SIZE)
-                except socket.timeout:
-                    # หากยังไม่เริ่มรับอะไรเลย ให้รอต่อ (server จะส่งซ้ำเอง)
-                    if expected == 0:
-                        print("[CLIENT-GBN] Waiting for first DATA...")
-                        continue
-                    # เริ่มรับไปแล้ว แต่เงียบ → อาจรอ EOF หรือ data resend
-                    # รอต่อไปตาม timeout วน loop
+        with open(save_as, "r+b" if self.byte_range else "wb") as f:
+            digest = new_hash()
+            if self._resumed:
+                # เริ่ม hash จากส่วนที่เก็บไว้ใน .part → ตรวจทั้งไฟล์กับ hash ของทั้งไฟล์ใน EOF ก่อนเปลี่ยนชื่อ
+                hash_prefix(f, self.byte_range[0], digest)
+            if self.byte_range:
+                f.seek(self.byte_range[0])
+            out = self._disk = WriteBehind(f, self.write_buffer, self.write_thread, digest=digest)
+            if self.compress:
+                out = self._frames = FrameWriter(self._disk)
+            try:
+                ok = self._receive_loop(out)
+            finally:
+                self._disk.close()
+        if not ok:
+            return False
+
+        if self._frames and not self._frames.complete():
+            print("[CLIENT-GBN] Compressed stream ended mid-frame")
+            return False
+        sent_hash, self.full_hash = split_eof(self._file_hash or b'')
+        hash_ok = verify(self.full_hash if self._resumed else sent_hash, self._disk.digest)
+        if not accepted(hash_ok):
+            print(f"[CLIENT-GBN] File hash: {describe(hash_ok)}, received file rejected")
+            self._corrupt = True
+            return False
+
+        # สถิติ
+        dur = time.time() - self.start_time
+        print("========== STATS ==========")
+        print(f"Received packets : {self.recv_packets}")
+        print(f"Duplicates       : {self.dup_packets}")
+        print(f"Corrupted        : {self.corrupted}")
+        print(f"ACKs sent        : {self.acks_sent} ({self.recv_packets / max(1, self.acks_sent):.1f} DATA/ACK)")
+        print(f"SACK buffered    : {self.sack_buffered}")
+        print(f"Disk writes      : {self._disk.summary()}")
+        print(f"File hash        : {describe(hash_ok)}")
+        if self._fec:
+            print(f"FEC recovered    : {self._fec.recovered} (parity received {self._fec.parity_packets})")
+        if self._frames:
+            print(f"Compression      : {self.compress}, {self._frames.summary()}")
+            print(f"Effective rate   : {self._frames.raw_bytes / dur / 1024 if dur > 0 else 0:.2f} KB/s")
+        print(f"Elapsed          : {dur:.2f}s")
+        return True
+
+    def _receive_loop(self, out):
+        # รับ DATA/PARITY/EOF จนจบไฟล์ เขียนข้อมูลที่เรียงแล้วลง out คืน False ถ้า server แจ้ง error
+        expected = 0            # ลำดับที่คาดว่าจะได้รับ "ตัวถัดไป"
+        pkt = Packet(PacketType.DATA, 0)
+
+        while not self._stopped:
+            # มี ACK ที่หน่วงไว้ → รอ packet ถัดไปไม่เกินเวลาที่ต้อง ACK
+            if self._ack_deadline is not None:
+                self.sock.settimeout(max(0.0005, self._ack_deadline - time.time()))
+            else:
+                self.sock.settimeout(self.timeout)
+            try:
+                nbytes, addr = self.sock.recvfrom_into(self._rx_buf)
+            except socket.timeout:
+                if self._ack_deadline is not None:
+                    # ครบเวลาหน่วง → ส่ง cumulative ACK ของทุก packet ที่ค้าง
+                    self._send_ack(expected - 1)
+                    self._flush_acks()
+                    continue
+                # หากยังไม่เริ่มรับอะไรเลย ให้รอต่อ (server จะส่งซ้ำเอง)
+                if expected == 0:
+                    print("[CLIENT-GBN] Waiting for first DATA...")
                     continue
+                # เริ่มรับไปแล้ว แต่เงียบ → อาจรอ EOF หรือ data resend
+                # รอต่อไปตาม timeout วน loop
+                continue
 
+            # ตัวแรกรอแบบ block แล้วดึงตัวที่ค้างอยู่ที่เหลือทั้งหมดโดยไม่ block
+            batch = [(self._rx_view, nbytes, addr)] + self._rx_batch.drain()
+            finished = False
+            for view, nbytes, addr in batch:
                 if addr != self.server:
                     continue
 
                 # แปลงและตรวจ checksum
-                pkt, ok = Packet.from_bytes(data)
-                if not ok:
+                if not pkt.load(view, nbytes):
                     self.corrupted += 1
                     # ไม่ส่ง ACK สำหรับแพ็กเก็ตเสียหาย
                     continue
 
                 # จัดการชนิดแพ็กเก็ต
                 if pkt.type == PacketType.ERROR:
-                    msg = pkt.data.decode('utf-8', errors='ignore')
+                    msg = str(pkt.data, 'utf-8', errors='ignore')
                     print(f"[CLIENT-GBN] Server error: {msg}")
+                    self._flush_acks()
                     return False
 
-                elif pkt.type == PacketType.DATA:
-                    self.recv_packets += 1
-                    seq = pkt.seq_num
-
-                    if seq == expected:
-                        # ถูกลำดับ → เขียนลงไฟล์ แล้วเลื่อน expected
-                        out.write(pkt.data)
-                        expected += 1
-                        # cumulative ACK สำหรับแพ็กเก็ตล่าสุดที่รับครบต่อเนื่อง
-                        ack = create_ack_packet(expected - 1)
-                        self.sock.sendto(ack.to_bytes(), self.server)
-                        print(f"[CLIENT-GBN] DATA #{seq} ok, ACK #{expected-1}")
-                    elif seq < expected:
-                        # ซ้ำ → ส่ง ACK เดิมซ้ำ (cumulative)
-                        self.dup_packets += 1
-                        ack = create_ack_packet(expected - 1)
-                        self.sock.sendto(ack.to_bytes(), self.server)
-                        print(f"[CLIENT-GBN] Duplicate #{seq}, re-ACK #{expected-1}")
+                elif pkt.type == PacketType.INFO:
+                    # ขนาดไฟล์จาก server → จองพื้นที่ไฟล์ล่วงหน้า (ถ้าบีบอัดจะได้ขนาดหลังแตกพอดี)
+                    # และจำขนาด/mtime ไว้ใน checkpoint ใหม่ (ใช้ตรวจก่อนรับต่อครั้งหน้า)
+                    source = source_info(parse_info(pkt.data))
+                    if source is not None and not self.byte_range:
+                        self._disk.preallocate(source['size'])
+                        self.checkpoint.identify(source)
+
+                elif pkt.type in (PacketType.DATA, PacketType.PARITY):
+                    if pkt.type == PacketType.DATA:
+                        self.recv_packets += 1
+                        arrivals = [(pkt.seq_num, pkt.data)]
                     else:
-                        # seq > expected (out-of-order) ใน GBN ให้ทิ้งและส่ง ACK ล่าสุด
-                        ack = create_ack_packet(expected - 1) if expected > 0 else create_ack_packet(0)
-                        self.sock.sendto(ack.to_bytes(), self.server)
-                        print(f"[CLIENT-GBN] Out-of-order #{seq}, expect #{expected}, send ACK #{expected-1 if expected>0 else 0}")
+                        # PARITY: ถ้าแถบนั้นขาด DATA แค่ตัวเดียว → กู้ได้เองโดยไม่ต้องรอส่งซ้ำ
+                        got = self._fec.add_parity(pkt.seq_num, pkt.data) if self._fec else None
+                        arrivals = [got] if got else []
+
+                    # DATA ที่กู้ได้จาก FEC ระหว่างนี้จะถูกต่อท้าย arrivals และจัดการแบบเดียวกัน
+                    for i, (seq, data) in enumerate(arrivals):
+                        recovered = i > 0 or pkt.type == PacketType.PARITY
+                        if recovered:
+                            print(f"[CLIENT-GBN] FEC recovered #{seq}")
+                        if seq == expected:
+                            # ถูกลำดับ → เขียนลงไฟล์ แล้วเลื่อน expected
+                            out.write(data)
+                            if not recovered:
+                                self._fec_add(seq, data, arrivals)
+                            expected += 1
+                            # เติมช่องว่างแล้ว → เขียน packet ที่เก็บไว้ต่อจากนี้ตามลำดับ
+                            filled = expected in self._ooo
+                            while expected in self._ooo:
+                                out.write(self._ooo.pop(expected))
+                                expected += 1
+                            # cumulative ACK สำหรับแพ็กเก็ตล่าสุดที่รับครบต่อเนื่อง (ทุก ack_every packet)
+                            self._pending += 1
+                            if filled or self._pending >= self.ack_every:
+                                self._send_ack(expected - 1)
+                                print(f"[CLIENT-GBN] DATA #{seq} ok, ACK #{expected-1}")
+                            else:
+                                if self._ack_deadline is None:
+                                    self._ack_deadline = time.time() + self.ack_delay
+                                print(f"[CLIENT-GBN] DATA #{seq} ok (delayed ACK)")
+                        elif seq < expected or seq in self._ooo:
+                            # ซ้ำ → ส่ง ACK เดิมซ้ำ (cumulative)
+                            self.dup_packets += 1
+                            # (packet ที่เก็บไว้ก่อนได้ #0 ซ้ำมา → ยังไม่มีอะไรให้ ACK)
+                            if expected > 0:
+                                self._send_ack(expected - 1)
+                            print(f"[CLIENT-GBN] Duplicate #{seq}, re-ACK #{expected-1 if expected>0 else '-'}")
+                        else:
+                            # seq > expected (out-of-order): SACK เก็บไว้ถ้ายังอยู่ในหน้าต่าง, GBN แท้ทิ้ง
+                            # แล้วส่ง ACK ล่าสุด (พร้อมช่วงที่มีแล้ว) ให้ server รู้ว่ามีช่องว่าง
+                            if self.sack and seq < expected + self._adv_rwnd:
+                                self._ooo[seq] = bytes(data)
+                                if not recovered:
+                                    self._fec_add(seq, self._ooo[seq], arrivals)
+                                self.sack_buffered += 1
+                            # (ถ้ายังไม่ได้ #0 ห้ามส่ง ACK #0 ไม่งั้น server จะเข้าใจว่า #0 ถึงแล้ว)
+                            if expected > 0:
+                                self._send_ack(expected - 1)
+                            print(f"[CLIENT-GBN] Out-of-order #{seq}, expect #{expected}, send ACK #{expected-1 if expected>0 else '-'}")
+                    if self._fec:
+                        self._fec.advance(expected)
 
                 elif pkt.type == PacketType.EOF:
                     # รับ EOF เมื่อและเฉพาะเมื่อรับครบถึง seq ของ EOF (EOF.seq = จำนวนแพ็กเก็ตข้อมูล)
                     if pkt.seq_num == expected:
-                        # ส่ง ACK EOF แล้วจบ
-                        ack = create_ack_packet(pkt.seq_num)
-                        self.sock.sendto(ack.to_bytes(), self.server)
+                        # ส่ง ACK EOF แล้วจบ (hash ตรวจหลังเขียนครบ)
+                        self._file_hash = bytes(pkt.data)
+                        self._send_ack(pkt.seq_num)
                         print("[CLIENT-GBN] EOF ok, ACK EOF")
+                        finished = True
                         break
                     else:
                         # ยังมี data ขาด → ขอซ้ำด้วย ACK ล่าสุด
-                        ack = create_ack_packet(expected - 1 if expected > 0 else 0)
-                        self.sock.sendto(ack.to_bytes(), self.server)
-                        print(f"[CLIENT-GBN] EOF early (have {expected}), send ACK #{expected-1 if expected>0 else 0}")
+                        if expected > 0:
+                            self._send_ack(expected - 1)
+                        print(f"[CLIENT-GBN] EOF early (have {expected}), send ACK #{expected-1 if expected>0 else '-'}")
 
                 else:
                     # ไม่รองรับชนิดอื่น
                     continue
 
-        # สถิติ
-        dur = time.time() - self.start_time
-        print("========== STATS ==========")
-        print(f"Received packets : {self.recv_packets}")
-        print(f"Duplicates       : {self.dup_packets}")
-        print(f"Corrupted        : {self.corrupted}")
-        print(f"Elapsed          : {dur:.2f}s")
-        return True
+            # ACK ที่หน่วงไว้เกินเวลาแล้ว (packet มาต่อเนื่องจนไม่เคย timeout)
+            if not finished and self._ack_deadline is not None and time.time() >= self._ack_deadline:
+                self._send_ack(expected - 1)
+            self._flush_acks()
+            if finished:
+                return True
+            self._save_checkpoint()
+        print("[CLIENT-GBN] Stopped")
+        return False
+
+    def _fec_add(self, seq, data, arrivals):
+        # ป้อน DATA ใหม่ (ครั้งเดียวต่อ seq) ให้ตัวถอด FEC ถ้ากู้ตัวอื่นได้ให้ต่อท้าย arrivals
+        if self._fec:
+            got = self._fec.add_data(seq, data)
+            if got:
+                arrivals.append(got)
+
+    def _send_ack(self, seq):
+        # ACK แบบ cumulative ครอบคลุม packet ที่หน่วงไว้ทั้งหมดด้วย
+        self._pending = 0
+        self._ack_deadline = None
+        self.acks_sent += 1
+        data = self._ack_data
+        if self._ooo:
+            data = ack_payload(self._adv_rwnd, sack_blocks(sorted(self._ooo)))
+        i = len(self._acks)
+        if i == len(self._ack_bufs):
+            # FEC กู้ packet ได้ → datagram เดียวอาจให้ ACK มากกว่าหนึ่งตัว buffer เต็มก่อนจบ batch ก็ส่งไปก่อน
+            self._flush_acks()
+            i = 0
+        n = encode_into(self._ack_bufs[i], PacketType.ACK, seq, data)
+        self._acks.append((self._ack_views[i][:n], self.server))
+
+    def _flush_acks(self):
+        if self._acks:
+            self._tx_batch.send(self._acks)
+            self._acks.clear()
+
+def split_ranges(size, streams):
+    # แบ่ง [0, size) เป็นไม่เกิน streams ช่วงเท่าๆ กัน ขอบช่วงลงตัวกับ ALIGN (การเขียนแต่ละช่วงจึงลงตัวด้วย)
+    step = -(-size // max(1, streams))
+    step = max(ALIGN, -(-step // ALIGN) * ALIGN)
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+def fetch_parallel(server_ip, server_port, filename, save_as, streams, restart=False, **opts):
+    # รับไฟล์เดียวผ่าน GBN หลาย session พร้อมกัน (socket แยก → server มองเป็น client คนละราย
+    # และกระจายไปหลาย worker ได้เมื่อรัน server_gbn.py --workers) แต่ละ session ขอช่วง byte ของตัวเอง
+    # แล้วเขียนลงไฟล์ที่จองพื้นที่ไว้ ณ offset ของช่วงนั้น (hash ใน EOF ตรวจแยกรายช่วง)
+    # ครบทุกช่วงแล้วตรวจทั้งไฟล์กับ hash ของทั้งไฟล์ที่แนบมากับ EOF ก่อนเปลี่ยนชื่อ (รวมช่วงจากรอบก่อนด้วย)
+    # ช่วงที่ได้แล้วบันทึกใน checkpoint ของ <save_as>.part → รันซ้ำจะขอเฉพาะช่วงที่ยังขาด
+    server = (server_ip, server_port)
+    source = query_source(server, filename)
+    if source is None:
+        print(f"[CLIENT-GBN] Could not get the size of '{filename}' from {server}")
+        return 1
+    size = source['size']
+    part = save_as + PART_SUFFIX
+    ckpt, changed = open_checkpoint(part, filename, lambda: source, restart)
+    ckpt.identify(source)
+    if changed:
+        print(f"[CLIENT-GBN] '{filename}' changed on the server since the checkpoint, restarting")
+    if not ckpt.ranges:
+        with open(part, "wb") as f:
+            preallocate(f, size)
+            f.truncate(size)
+    ranges = [gap for r in split_ranges(size, streams) for gap in ckpt.missing(*r)]
+    if not ranges and size:
+        # ได้ครบทุกช่วงแล้วแต่ยังไม่ได้ตรวจทั้งไฟล์ → ขอช่วงสุดท้ายซ้ำเพื่อให้ได้ hash ของทั้งไฟล์จาก EOF
+        ranges = split_ranges(size, streams)[-1:]
+    have = size - sum(end - start for start, end in ranges)
+    if have:
+        print(f"[CLIENT-GBN] Resuming '{filename}': {have:,} of {size:,} bytes already received")
+    print(f"[CLIENT-GBN] Fetching '{filename}' ({size:,} bytes) over {len(ranges)} streams")
+
+    start = time.time()
+    clients = [GBNClient(server_ip, server_port, **opts) for _ in ranges]
+    results = []
+    if ranges:
+        with ThreadPoolExecutor(len(ranges)) as pool:
+            futures = [pool.submit(c.request, filename, part, r, ckpt) for c, r in zip(clients, ranges)]
+            try:
+                results = [f.result() for f in futures]
+            except KeyboardInterrupt:
+                # หยุดทุก stream (แต่ละตัวบันทึกช่วงที่ได้ลง checkpoint เอง) แล้วส่งต่อ
+                for c in clients:
+                    c.stop()
+                for f in futures:
+                    f.exception()
+                print(f"[CLIENT-GBN] Interrupted, run again to resume '{filename}'")
+                raise
+    dur = time.time() - start
+
+    failed = [r for r, rc in zip(ranges, results) if rc != 0]
+    if failed:
+        ckpt.save()
+        print(f"[CLIENT-GBN] Failed: {len(failed)} of {len(ranges)} streams (ranges {failed})")
+        print(f"[CLIENT-GBN] Kept received ranges in '{part}', run again to resume")
+        return 1
+    if size:
+        full_hash = next((c.full_hash for c in clients if c.full_hash), None)
+        with open(part, "rb") as f:
+            hash_ok = verify(full_hash, hash_prefix(f, size))
+        if not accepted(hash_ok):
+            print(f"[CLIENT-GBN] File hash: {describe(hash_ok)}, received file rejected")
+            ckpt.remove()
+            os.remove(part)
+            return 1
+    ckpt.remove()
+    os.replace(part, save_as)
+    print("========== PARALLEL ==========")
+    print(f"Streams          : {len(ranges)}")
+    print(f"File size        : {size:,} bytes")
+    print(f"Throughput       : {(size - have) / dur / 1024 if dur > 0 else 0:.2f} KB/s")
+    print(f"Elapsed          : {dur:.2f}s")
+    print(f"[CLIENT-GBN] Done. Saved as '{save_as}'")
+    return 0
+
+def _fec_arg(text):
+    fec = parse_fec(text)
+    if fec is None:
+        raise argparse.ArgumentTypeError(f"expected K:M with 1 <= M <= K <= {MAX_K}, got {text!r}")
+    return fec
 
 def main():
     ap = argparse.ArgumentParser(description="GBN UDP Client") 
@@ -131,12 +491,45 @@ def main():
     ap.add_argument("server_port", type=int)
     ap.add_argument("filename")
     ap.add_argument("--timeout", type=float, default=1.0)
+    ap.add_argument("--rwnd", type=int, default=RWND, help="receiver-advertised window (packets)")
+    ap.add_argument("--ack-every", type=int, default=ACK_EVERY, help="send a cumulative ACK every N in-order packets (1 = ACK each packet)")
+    ap.add_argument("--ack-delay", type=float, default=ACK_DELAY * 1000, help="max delay before a pending ACK is sent (ms)")
+    ap.add_argument("--no-sack", action="store_true", help="plain Go-Back-N: drop out-of-order packets, no SACK blocks")
+    ap.add_argument("--fec", type=_fec_arg, default=None, metavar="K:M",
+                    help="ask for M XOR parity packets per K data packets (e.g. 8:1)")
+    ap.add_argument("--compress", choices=sorted(METHODS), default=None,
+                    help="ask the server to compress DATA per block (skipped for already-compressed files)")
+    ap.add_argument("--payload", type=int, default=None, help=f"data bytes per packet to negotiate (default {PACKET_SIZE})")
+    ap.add_argument("--probe", action="store_true", help="probe the largest payload that gets through (up to --payload)")
+    ap.add_argument("--write-buffer", type=int, default=BUFFER_SIZE // 1024, help="write-behind buffer before writing to disk (KB)")
+    ap.add_argument("--write-thread", action="store_true", help="write to disk on a background thread")
+    ap.add_argument("--streams", type=int, default=1,
+                    help="fetch byte ranges of the file over N concurrent sessions")
+    ap.add_argument("--restart", action="store_true",
+                    help="ignore an existing checkpoint and fetch the whole file again")
     ap.add_argument("-o", "--output")
+    ap.add_argument("--asyncio", action="store_true", help="use the asyncio transport (aio.py)")
     args = ap.parse_args()
     
     save_as = args.output or f"receive_test_gbn/recv_gbn_{os.path.basename(args.filename)}" 
-    c = GBNClient(args.server_ip, args.server_port, timeout=args.timeout)
+    if args.streams > 1 and (args.compress or args.asyncio):
+        ap.error("--streams cannot be combined with --compress or --asyncio")
+    if args.asyncio:
+        import asyncio
+        import aio
+        ok = asyncio.run(aio.fetch_file(args.server_ip, args.server_port, args.filename, save_as, 'gbn', rwnd=args.rwnd,
+                                        payload=args.payload, probe=args.probe,
+                                        ack_every=args.ack_every, ack_delay=args.ack_delay / 1000,
+                                        compress=args.compress))
+        sys.exit(0 if ok else 1)
+    opts = dict(timeout=args.timeout, rwnd=args.rwnd, payload=args.payload, probe=args.probe,
+                ack_every=args.ack_every, ack_delay=args.ack_delay / 1000,
+                sack=not args.no_sack, fec=args.fec, compress=args.compress,
+                write_buffer=args.write_buffer * 1024, write_thread=args.write_thread, restart=args.restart)
     try:
+        if args.streams > 1:
+            sys.exit(fetch_parallel(args.server_ip, args.server_port, args.filename, save_as, args.streams, **opts))
+        c = GBNClient(args.server_ip, args.server_port, **opts)
         sys.exit(c.request(args.filename, save_as))
     except KeyboardInterrupt:
         print("\n[CLIENT-GBN] Interrupted.")
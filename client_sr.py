@@ -0,0 +1,226 @@
+import argparse
+import socket
+import sys
+import os
+import time
+from proto import (
+    MAX_PACKET_SIZE, MAX_RETRIES, MAX_RTO, PACKET_SIZE, HEADER_SIZE, Packet, PacketType,
+    create_request_packet, encode_into
+)
+from pmtu import choose_payload, set_receive_buffer
+from compress import METHODS, FrameWriter
+from filehash import HashWriter, verify, accepted, describe
+from checkpoint import PART_SUFFIX
+
+WINDOW_SIZE = 8   # ขนาดหน้าต่างรับ (ต้องเท่ากับหน้าต่างฝั่ง server)
+# ไม่ได้ยินอะไรจาก server นานเท่านี้ → เลิก ต้องนานกว่าที่ server ส่งซ้ำจนยอมแพ้ (RTO สูงสุด x MAX_RETRIES)
+# ไม่งั้นช่วงที่ server backoff ถึง MAX_RTO แล้วส่งซ้ำอยู่ client จะเลิกไปก่อน
+IDLE_TIMEOUT = MAX_RTO * (MAX_RETRIES + 1)
+
+class SRClient:
+    def __init__(self, server_ip, server_port, timeout=1.0, window=WINDOW_SIZE, payload=None, probe=False,
+                 compress=None, idle_timeout=IDLE_TIMEOUT):
+        self.server = (server_ip, server_port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(timeout)   # tick สำหรับส่ง REQUEST ซ้ำจนกว่าจะได้ packet แรก
+        self.idle_timeout = idle_timeout
+        self.window = window
+        self.payload = payload   # ขนาด data ต่อ packet ที่ขอ (None = PACKET_SIZE)
+        self.probe = probe       # วัด path MTU ก่อนขอไฟล์
+        self._request = None     # REQUEST ที่เข้ารหัสแล้ว (ส่งซ้ำจนกว่าจะได้ packet แรก)
+        self.compress = compress # ขอให้ server บีบอัด DATA ('zlib'/'lzma') แล้วแตกระหว่างเขียน
+        self._frames = None
+
+        # buffer รับ/ส่ง ACK ที่ใช้ซ้ำ (zero-copy)
+        self._rx_buf = bytearray(MAX_PACKET_SIZE)
+        self._rx_view = memoryview(self._rx_buf)
+        self._ack_buf = bytearray(MAX_PACKET_SIZE)
+        self._ack_view = memoryview(self._ack_buf)
+
+        # สถิติ
+        self.start_time = None
+        self.recv_packets = 0
+        self.dup_packets = 0
+        self.buffered = 0
+        self.corrupted = 0
+
+    def request(self, filename, save_as=None):
+        if save_as is None:
+            save_as = f"recv_{os.path.basename(filename)}"
+
+        self.payload = choose_payload(self.sock, self.server, self.payload, self.probe)
+        self._rx_buf = bytearray(HEADER_SIZE + self.payload)
+        self._rx_view = memoryview(self._rx_buf)
+        set_receive_buffer(self.sock, self.window * (HEADER_SIZE + self.payload))  # เก็บได้ทั้งหน้าต่าง
+
+        print(f"[CLIENT-SR] Request '{filename}' -> {self.server} (payload={self.payload})")
+        req = create_request_packet(filename, payload=self.payload if self.payload != PACKET_SIZE else None,
+                                    compress=self.compress)
+        self._request = req.to_bytes()
+        self.sock.sendto(self._request, self.server)
+
+        # รับลง .part ก่อน แล้วเปลี่ยนชื่อเมื่อรับครบและ hash ตรงเท่านั้น → ไฟล์เดิมที่ชื่อ save_as ไม่ถูกทับถ้ารับไม่สำเร็จ
+        part = save_as + PART_SUFFIX
+        try:
+            ok = self._receive_sr(filename, part)
+            if ok:
+                os.replace(part, save_as)
+        finally:
+            self.sock.close()
+            if os.path.exists(part):
+                os.remove(part)
+
+        if ok:
+            print(f"[CLIENT-SR] Done. Saved as '{save_as}'")
+            return 0
+        else:
+            print("[CLIENT-SR] Failed.")
+            return 1
+
+    def _receive_sr(self, filename, path):
+        expected = 0            # rcv_base: seq ถัดไปที่จะเขียนลงไฟล์
+        reorder = {}            # buffer ของ packet ที่มาก่อนลำดับ: seq -> data
+        self.start_time = time.time()
+        pkt = Packet(PacketType.DATA, 0)
+
+        last_heard = time.time()   # เวลาที่ได้ packet จาก server ล่าสุด (REQUEST หาย, server ไม่ตอบ หรือหยุดส่งกลางทาง)
+        resends = 0
+        accepted_request = False   # ได้ INFO แล้ว = server รับ REQUEST แล้ว (อาจยังบีบอัดไฟล์อยู่)
+        file_hash = None
+        with open(path, "wb") as f:
+            out = hashed = HashWriter(f)   # hash ของข้อมูลดิบ สะสมระหว่างเขียน
+            if self.compress:
+                out = self._frames = FrameWriter(hashed)
+            while True:
+                try:
+                    nbytes, addr = self.sock.recvfrom_into(self._rx_buf)
+                except socket.timeout:
+                    silent = time.time() - last_heard
+                    if silent >= self.idle_timeout:
+                        print(f"[CLIENT-SR] No packet from server for {silent:.1f}s (have {expected}), abort")
+                        return False
+                    if expected == 0 and not reorder and not accepted_request:
+                        # ยังไม่ได้ DATA เลย → REQUEST อาจหาย ส่งซ้ำ
+                        resends += 1
+                        print(f"[CLIENT-SR] Waiting for first DATA, resend REQUEST (#{resends})")
+                        self.sock.sendto(self._request, self.server)
+                    # ได้ DATA แล้ว: การส่งซ้ำเป็นหน้าที่ของ server (RTO รายแพ็กเก็ต) → รอต่อจนถึง idle_timeout
+                    continue
+
+                if addr != self.server:
+                    continue
+                last_heard = time.time()
+
+                # แปลงและตรวจ checksum
+                if not pkt.load(self._rx_view, nbytes):
+                    self.corrupted += 1
+                    continue
+
+                if pkt.type == PacketType.ERROR:
+                    msg = str(pkt.data, 'utf-8', errors='ignore')
+                    print(f"[CLIENT-SR] Server error: {msg}")
+                    return False
+
+                elif pkt.type == PacketType.DATA:
+                    self.recv_packets += 1
+                    seq = pkt.seq_num
+
+                    if expected <= seq < expected + self.window:
+                        # อยู่ในหน้าต่างรับ → ACK รายตัวเสมอ
+                        self._send_ack(seq)
+                        if seq in reorder:
+                            self.dup_packets += 1
+                            print(f"[CLIENT-SR] Duplicate #{seq} (buffered), re-ACK #{seq}")
+                            continue
+                        if seq == expected:
+                            # ถูกลำดับ → เขียนลงไฟล์ แล้วปล่อยตัวที่ buffer ไว้ต่อเนื่องกัน
+                            out.write(pkt.data)
+                            expected += 1
+                            while expected in reorder:
+                                out.write(reorder.pop(expected))
+                                expected += 1
+                            print(f"[CLIENT-SR] DATA #{seq} ok, ACK #{seq} (next #{expected})")
+                        else:
+                            # มาก่อนลำดับ → เก็บไว้ใน reorder buffer (ต้อง copy จาก buffer รับ)
+                            reorder[seq] = bytes(pkt.data)
+                            self.buffered += 1
+                            print(f"[CLIENT-SR] DATA #{seq} buffered, ACK #{seq} (waiting #{expected})")
+                    elif expected - self.window <= seq < expected:
+                        # เคยรับแล้วแต่ ACK หาย → ACK ซ้ำให้ server เลื่อนหน้าต่างได้
+                        self.dup_packets += 1
+                        self._send_ack(seq)
+                        print(f"[CLIENT-SR] Duplicate #{seq}, re-ACK #{seq}")
+                    else:
+                        # นอกหน้าต่าง → ทิ้ง
+                        continue
+
+                elif pkt.type == PacketType.INFO:
+                    # INFO ตอนเริ่มหรือ keepalive ระหว่าง server เตรียม source (last_heard รีเซ็ตไปแล้วข้างบน)
+                    accepted_request = True
+
+                elif pkt.type == PacketType.EOF:
+                    # รับ EOF เมื่อเขียนครบทุก packet แล้วเท่านั้น (EOF.seq = จำนวนแพ็กเก็ตข้อมูล)
+                    if pkt.seq_num == expected:
+                        file_hash = bytes(pkt.data)
+                        self._send_ack(pkt.seq_num)
+                        print("[CLIENT-SR] EOF ok, ACK EOF")
+                        break
+                    print(f"[CLIENT-SR] EOF early (have {expected}), ignore")
+
+                else:
+                    continue
+
+        if self._frames and not self._frames.complete():
+            print("[CLIENT-SR] Compressed stream ended mid-frame")
+            return False
+        hash_ok = verify(file_hash, hashed.hash)
+        if not accepted(hash_ok):
+            print(f"[CLIENT-SR] File hash: {describe(hash_ok)}, received file rejected")
+            return False
+
+        # สถิติ
+        dur = time.time() - self.start_time
+        print("========== STATS ==========")
+        print(f"Received packets : {self.recv_packets}")
+        print(f"Buffered (OOO)   : {self.buffered}")
+        print(f"Duplicates       : {self.dup_packets}")
+        print(f"Corrupted        : {self.corrupted}")
+        print(f"File hash        : {describe(hash_ok)}")
+        if self._frames:
+            print(f"Compression      : {self.compress}, {self._frames.summary()}")
+            print(f"Effective rate   : {self._frames.raw_bytes / dur / 1024 if dur > 0 else 0:.2f} KB/s")
+        print(f"Elapsed          : {dur:.2f}s")
+        return True
+
+    def _send_ack(self, seq):
+        n = encode_into(self._ack_buf, PacketType.ACK, seq)
+        self.sock.sendto(self._ack_view[:n], self.server)
+
+def main():
+    ap = argparse.ArgumentParser(description="Selective Repeat UDP Client")
+    ap.add_argument("server_ip")
+    ap.add_argument("server_port", type=int)
+    ap.add_argument("filename")
+    ap.add_argument("--timeout", type=float, default=1.0)
+    ap.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                    help=f"abort after this many seconds without a packet from the server (default {IDLE_TIMEOUT:g})")
+    ap.add_argument("--window", type=int, default=WINDOW_SIZE)
+    ap.add_argument("--payload", type=int, default=None, help=f"data bytes per packet to negotiate (default {PACKET_SIZE})")
+    ap.add_argument("--probe", action="store_true", help="probe the largest payload that gets through (up to --payload)")
+    ap.add_argument("--compress", choices=sorted(METHODS), default=None,
+                    help="ask the server to compress DATA per block (skipped for already-compressed files)")
+    ap.add_argument("-o", "--output")
+    args = ap.parse_args()
+
+    save_as = args.output or f"receive_test_sr/recv_sr_{os.path.basename(args.filename)}"
+    c = SRClient(args.server_ip, args.server_port, timeout=args.timeout, window=args.window,
+                 payload=args.payload, probe=args.probe, compress=args.compress,
+                 idle_timeout=args.idle_timeout)
+    try:
+        sys.exit(c.request(args.filename, save_as))
+    except KeyboardInterrupt:
+        print("\n[CLIENT-SR] Interrupted.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
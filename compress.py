@@ -0,0 +1,139 @@
+import lzma
+import os
+import shutil
+import struct
+import zlib
+
+# บีบอัด DATA แบบเจรจากันได้ (client ขอด้วย REQUEST option compress=zlib|lzma)
+# server แปลงไฟล์เป็น stream ของ frame: FRAME header (วิธี, ความยาว) + ข้อมูลของบล็อกละ BLOCK_SIZE
+# แต่ละบล็อกบีบอัดแยกกัน → client แตกได้ทีละบล็อกตามลำดับที่รับ (ใช้หน่วยความจำไม่เกิน 1 บล็อก)
+# และ server ตัด stream นี้เป็น packet ได้ตามปกติ (ส่งซ้ำ/หน้าต่างเหมือนไฟล์ทั่วไป)
+
+STORED = 0                                  # frame เก็บข้อมูลดิบ (ไม่บีบอัด)
+METHODS = {'zlib': 1, 'lzma': 2}
+FRAME = struct.Struct('!BI')                # วิธีบีบอัด, ความยาวข้อมูลใน frame
+BLOCK_SIZE = 64 * 1024
+MIN_SAVING = 0.9       # บล็อกที่บีบแล้วเหลือ >= 90% ของเดิม → เก็บแบบดิบแทน
+SAMPLE_BLOCKS = 4      # ลองบีบบล็อกแรกๆ ก่อน ถ้าไม่คุ้มเลยก็ไม่บีบทั้งไฟล์
+
+# นามสกุลของไฟล์ที่บีบอัดมาแล้ว (บีบซ้ำไม่ได้ผล)
+COMPRESSED_EXTS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.avi', '.mov',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.lzma', '.7z', '.rar', '.zst', '.pdf', '.docx', '.xlsx',
+}
+
+def request_compress(options):  # วิธีบีบอัดที่ client ขอมาใน REQUEST (None = ไม่บีบ)
+    method = options.get('compress')
+    return method if method in METHODS else None
+
+def _compress(method, data):
+    if method == METHODS['zlib']:
+        return zlib.compress(data, 6)
+    return lzma.compress(data, preset=1)
+
+def _decompress(method, data):
+    if method == STORED:
+        return bytes(data)
+    if method == METHODS['zlib']:
+        return zlib.decompress(data)
+    if method == METHODS['lzma']:
+        return lzma.decompress(data)
+    raise ValueError(f"Unknown compression method {method}")
+
+def likely_compressed(filename):
+    return os.path.splitext(filename)[1].lower() in COMPRESSED_EXTS
+
+def compress_file(filename, name, out, block_size=BLOCK_SIZE, digest=None):
+    # เขียน stream ของ frame ของไฟล์ลง out คืนค่า (ขนาดเดิม, ขนาดหลังบีบ, บีบจริงหรือไม่)
+    # digest: hash object ที่จะสะสมข้อมูลดิบไปพร้อมกัน (ไม่ต้องอ่านไฟล์อีกรอบ)
+    method = METHODS[name]
+    raw_size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        if likely_compressed(filename) or not _worth_it(f, method, block_size):
+            # ไม่คุ้มที่จะบีบ → frame ดิบ frame เดียวทั้งไฟล์ (client ส่งต่อลงไฟล์ได้ทันทีไม่ต้องรอครบ frame)
+            f.seek(0)
+            out.write(FRAME.pack(STORED, raw_size))
+            if digest is None:
+                shutil.copyfileobj(f, out)
+            else:
+                for block in iter(lambda: f.read(block_size), b''):
+                    digest.update(block)
+                    out.write(block)
+            return raw_size, FRAME.size + raw_size, False
+        f.seek(0)
+        wire = 0
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            if digest is not None:
+                digest.update(block)
+            packed = _compress(method, block)
+            if len(packed) >= len(block) * MIN_SAVING:
+                out.write(FRAME.pack(STORED, len(block)))
+                out.write(block)
+                wire += FRAME.size + len(block)
+            else:
+                out.write(FRAME.pack(method, len(packed)))
+                out.write(packed)
+                wire += FRAME.size + len(packed)
+    return raw_size, wire, True
+
+def _worth_it(f, method, block_size):
+    raw = packed = 0
+    for _ in range(SAMPLE_BLOCKS):
+        block = f.read(block_size)
+        if not block:
+            break
+        raw += len(block)
+        packed += len(_compress(method, block))
+    return raw == 0 or packed < raw * MIN_SAVING
+
+class FrameWriter:
+    # รับ stream ของ frame ตามลำดับผ่าน write() (ใช้แทนไฟล์ปลายทางได้เลย) แตกแล้วเขียนข้อมูลดิบลง out
+    def __init__(self, out):
+        self.out = out
+        self._buf = bytearray()
+        self._frame = None   # (วิธี, ความยาว) ของ frame บีบอัดที่กำลังรับ
+        self._stored = 0     # จำนวน byte ดิบที่เหลือของ frame STORED ปัจจุบัน
+
+        # สถิติ
+        self.wire_bytes = 0
+        self.raw_bytes = 0
+
+    def write(self, data):
+        self.wire_bytes += len(data)
+        data = memoryview(data)
+        while len(data):
+            if self._stored:
+                n = min(self._stored, len(data))
+                self.out.write(data[:n])
+                self.raw_bytes += n
+                self._stored -= n
+                data = data[n:]
+                continue
+            need = FRAME.size if self._frame is None else self._frame[1]
+            take = min(need - len(self._buf), len(data))
+            self._buf += data[:take]
+            data = data[take:]
+            if len(self._buf) < need:
+                break
+            if self._frame is None:
+                method, n = FRAME.unpack(self._buf)
+                if method == STORED:
+                    self._stored = n
+                else:
+                    self._frame = (method, n)
+            else:
+                raw = _decompress(self._frame[0], self._buf)
+                self.out.write(raw)
+                self.raw_bytes += len(raw)
+                self._frame = None
+            self._buf.clear()
+
+    def complete(self):  # True ถ้าไม่มี frame ค้างครึ่งๆ กลางๆ
+        return self._frame is None and not self._stored and not self._buf
+
+    def summary(self):
+        ratio = self.wire_bytes / self.raw_bytes if self.raw_bytes else 1.0
+        return f"{self.raw_bytes:,} bytes raw, {self.wire_bytes:,} bytes on the wire ({ratio:.1%})"
@@ -0,0 +1,112 @@
+MAX_WINDOW = 64   # ขนาดหน้าต่างสูงสุดเมื่อปรับอัตโนมัติ (packets)
+MODES = ('fixed', 'aimd', 'delay')
+
+class FixedWindow:
+    # หน้าต่างคงที่ (พฤติกรรมเดิมของ GBN)
+    def __init__(self, size):
+        self.cwnd = float(size)
+        self.ssthresh = float(size)
+        self.max_window = size
+        self.max_seen = size
+
+    @property
+    def window(self):
+        return int(self.cwnd)
+
+    def on_ack(self, acked, rtt=None):
+        pass
+
+    def on_timeout(self):
+        pass
+
+    def on_fast_retransmit(self):
+        pass
+
+    def summary(self):
+        return f"cwnd={self.window}"
+
+class AIMDWindow(FixedWindow):
+    # Slow start + AIMD (แบบ TCP Reno)
+    #   slow start: cwnd += จำนวน packet ที่ถูก ACK (โตเป็น 2 เท่าต่อ RTT) จนถึง ssthresh
+    #   congestion avoidance: cwnd += 1/cwnd ต่อ packet ที่ถูก ACK (+1 ต่อ RTT)
+    #   timeout: ssthresh = cwnd/2, cwnd = 1
+    def __init__(self, max_window=MAX_WINDOW, initial=1, ssthresh=None):
+        self.cwnd = float(initial)
+        self.ssthresh = float(ssthresh if ssthresh is not None else max_window)
+        self.max_window = max_window
+        self.max_seen = initial
+
+        # สถิติ
+        self.timeouts = 0
+        self.fast_retransmits = 0
+
+    @property
+    def window(self):
+        return max(1, min(self.max_window, int(self.cwnd)))
+
+    def on_ack(self, acked, rtt=None):
+        for _ in range(acked):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+            else:
+                self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, float(self.max_window))
+        self.max_seen = max(self.max_seen, self.window)
+
+    def on_timeout(self):
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = 1.0
+        self.timeouts += 1
+
+    def on_fast_retransmit(self):
+        # ACK ซ้ำยังมาอยู่ = เส้นทางยังส่งได้ → ลดครึ่ง ไม่ต้องกลับไป slow start (fast recovery แบบ Reno)
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = self.ssthresh
+        self.fast_retransmits += 1
+
+    def summary(self):
+        return (f"cwnd={self.window} ssthresh={self.ssthresh:.1f} "
+                f"max_cwnd={self.max_seen} timeouts={self.timeouts} fast={self.fast_retransmits}")
+
+class DelayWindow(AIMDWindow):
+    # แบบ delay-based (คล้าย TCP Vegas): เทียบ throughput ที่คาดหวังกับที่ได้จริงจาก RTT
+    #   diff = cwnd * (1 - base_rtt / rtt) ≈ จำนวน packet ที่ค้างอยู่ในคิวของเส้นทาง
+    #   diff < ALPHA → เพิ่ม cwnd, diff > BETA → ลด cwnd (ทีละ 1 ต่อ RTT)
+    # ยังคงใช้ slow start ตอนเริ่ม และเมื่อ timeout จะทำเหมือน AIMD (ssthresh = cwnd/2, cwnd = 1)
+    ALPHA = 2
+    BETA = 4
+
+    def __init__(self, max_window=MAX_WINDOW, initial=1, ssthresh=None):
+        super().__init__(max_window, initial, ssthresh)
+        self.base_rtt = None
+
+    def on_ack(self, acked, rtt=None):
+        if rtt is None or rtt <= 0:
+            super().on_ack(acked)
+            return
+        self.base_rtt = rtt if self.base_rtt is None else min(self.base_rtt, rtt)
+        diff = self.cwnd * (1 - self.base_rtt / rtt)
+        if self.cwnd < self.ssthresh and diff < self.BETA:
+            self.cwnd += acked
+        elif diff < self.ALPHA:
+            self.cwnd += acked / self.cwnd
+        elif diff > self.BETA:
+            # คิวเริ่มยาว → ออกจาก slow start และลดหน้าต่างลง
+            self.ssthresh = min(self.ssthresh, self.cwnd)
+            self.cwnd = max(1.0, self.cwnd - acked / self.cwnd)
+        self.cwnd = min(self.cwnd, float(self.max_window))
+        self.max_seen = max(self.max_seen, self.window)
+
+    def summary(self):
+        base = f"{self.base_rtt * 1000:.2f}ms" if self.base_rtt is not None else "-"
+        return f"{super().summary()} base_rtt={base}"
+
+def make_window(mode, size):
+    # mode: 'fixed' → หน้าต่างคงที่ขนาด size, 'aimd'/'delay' → ปรับอัตโนมัติไม่เกิน size
+    if mode == 'fixed':
+        return FixedWindow(size)
+    if mode == 'aimd':
+        return AIMDWindow(size)
+    if mode == 'delay':
+        return DelayWindow(size)
+    raise ValueError(f"Unknown congestion control mode: {mode}")
@@ -0,0 +1,122 @@
+import struct
+
+# Forward error correction แบบ XOR parity (ใช้กับ GBN)
+# แบ่ง DATA เป็นบล็อกละ K packet แต่ละบล็อกมี parity M packet: parity j = XOR ของ packet ที่ i % M == j
+# client กู้ packet ที่หายได้เองแถบละ 1 ตัว โดยไม่ต้องรอ server ส่งซ้ำ (M มาก = กู้ได้มาก แต่เปลือง bandwidth)
+# PARITY packet: seq = block * M + j, data = PARITY_HEADER + XOR ของ data (ตัวที่สั้นกว่าเติม 0 ท้าย)
+
+PARITY_HEADER = struct.Struct('!HH')   # XOR ของความยาว data, จำนวน DATA ในบล็อกนี้
+FEC_OVERHEAD = PARITY_HEADER.size      # PARITY ยาวกว่า DATA เต็มขนาดเท่านี้
+MAX_K = 64
+
+def parse_fec(text):  # "K:M" (หรือ "K" = M 1) → (k, m) หรือ None ถ้าไม่ถูกต้อง
+    k, _, m = str(text).partition(':')
+    try:
+        k, m = int(k), int(m or 1)
+    except ValueError:
+        return None
+    if not 1 <= m <= k <= MAX_K:
+        return None
+    return k, m
+
+def request_fec(options):  # FEC ที่ client ขอมาใน REQUEST (None = ไม่ใช้)
+    return parse_fec(options['fec']) if 'fec' in options else None
+
+def _as_int(data, size):
+    # data ที่เติม 0 ท้ายจนยาว size เป็นจำนวนเต็ม (XOR ทีละทั้ง chunk ในระดับ C)
+    return int.from_bytes(data, 'big') << (8 * (size - len(data)))
+
+def parity_packets(source, block, k, m):
+    # คืน [(seq, data), ...] ของ PARITY สำหรับบล็อกนี้ (source: FileSource)
+    first = block * k
+    count = min(k, source.num_chunks - first)
+    size = source.chunk_size
+    out = []
+    for j in range(min(m, count)):
+        acc = 0
+        lens = 0
+        for s in range(first + j, first + count, m):
+            chunk = source.chunk(s)
+            acc ^= _as_int(chunk, size)
+            lens ^= len(chunk)
+        out.append((block * m + j, PARITY_HEADER.pack(lens, count) + acc.to_bytes(size, 'big')))
+    return out
+
+class FecDecoder:
+    # สะสม XOR ของ DATA ที่รับได้ในแต่ละแถบ เมื่อขาดแค่ตัวเดียวและมี PARITY แล้ว → กู้ตัวนั้นคืน
+    # ต้องป้อน DATA แต่ละ seq เพียงครั้งเดียว (ตัวที่รับซ้ำไม่ต้องป้อน)
+    def __init__(self, k, m, size):
+        self.k = k
+        self.m = m
+        self.size = size
+        self.stripes = {}   # (block, j) -> [xor, xor ของความยาว, จำนวนที่ได้, ผลรวม seq ที่ได้, จำนวนในบล็อก]
+        self.closed = set() # แถบที่ได้ครบหรือกู้แล้ว (PARITY/DATA ที่มาทีหลังต้องไม่สร้างแถบใหม่ขึ้นมา)
+        self.low_block = 0
+
+        # สถิติ
+        self.parity_packets = 0
+        self.recovered = 0
+
+    def _stripe(self, key):
+        # คืน None ถ้าแถบนี้ปิดไปแล้ว
+        st = self.stripes.get(key)
+        if st is None and key not in self.closed:
+            st = self.stripes[key] = [0, 0, 0, 0, None]
+        return st
+
+    def _close(self, key):
+        del self.stripes[key]
+        self.closed.add(key)
+
+    def add_data(self, seq, data):
+        # คืน (seq, data) ที่กู้ได้ หรือ None
+        block, i = divmod(seq, self.k)
+        if block < self.low_block:
+            return None
+        key = (block, i % self.m)
+        st = self._stripe(key)
+        if st is None:
+            return None
+        st[0] ^= _as_int(data, self.size)
+        st[1] ^= len(data)
+        st[2] += 1
+        st[3] += seq
+        return self._try(key, st)
+
+    def add_parity(self, pseq, payload):
+        self.parity_packets += 1
+        block, j = divmod(pseq, self.m)
+        if block < self.low_block or len(payload) < FEC_OVERHEAD:
+            return None
+        st = self._stripe((block, j))
+        if st is None or st[4] is not None:   # แถบที่ปิดแล้ว หรือ PARITY ซ้ำ
+            return None
+        lens, count = PARITY_HEADER.unpack_from(payload)
+        st[0] ^= int.from_bytes(payload[FEC_OVERHEAD:], 'big')
+        st[1] ^= lens
+        st[4] = count
+        return self._try((block, j), st)
+
+    def _try(self, key, st):
+        if st[4] is None:
+            return None
+        block, j = key
+        members = range(block * self.k + j, block * self.k + st[4], self.m)
+        if st[2] != len(members) - 1:
+            if st[2] >= len(members):
+                self._close(key)   # ได้ครบทุกตัวแล้ว ไม่มีอะไรให้กู้
+            return None
+        # ขาดพอดีหนึ่งตัว → กู้ได้
+        self._close(key)
+        self.recovered += 1
+        seq = sum(members) - st[3]
+        return seq, st[0].to_bytes(self.size, 'big')[:st[1]]
+
+    def advance(self, expected):
+        # ทิ้งแถบของบล็อกที่รับครบตามลำดับแล้ว (seq < expected ทั้งบล็อก)
+        low = expected // self.k
+        if low > self.low_block:
+            self.low_block = low
+            for key in [key for key in self.stripes if key[0] < low]:
+                del self.stripes[key]
+            self.closed = {key for key in self.closed if key[0] >= low}
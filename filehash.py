@@ -0,0 +1,55 @@
+import hashlib
+import hmac
+
+# hash ของไฟล์ทั้งไฟล์ (ข้อมูลดิบก่อนบีบอัด) แนบไปกับ EOF ให้ client ตรวจว่าได้ไฟล์ตรงกับต้นทางทุก byte
+# ทั้งสองฝั่งคำนวณสะสมระหว่างส่ง/รับ (server ตอนอ่าน chunk ครั้งแรก, client ตอนเขียนตามลำดับ) ไม่ต้องอ่านไฟล์ซ้ำ
+# EOF ที่ไม่มี data (server รุ่นเก่า) = ไม่มี hash ให้ตรวจ → ทุก client ถือว่าล้มเหลวเหมือน hash ไม่ตรง (ดู accepted)
+# EOF ของช่วง byte (REQUEST option range) แนบ hash ของทั้งไฟล์ต่อท้าย hash ของช่วง (ดู split_eof)
+# client ที่รับต่อจึงตรวจทั้งไฟล์ได้ โดยเริ่ม hash จากส่วนที่มีอยู่แล้วใน .part (hash_prefix)
+
+HASH_SIZE = 32   # BLAKE2b-256
+READ_BLOCK = 1024 * 1024   # ขนาดที่อ่านต่อครั้งตอน hash ส่วนที่อยู่ในไฟล์แล้ว
+
+def new_hash():
+    return hashlib.blake2b(digest_size=HASH_SIZE)
+
+class HashWriter:
+    # ส่งข้อมูลต่อไปยัง out พร้อมสะสม hash (ครอบปลายทางที่รับข้อมูลดิบตามลำดับ เช่นไฟล์ใต้ FrameWriter)
+    def __init__(self, out):
+        self.out = out
+        self.hash = new_hash()
+
+    def write(self, data):
+        self.hash.update(data)
+        return self.out.write(data)
+
+def hash_prefix(f, size, hasher=None):
+    # hash ของ byte [0, size) ในไฟล์ที่เปิดไว้ (ตำแหน่งอ่านจบที่ size ถ้าไฟล์ยาวพอ) คืน hasher ที่ update แล้ว
+    hasher = hasher if hasher is not None else new_hash()
+    f.seek(0)
+    left = size
+    while left > 0:
+        block = f.read(min(READ_BLOCK, left))
+        if not block:
+            break
+        hasher.update(block)
+        left -= len(block)
+    return hasher
+
+def split_eof(data):
+    # data ของ EOF → (hash ของข้อมูลที่ส่งใน session นี้, hash ของทั้งไฟล์ หรือ None ถ้าส่งมาทั้งไฟล์อยู่แล้ว)
+    data = bytes(data)
+    return data[:HASH_SIZE], data[HASH_SIZE:2 * HASH_SIZE] or None
+
+def verify(expected, hasher):
+    # True = ตรงกัน, False = ไม่ตรง, None = server ไม่ได้ส่ง hash มา
+    if not expected:
+        return None
+    return hmac.compare_digest(bytes(expected), hasher.digest())
+
+def accepted(result):
+    # จุดตัดสินเดียวของทุก client: รับไฟล์เมื่อ hash ตรงเท่านั้น (ไม่มี hash ให้ตรวจ = ไม่รับ)
+    return result is True
+
+def describe(result):
+    return {True: "BLAKE2b OK", False: "BLAKE2b MISMATCH", None: "not verified (no hash in EOF)"}[result]
@@ -0,0 +1,395 @@
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from proto import PACKET_SIZE, PacketType, create_data_packet, encode_packet
+from compress import compress_file
+from filehash import hash_prefix, new_hash
+from packetindex import load_index
+
+CACHE_BYTES = 64 * 1024 * 1024   # ขนาดรวมสูงสุดของ packet ที่ encode แล้วใน FileCache
+FD_CACHE = 16                    # จำนวนไฟล์ที่เปิดค้างไว้ได้ (ที่ไม่มี session ใช้อยู่)
+
+class FileSource:
+    # แหล่งข้อมูลไฟล์แบบ streaming: map ไฟล์ด้วย mmap แล้วตัด chunk ตาม seq เมื่อจะส่งเท่านั้น
+    # (ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ และไม่สร้าง Packet ล่วงหน้าทุกตัว)
+    # ถ้า mmap ใช้ไม่ได้ (ไฟล์ว่าง, ไม่ใช่ไฟล์ปกติ) จะ fallback เป็น seek + read ทีละ chunk
+    # start/end: ส่งเฉพาะช่วง byte [start, end) ของไฟล์ (REQUEST option range) chunk 0 เริ่มที่ start
+    # cache: FileCache ที่แชร์ระหว่าง session → ใช้ไฟล์/mmap ที่เปิดไว้แล้ว และ packet ที่ encode แล้วร่วมกัน
+    # ถ้ามี sidecar <file>.idx (packetindex.py) ที่ตรงกับไฟล์ จะใช้ sum16 ราย chunk และ hash จาก index แทนการคำนวณ
+    compress = None   # วิธีบีบอัดที่ใช้จริง (None = ส่งไฟล์ดิบ)
+    ready = True      # False = ต้องเรียก prepare() ก่อนส่ง (CompressedSource)
+
+    def __init__(self, filename, chunk_size=PACKET_SIZE, fileobj=None, start=0, end=None, cache=None):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.cache = cache if fileobj is None else None
+        self._handle = self.cache.open(filename) if self.cache is not None else None
+        if self._handle is not None:
+            self._file = self._handle.file
+        else:
+            self._file = fileobj if fileobj is not None else open(filename, 'rb')
+        st = os.fstat(self._file.fileno())
+        self.file_size = st.st_size
+        self.offset = min(start, self.file_size)
+        self.size = (self.file_size if end is None else min(end, self.file_size)) - self.offset
+        self.raw_size = self.size   # ขนาดไฟล์จริง (ต่างจาก size เมื่อบีบอัด)
+        self.mtime = st.st_mtime_ns if fileobj is None else None   # mtime ของไฟล์ต้นทาง (แจ้ง client ใน INFO)
+        self.num_chunks = (self.size + chunk_size - 1) // chunk_size
+
+        # hash ของไฟล์สะสมตอนอ่าน chunk ตามลำดับครั้งแรก (การส่งครั้งแรกเรียง seq อยู่แล้ว) ส่งซ้ำไม่นับซ้ำ
+        # ไฟล์ที่เคยส่งช่วงเดียวกันไปแล้ว (handle ใน cache) ใช้ hash ที่จำไว้ได้เลย
+        self._hash = new_hash()
+        self._hashed = 0   # จำนวน chunk ที่รวมเข้า hash แล้ว (None = hash มาจากที่อื่น)
+        self._digest = None
+        if self._handle is not None:
+            self._digest = self._handle.digests.get((self.offset, self.size))
+            if self._digest is not None:
+                self._hashed = None
+
+        # index ใช้ได้เมื่อ chunk ของช่วงนี้ตรงกับ chunk ใน index (offset ลงตัวกับ chunk_size)
+        if self._handle is not None:
+            self.index = self._handle.index
+        else:
+            self.index = load_index(filename, st) if fileobj is None else None
+        self._sums = None
+        self._first = self.offset // chunk_size
+        if self.index is not None:
+            if self.offset % chunk_size == 0:
+                self._sums = self.index.sums(chunk_size)
+            if self._digest is None and self.offset == 0 and self.size == self.file_size:
+                self._digest = self.index.file_hash
+                self._hashed = None
+
+        self._map = None
+        self._view = None
+        if self._handle is not None:
+            if self._handle.view is not None:
+                self._view = self._handle.view[self.offset:self.offset + self.size]
+        elif self.size > 0:
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)[self.offset:self.offset + self.size]
+            except (ValueError, OSError):
+                self._map = None
+
+    def chunk(self, seq):  # ข้อมูลของ chunk ที่ seq (memoryview ถ้า mmap ได้)
+        off = seq * self.chunk_size
+        if self._view is not None:
+            data = self._view[off:off + self.chunk_size]
+        else:
+            self._file.seek(self.offset + off)
+            data = self._file.read(max(0, min(self.chunk_size, self.size - off)))
+        if seq == self._hashed:
+            self._hash.update(data)
+            self._hashed += 1
+        return data
+
+    def file_hash(self):  # hash ของไฟล์ดิบสำหรับใส่ใน EOF (chunk ที่ยังไม่เคยอ่านจะอ่านเพิ่มตรงนี้)
+        if self._digest is None:
+            if self._hashed is not None:
+                while self._hashed < self.num_chunks:
+                    self.chunk(self._hashed)
+            self._digest = self._hash.digest()
+            if self._handle is not None:
+                self._handle.digests[(self.offset, self.size)] = self._digest
+        return self._digest
+
+    def eof_hash(self):  # data ของ EOF: hash ของช่วงที่ส่ง + hash ของทั้งไฟล์ถ้าส่งแค่บางช่วง (ดู filehash.split_eof)
+        if self.offset == 0 and self.size == self.file_size:
+            return self.file_hash()
+        return self.file_hash() + self.full_hash()
+
+    def full_hash(self):  # hash ของทั้งไฟล์ (client ที่รับต่อใช้ตรวจไฟล์ที่ประกอบจากส่วนเดิมใน .part + ช่วงนี้)
+        if self.offset == 0 and self.size == self.file_size:
+            return self.file_hash()
+        key = (0, self.file_size)
+        digest = self._handle.digests.get(key) if self._handle is not None else None
+        if digest is None and self.index is not None:
+            digest = self.index.file_hash
+        if digest is None:
+            # อ่านทั้งไฟล์ครั้งเดียวตอนจบ session (ไฟล์ที่อยู่ใน cache จำไว้ให้ session ถัดไป)
+            digest = hash_prefix(self._file, self.file_size).digest()
+            if self._handle is not None:
+                self._handle.digests[key] = digest
+        return digest
+
+    def chunk_sum(self, seq):  # sum16 ของ data ใน chunk seq จาก index (None = ไม่มี ต้องคำนวณเอง)
+        if self._sums is None:
+            return None
+        i = self._first + seq
+        # chunk สุดท้ายของช่วงที่ไม่จบที่ท้ายไฟล์สั้นกว่า chunk ใน index → ใช้ไม่ได้
+        if i >= len(self._sums) or (min(self.chunk_size, self.size - seq * self.chunk_size)
+                                    != min(self.chunk_size, self.file_size - i * self.chunk_size)):
+            return None
+        return self._sums[i]
+
+    def packet(self, seq):  # สร้าง DATA packet ของ seq นี้เมื่อต้องการจริง
+        return create_data_packet(seq, self.chunk(seq))
+
+    def encoded(self, seq):  # bytes ของ DATA packet ที่ seq (จาก cache ที่แชร์ถ้ามี ไม่ต้องคำนวณ checksum ซ้ำ)
+        if self.cache is None:
+            return encode_packet(PacketType.DATA, seq, self.chunk(seq), self.chunk_sum(seq))
+        # key ต้องมีความยาว chunk ด้วย: chunk สุดท้ายของช่วง range อาจสั้นกว่า chunk ที่ seq เดียวกันของทั้งไฟล์
+        off = seq * self.chunk_size
+        key = (self._handle.ident, self.chunk_size, self.offset, seq, min(self.chunk_size, self.size - off))
+        raw = self.cache.get(key)
+        if raw is None:
+            raw = encode_packet(PacketType.DATA, seq, self.chunk(seq), self.chunk_sum(seq))
+            self.cache.put(key, raw)
+        elif seq == self._hashed:
+            self.chunk(seq)   # hash สะสมจากข้อมูลในไฟล์ ไม่ใช่จาก packet ใน cache
+        return raw
+
+    def close(self):
+        try:
+            if self._view is not None:
+                self._view.release()
+            if self._map is not None:
+                self._map.close()
+        except BufferError:
+            # ยังมี view ของ chunk ค้างอยู่ → ปล่อยให้ GC ปิด map เอง
+            pass
+        self._view = None
+        self._map = None
+        if self._handle is not None:
+            self.cache.release(self._handle)
+            self._handle = None
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CompressedSource(FileSource):
+    # ส่ง stream ของ frame ที่บีบอัดทีละบล็อก (compress.py) แทนไฟล์ดิบ
+    # ตอนเปิดแค่ตรวจว่าอ่านไฟล์ได้ ส่วนการบีบลงไฟล์ชั่วคราวอยู่ใน prepare() ซึ่ง server เรียกใน thread แยก
+    # (sessions.PreparingSession) ไม่ให้ไฟล์ใหญ่ขวาง session อื่นใน mux
+    # บีบเสร็จแล้วตัด chunk/ส่งซ้ำจากไฟล์ชั่วคราวเหมือน FileSource ทุกประการ
+    ready = False
+
+    def __init__(self, filename, chunk_size=PACKET_SIZE, method='zlib'):
+        with open(filename, 'rb') as f:   # directory/ไม่มีสิทธิ์อ่าน → OSError ทันทีตอนเปิด session
+            st = os.fstat(f.fileno())
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.method = method
+        # ค่าก่อน prepare(): ยังไม่มี stream ให้ส่ง (size/num_chunks = 0) แต่รู้ขนาดและ mtime ของไฟล์ดิบแล้ว
+        self.cache = None
+        self._handle = None
+        self._file = None
+        self._map = None
+        self._view = None
+        self.index = None
+        self._sums = None
+        self._first = 0
+        self.file_size = st.st_size
+        self.offset = 0
+        self.size = 0
+        self.raw_size = st.st_size
+        self.mtime = self._mtime = st.st_mtime_ns
+        self.num_chunks = 0
+        self._hash = new_hash()
+        self._hashed = None
+        self._digest = None
+
+    def prepare(self):  # บีบทั้งไฟล์ (ใช้เวลานาน เรียกนอก mux loop) แล้วพร้อมส่ง
+        tmp = tempfile.TemporaryFile()
+        digest = new_hash()
+        try:
+            raw_size, _, packed = compress_file(self.filename, self.method, tmp, digest=digest)
+            tmp.flush()
+        except BaseException:
+            tmp.close()
+            raise
+        super().__init__(self.filename, self.chunk_size, fileobj=tmp)
+        self.raw_size = raw_size
+        self.mtime = self._mtime
+        self.compress = self.method if packed else 'stored'
+        # chunk คือ stream ของ frame → ใช้ hash ของไฟล์ดิบที่คำนวณไว้ระหว่างบีบแทน
+        self._hash = digest
+        self._hashed = None
+        self.ready = True
+
+    def summary(self):
+        ratio = self.size / self.raw_size if self.raw_size else 1.0
+        return f"{self.compress}: {self.raw_size:,} -> {self.size:,} bytes ({ratio:.1%})"
+
+    def close(self):
+        if self._file is not None:   # ยังไม่ได้ prepare() → ไม่มีไฟล์ชั่วคราวให้ปิด
+            super().close()
+
+def open_source(filename, chunk_size=PACKET_SIZE, compress=None, byte_range=None, cache=None):
+    # compress: 'zlib'/'lzma' ตามที่ client ขอ (None = ส่งไฟล์ดิบ)
+    # byte_range: (start, end) จาก request_range (บีบอัดได้เฉพาะทั้งไฟล์ → ห้ามใช้คู่กัน)
+    # cache: FileCache ของ server (ใช้กับไฟล์ดิบเท่านั้น stream ที่บีบอัดเป็นไฟล์ชั่วคราวของแต่ละ session)
+    # source ที่ ready เป็น False ต้อง prepare() ก่อนใช้ (server ห่อด้วย sessions.PreparingSession)
+    if compress and byte_range:
+        raise ValueError("range requests cannot be compressed")
+    if compress:
+        return CompressedSource(filename, chunk_size, compress)
+    start, end = byte_range or (0, None)
+    return FileSource(filename, chunk_size, start=start, end=end, cache=cache)
+
+class _OpenFile:
+    # ไฟล์ที่เปิดค้างไว้ใน FileCache: file object + mmap ที่ทุก session ของไฟล์นี้ใช้ร่วมกัน
+    def __init__(self, path, st):
+        self.path = path
+        self.ident = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+        self.file = open(path, 'rb')
+        self.map = None
+        self.view = None
+        if st.st_size > 0:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.view = memoryview(self.map)
+            except (ValueError, OSError):
+                self.map = None
+        self.refs = 0
+        self.stale = False   # ไฟล์บนดิสก์เปลี่ยนไปแล้ว → ปิดเมื่อไม่มี session ใช้
+        self.digests = {}    # (offset, size) -> hash ของช่วงนั้น (ใส่ใน EOF ได้เลยไม่ต้อง hash ซ้ำ)
+        self.index = load_index(path, st)   # โหลด sidecar ครั้งเดียวต่อการเปิดไฟล์
+
+    def close(self):
+        try:
+            if self.view is not None:
+                self.view.release()
+            if self.map is not None:
+                self.map.close()
+        except BufferError:
+            pass
+        self.view = None
+        self.map = None
+        self.file.close()
+
+class FileCache:
+    # cache ของ server ที่ทุก session ใช้ร่วมกัน (ไฟล์เดิมมักถูกขอซ้ำจากหลาย client)
+    # - fd cache: ไฟล์ + mmap ที่เปิดไว้แล้ว (LRU ไม่เกิน max_files ตัวที่ว่าง) ใช้ซ้ำถ้า inode/mtime/size ไม่เปลี่ยน
+    # - packet cache: DATA packet ที่ encode แล้ว (header + checksum + data) แบบ LRU รวมไม่เกิน max_bytes
+    #   key มี identity ของไฟล์ → ไฟล์ถูกแก้แล้ว packet เก่าจะไม่ถูกใช้อีกและถูกล้างทิ้งทันทีที่ตรวจพบ
+    def __init__(self, max_bytes=CACHE_BYTES, max_files=FD_CACHE):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._files = OrderedDict()    # path -> _OpenFile
+        self._packets = OrderedDict()  # (ident, chunk_size, offset, seq, len) -> bytes
+        self.bytes = 0
+
+        # สถิติ
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fd_hits = 0
+        self.fd_misses = 0
+        self.fd_evictions = 0
+        self.invalidations = 0
+
+    def open(self, filename):
+        # คืน _OpenFile ของไฟล์ (เปิดใหม่ถ้ายังไม่มีหรือไฟล์เปลี่ยน) ต้องเรียก release() เมื่อเลิกใช้
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        handle = self._files.get(path)
+        if handle is not None and handle.ident != (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size):
+            self._invalidate(handle)
+            handle = None
+        if handle is None:
+            self.fd_misses += 1
+            handle = self._files[path] = _OpenFile(path, st)
+        else:
+            self.fd_hits += 1
+            self._files.move_to_end(path)
+        handle.refs += 1
+        self._trim_files()
+        return handle
+
+    def release(self, handle):
+        handle.refs -= 1
+        if handle.refs <= 0 and handle.stale:
+            handle.close()
+        self._trim_files()
+
+    def _invalidate(self, handle):
+        # ไฟล์ถูกแก้ → เลิกใช้ handle เดิม และทิ้ง packet ของเวอร์ชันเก่า
+        self.invalidations += 1
+        del self._files[handle.path]
+        handle.stale = True
+        if handle.refs <= 0:
+            handle.close()
+        for key in [k for k in self._packets if k[0] == handle.ident]:
+            self.bytes -= len(self._packets.pop(key))
+
+    def _trim_files(self):
+        idle = [h for h in self._files.values() if h.refs <= 0]
+        for handle in idle[:max(0, len(idle) - self.max_files)]:
+            del self._files[handle.path]
+            handle.close()
+            self.fd_evictions += 1
+
+    def get(self, key):
+        raw = self._packets.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._packets.move_to_end(key)
+        return raw
+
+    def put(self, key, raw):
+        if len(raw) > self.max_bytes:
+            return
+        self._packets[key] = raw
+        self.bytes += len(raw)
+        while self.bytes > self.max_bytes:
+            _, old = self._packets.popitem(last=False)
+            self.bytes -= len(old)
+            self.evictions += 1
+
+    def summary(self):
+        return (f"packets hits={self.hits}, misses={self.misses}, evictions={self.evictions}, "
+                f"{self.bytes / 1048576:.1f}/{self.max_bytes / 1048576:.0f} MB; "
+                f"files hits={self.fd_hits}, misses={self.fd_misses}, evictions={self.fd_evictions}, "
+                f"invalidations={self.invalidations}")
+
+class WireCache:
+    # เก็บ bytes ของ DATA packet ที่ encode แล้ว (checksum + header) ไว้ใช้ตอนส่งซ้ำ
+    # จำกัดขนาดไว้ที่ window + lookahead และทิ้งตัวที่ ACK แล้วเมื่อ base เลื่อน
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = {}
+
+        # สถิติ
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, seq, make_raw):
+        # make_raw(seq) → bytes ของ packet (เช่น FileSource.encoded)
+        raw = self.entries.get(seq)
+        if raw is not None:
+            self.hits += 1
+            return raw
+        self.misses += 1
+        raw = make_raw(seq)
+        self.entries[seq] = raw
+        while len(self.entries) > self.capacity:
+            # seq ถูกใส่เรียงจากน้อยไปมาก → ตัวแรกคือตัวเก่าสุด
+            del self.entries[next(iter(self.entries))]
+            self.evictions += 1
+        return raw
+
+    def release_below(self, base):
+        # ทิ้ง packet ที่ได้ ACK แล้ว (seq < base)
+        for seq in [s for s in self.entries if s < base]:
+            del self.entries[seq]
+
+    def discard(self, seq):
+        # ทิ้ง packet ตัวเดียวที่ได้ ACK แล้ว (ใช้กับ Selective Repeat)
+        self.entries.pop(seq, None)
+
+    def reset(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
@@ -0,0 +1,97 @@
+import time
+
+# pacing ของฝั่งส่ง: เว้นระยะ DATA ตาม token bucket แทนการส่งทั้งหน้าต่างติดกันรวดเดียว
+# (burst ใหญ่ทำให้ buffer รับของ client ล้นแล้วหายเป็นชุด → ต้องส่งซ้ำทั้งหน้าต่าง)
+#   rate คงที่ (byte/s) หรือ auto: rate = PACING_GAIN * cwnd * ขนาด packet / SRTT (กระจายหน้าต่างให้เต็ม RTT)
+#   tokens เติมตามเวลาจาก time.perf_counter() เก็บได้ไม่เกิน max(BURST_PACKETS packet, BURST_TIME ของ rate)
+# session ถามเวลาที่ต้องรอจาก take() แล้วตั้ง deadline ให้ SessionMux / asyncio ปลุกกลับมาส่งต่อ
+# packet ที่ pace แล้ว session จะ flush ออก socket ทันที (ไม่รอรวม batch ตอนจบรอบของ mux) แล้วเรียก sent()
+# → สถิติ burst/อัตราที่ทำได้วัดจากเวลาที่ packet ออกจริง ไม่ใช่เวลาที่ได้ token
+
+PACING_GAIN = 1.25      # auto: เร็วกว่า cwnd/RTT เล็กน้อยให้ cwnd ยังโตต่อได้
+BURST_PACKETS = 4       # ความจุ bucket ขั้นต่ำ (packet)
+BURST_TIME = 0.001      # ความจุ bucket ตาม rate (วินาที) — scheduler ปลุกไม่ถี่กว่านี้มากนัก
+BURST_GAP = 0.00005     # packet ที่ห่างกันน้อยกว่านี้นับเป็น burst เดียวกัน (สถิติ)
+
+def parse_rate(text):
+    # ค่า --pace: 'auto' หรืออัตรา KB/s → 'auto' หรือ byte/s
+    if text == 'auto':
+        return text
+    rate = float(text) * 1024
+    if rate <= 0:
+        raise ValueError(f"pacing rate must be positive: {text}")
+    return rate
+
+def make_pacer(pace):
+    # pace: None (ไม่ pace), 'auto' หรือ byte/s ตามที่ server ตั้งไว้
+    if not pace:
+        return None
+    return Pacer(None if pace == 'auto' else pace)
+
+class Pacer:
+    def __init__(self, rate=None, gain=PACING_GAIN, burst=BURST_PACKETS):
+        self.target = rate   # byte/s ที่กำหนด (None = auto)
+        self.rate = rate
+        self.gain = gain
+        self.burst = burst
+        self.tokens = None   # byte (เต็ม bucket ตอนส่ง packet แรก)
+        self.stamp = None
+
+        # สถิติ
+        self.bytes = 0
+        self.packets = 0
+        self.waits = 0       # จำนวนครั้งที่ต้องรอ token
+        self.first = None
+        self.last = None
+        self.bursts = 0
+        self.max_burst = 0
+        self._run = 0
+
+    def update(self, cwnd, srtt, packet_size):
+        # auto: ปรับ rate ตามหน้าต่างและ RTT ล่าสุด (ใช้ RTO แทนก่อนมี sample)
+        if self.target is None and srtt:
+            self.rate = self.gain * cwnd * packet_size / srtt
+
+    def _capacity(self, nbytes):
+        return max(self.burst * nbytes, self.rate * BURST_TIME)
+
+    def take(self, nbytes):
+        # คืน 0 และหัก token ถ้าส่ง nbytes ได้ทันที ไม่งั้นคืนจำนวนวินาทีที่ต้องรอ
+        now = time.perf_counter()
+        if self.rate:
+            cap = self._capacity(nbytes)
+            if self.tokens is None:
+                self.tokens = cap
+            else:
+                self.tokens = min(cap, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens < nbytes:
+                self.waits += 1
+                return (nbytes - self.tokens) / self.rate
+            self.tokens -= nbytes
+        return 0.0
+
+    def sent(self, nbytes):  # packet ขนาด nbytes ออกจาก socket แล้ว (สถิติ)
+        self._record(time.perf_counter(), nbytes)
+
+    def _record(self, now, nbytes):
+        if self.last is not None and now - self.last < BURST_GAP:
+            self._run += 1
+        else:
+            self.bursts += 1
+            self._run = 1
+        self.max_burst = max(self.max_burst, self._run)
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.bytes += nbytes
+        self.packets += 1
+
+    def summary(self):
+        span = (self.last - self.first) if self.packets > 1 else 0
+        achieved = self.bytes / span / 1024 if span > 0 else 0
+        mode = 'auto' if self.target is None else f"{self.target / 1024:.0f} KB/s"
+        rate = f"{self.rate / 1024:.0f} KB/s" if self.rate else '-'
+        avg = self.packets / self.bursts if self.bursts else 0
+        return (f"{mode} (last rate {rate}), achieved {achieved:.2f} KB/s, "
+                f"bursts={self.bursts} avg={avg:.1f} max={self.max_burst} packets, waits={self.waits}")
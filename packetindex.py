@@ -0,0 +1,136 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import checksum
+from filehash import HASH_SIZE, new_hash
+from proto import PACKET_SIZE, clamp_payload
+
+# index ล่วงหน้าของไฟล์ที่ถูกขอซ้ำบ่อย: ผลรวม word (sum16) ของ data ทุก chunk + hash ของทั้งไฟล์
+# เก็บใน sidecar แบบ binary <file>.idx — server โหลดแล้วสร้าง DATA packet ได้ด้วยการ pack header + copy data
+# โดยไม่ต้องรวม word ของ data และไม่ต้อง hash ไฟล์ซ้ำทุก request
+# sidecar ผูกกับขนาดและ mtime ของไฟล์ → ไฟล์ถูกแก้แล้ว index จะถูกเมิน (ต้องรัน indexer ใหม่)
+#
+# รูปแบบไฟล์ (big-endian):
+#   HEADER: magic, ขนาดไฟล์, mtime_ns, จำนวนตาราง, BLAKE2b-256 ของทั้งไฟล์
+#   แต่ละตาราง: TABLE (chunk size, จำนวน chunk) ตามด้วย sum16 ของแต่ละ chunk (2 bytes/chunk)
+
+INDEX_SUFFIX = '.idx'
+MAGIC = b'RUDPIDX1'
+HEADER = struct.Struct(f'!8sQqH{HASH_SIZE}s')
+TABLE = struct.Struct('!II')
+READ_BLOCK = 1024 * 1024   # ขนาดที่อ่านต่อครั้งตอน hash ไฟล์ที่ mmap ไม่ได้
+
+def index_path(filename):
+    return filename + INDEX_SUFFIX
+
+class PacketIndex:
+    def __init__(self, size, mtime_ns, file_hash, tables):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.file_hash = file_hash
+        self.tables = tables   # chunk size -> array('H') ของ sum16 ราย chunk
+
+    def sums(self, chunk_size):  # sum16 ราย chunk สำหรับ chunk size นี้ (None = ไม่ได้ index ไว้)
+        return self.tables.get(chunk_size)
+
+    def matches(self, st):  # ยังตรงกับไฟล์บนดิสก์หรือไม่
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    @classmethod
+    def build(cls, filename, chunk_sizes=(PACKET_SIZE,)):
+        # อ่านไฟล์ (ผ่าน mmap ถ้าได้) คำนวณ hash ทั้งไฟล์และ sum16 ของทุก chunk ในแต่ละ chunk size
+        with open(filename, 'rb') as f:
+            st = os.fstat(f.fileno())
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+            except (ValueError, OSError):
+                data = f.read()
+            view = memoryview(data)
+            try:
+                digest = new_hash()
+                for off in range(0, len(view), READ_BLOCK):
+                    digest.update(view[off:off + READ_BLOCK])
+                tables = {}
+                for size in sorted(set(chunk_sizes)):
+                    tables[size] = array('H', (checksum.sum16(view[off:off + size])
+                                               for off in range(0, len(view), size)))
+            finally:
+                view.release()
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        return cls(st.st_size, st.st_mtime_ns, digest.digest(), tables)
+
+    def to_bytes(self):
+        parts = [HEADER.pack(MAGIC, self.size, self.mtime_ns, len(self.tables), self.file_hash)]
+        for size, sums in sorted(self.tables.items()):
+            parts.append(TABLE.pack(size, len(sums)))
+            if sys.byteorder == 'little':
+                sums = array('H', sums)
+                sums.byteswap()
+            parts.append(sums.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        # ValueError ถ้าไม่ใช่ index หรือข้อมูลไม่ครบ
+        try:
+            magic, size, mtime_ns, count, file_hash = HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError("not a packet index")
+            pos = HEADER.size
+            tables = {}
+            for _ in range(count):
+                chunk_size, n = TABLE.unpack_from(data, pos)
+                pos += TABLE.size
+                if chunk_size <= 0 or n != (size + chunk_size - 1) // chunk_size or pos + 2 * n > len(data):
+                    raise ValueError("truncated packet index")
+                sums = array('H', data[pos:pos + 2 * n])
+                if sys.byteorder == 'little':
+                    sums.byteswap()
+                tables[chunk_size] = sums
+                pos += 2 * n
+        except struct.error as e:
+            raise ValueError(f"truncated packet index: {e}") from None
+        return cls(size, mtime_ns, file_hash, tables)
+
+    def save(self, path):
+        # เขียนไฟล์ใหม่แล้ว replace (ไม่มี index ที่เขียนค้างครึ่งเดียว)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+
+def load_index(filename, st):
+    # index ของไฟล์ที่ตรงกับ st (os.stat ของไฟล์ที่เปิดอยู่) หรือ None ถ้าไม่มี อ่านไม่ได้ หรือเก่ากว่าไฟล์
+    try:
+        with open(index_path(filename), 'rb') as f:
+            index = PacketIndex.from_bytes(f.read())
+    except (OSError, ValueError):
+        return None
+    return index if index.matches(st) else None
+
+def main():
+    ap = argparse.ArgumentParser(description="Precompute packet checksums and the file hash into <file>.idx")
+    ap.add_argument("files", nargs="+", help="files to index")
+    ap.add_argument("--payload", type=int, action="append",
+                    help=f"data bytes per packet to index (repeatable, default {PACKET_SIZE})")
+    args = ap.parse_args()
+
+    payloads = sorted({clamp_payload(p) for p in args.payload or [PACKET_SIZE]})
+    for filename in args.files:
+        try:
+            index = PacketIndex.build(filename, payloads)
+            path = index_path(filename)
+            index.save(path)
+        except OSError as e:
+            print(f"[index] {filename}: {e}")
+            continue
+        chunks = ", ".join(f"{len(s):,} x {size}" for size, s in sorted(index.tables.items()))
+        print(f"[index] {filename}: {index.size:,} bytes, chunks {chunks} -> {path} ({os.path.getsize(path):,} bytes)")
+
+if __name__ == "__main__":
+    main()
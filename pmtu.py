@@ -0,0 +1,95 @@
+import errno
+import socket
+import sys
+import time
+from proto import (
+    PACKET_SIZE, HEADER_SIZE, MIN_PAYLOAD, MAX_PAYLOAD, Packet, PacketType,
+    create_probe_packet, clamp_payload
+)
+
+# หาขนาด data ต่อ packet ที่ใหญ่ที่สุดที่ผ่านเส้นทางไปยัง server ได้ (path-MTU probing)
+# client ส่ง PROBE ขนาดต่างๆ โดยตั้ง DF (ห้าม fragment) แล้ว server ตอบ PROBE ที่มี seq เดิมกลับมา
+# ค้นหาแบบ binary search ระหว่าง MIN_PAYLOAD..MAX_PAYLOAD (สมมติว่าเส้นทางขาไป-กลับเหมือนกัน)
+
+PROBE_TIMEOUT = 0.25   # รอคำตอบต่อครั้ง (วินาที)
+PROBE_TRIES = 2        # ส่งซ้ำกี่ครั้งก่อนถือว่าขนาดนั้นไม่ผ่าน
+PROBE_STEP = 64        # ความละเอียดของการค้นหา (bytes)
+
+def _set_dont_fragment(sock):
+    # ตั้ง DF บน socket คืนค่าเดิมของ IP_MTU_DISCOVER (None ถ้าระบบไม่รองรับ)
+    if not hasattr(socket, 'IP_MTU_DISCOVER'):
+        return None
+    old = sock.getsockopt(socket.IPPROTO_IP, socket.IP_MTU_DISCOVER)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MTU_DISCOVER, socket.IP_PMTUDISC_DO)
+    return old
+
+def probe_once(sock, server, payload, timeout=PROBE_TIMEOUT, tries=PROBE_TRIES):
+    # True ถ้า PROBE ขนาด payload ไปถึง server และได้คำตอบกลับมา
+    raw = create_probe_packet(payload).to_bytes()
+    buf = bytearray(HEADER_SIZE + 64)
+    pkt = Packet(PacketType.PROBE, 0)
+    for _ in range(tries):
+        try:
+            sock.sendto(raw, server)
+        except OSError as e:
+            if e.errno == errno.EMSGSIZE:   # ใหญ่กว่า MTU ที่ kernel รู้อยู่แล้ว
+                return False
+            raise
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                nbytes, addr = sock.recvfrom_into(buf)
+            except socket.timeout:
+                break
+            except ConnectionError:   # ICMP (เช่น port unreachable)
+                return False
+            if addr == server and pkt.load(buf, nbytes) and pkt.type == PacketType.PROBE and pkt.seq_num == payload:
+                return True
+    return False
+
+def probe_payload(sock, server, lo=MIN_PAYLOAD, hi=MAX_PAYLOAD, step=PROBE_STEP):
+    # คืนขนาด data ต่อ packet ที่ใหญ่ที่สุดที่ผ่าน หรือ None ถ้า server ไม่ตอบ PROBE เลย (เช่น server รุ่นเก่า)
+    timeout = sock.gettimeout()
+    old_df = _set_dont_fragment(sock)
+    try:
+        if probe_once(sock, server, hi):   # เส้นทางเร็ว (เช่น loopback) มักผ่านตั้งแต่ขนาดสูงสุด
+            return hi
+        if not probe_once(sock, server, lo):
+            return None
+        while hi - lo > step:
+            mid = (lo + hi) // 2
+            if probe_once(sock, server, mid):
+                lo = mid
+            else:
+                hi = mid
+        return lo
+    finally:
+        if old_df is not None:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MTU_DISCOVER, old_df)
+        sock.settimeout(timeout)
+
+def choose_payload(sock, server, payload=None, probe=False):
+    # ขนาด data ต่อ packet ที่จะขอใน REQUEST: payload ที่ระบุ (ไม่ระบุ = PACKET_SIZE)
+    # probe=True → วัดหาค่าที่ใหญ่ที่สุดที่ผ่านได้ ไม่เกิน payload (ไม่ระบุ = MAX_PAYLOAD)
+    if not probe:
+        return clamp_payload(payload or PACKET_SIZE)
+    found = probe_payload(sock, server, hi=clamp_payload(payload or MAX_PAYLOAD))
+    if found is None:
+        print(f"[PMTU] No PROBE reply from {server}, using default payload {PACKET_SIZE}")
+        return PACKET_SIZE
+    print(f"[PMTU] Largest payload that gets through: {found} bytes")
+    return found
+
+def set_receive_buffer(sock, nbytes):
+    # ขยาย SO_RCVBUF ให้รับ datagram ที่ค้างได้ nbytes (kernel อาจจำกัดไว้ที่ net.core.rmem_max)
+    # คืนขนาดที่ใช้ได้จริง (Linux รายงานค่าเป็น 2 เท่าของที่ใช้เก็บข้อมูล)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, nbytes)
+    except OSError:
+        pass
+    actual = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    return actual // 2 if sys.platform.startswith('linux') else actual
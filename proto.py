@@ -1,11 +1,20 @@
 import struct
 from enum import IntEnum
+import checksum
 
 # กำหนดค่าคงที่
 PACKET_SIZE = 1024  # ขนาด data สูงสุดต่อ packet
 HEADER_SIZE = 9 # ขนาด header ของ packet
 MAX_PACKET_SIZE = PACKET_SIZE + HEADER_SIZE  # ขนาด packet สูงสุด (data + header)
-TIMEOUT = 1.0       # รอ ACK 1 วินาที เป็นค่ามาตรฐาน
+
+# ขนาด data ต่อ packet เจรจาได้ตอน REQUEST (ค่าเริ่มต้นคือ PACKET_SIZE)
+MAX_DATAGRAM = 65507                         # UDP payload สูงสุดบน IPv4
+MAX_PAYLOAD = MAX_DATAGRAM - HEADER_SIZE     # ~64 KB (เช่น loopback)
+ETHERNET_PAYLOAD = 1500 - 20 - 8 - HEADER_SIZE  # MTU 1500 - IP - UDP - header (~1.4 KB)
+MIN_PAYLOAD = 512
+TIMEOUT = 1.0       # รอ ACK 1 วินาที เป็นค่ามาตรฐาน (ใช้เป็น RTO เริ่มต้นก่อนวัด RTT ได้)
+MIN_RTO = 0.05      # RTO ต่ำสุดหลังจากปรับตาม RTT ที่วัดได้
+MAX_RTO = 8.0       # RTO สูงสุดเมื่อ backoff
 MAX_RETRIES = 5     # ส่งซ้ำสูงสุด 5 ครั้ง
 
 class PacketType(IntEnum): # ประเภทของ packet
@@ -14,74 +23,182 @@ class PacketType(IntEnum): # ประเภทของ packet
     ACK = 3         # Client ตอบรับว่าได้ข้อมูลแล้ว
     EOF = 4         # Server บอกว่าไฟล์จบแล้ว
     ERROR = 5       # แจ้ง error 
+    PROBE = 6       # Client วัดขนาด datagram ที่ผ่านเส้นทางได้ (seq = ขนาด data, server ตอบ seq เดิม)
+    PARITY = 7      # Server ส่ง XOR parity ของบล็อก DATA ให้ client กู้ packet ที่หายเอง (FEC, ดู fec.py)
+    INFO = 8        # Server แจ้งข้อมูลไฟล์ก่อน DATA แรก (key=value เช่น size) — เป็นแค่ hint อาจหายได้
+
+HEADER = struct.Struct('!BIHH')  # type, seq_num, data_len, checksum
+
+# payload ของ ACK (optional): receiver-advertised window (rwnd) หน่วยเป็นจำนวน packet
+ACK_WINDOW = struct.Struct('!H')
+# ต่อท้าย rwnd ได้ด้วย SACK block (start, end) = ช่วง seq [start, end) ที่รับไว้แล้วหลังช่องว่าง
+SACK_BLOCK = struct.Struct('!II')
+MAX_SACK_BLOCKS = 4   # ส่งเฉพาะช่วงที่อยู่ใกล้ cumulative ACK ที่สุด (ACK ยาวไม่เกิน 43 bytes)
+NO_RWND = 0xFFFF      # rwnd ไม่จำกัด (ใช้เมื่อมี SACK แต่ไม่ได้ประกาศ rwnd)
+
+# map ค่า int → PacketType ไว้ล่วงหน้า (ไม่ต้องสร้าง enum ใหม่ทุก datagram)
+_TYPES = {t.value: t for t in PacketType}
+
+def header_sum(packet_type, seq_num, data_len):
+    # ผลรวม word 16-bit ของ header 7 bytes (type, seq, len) โดยไม่ต้อง pack เป็น bytes
+    return (((packet_type & 0xFF) << 8) + ((seq_num >> 24) & 0xFF)
+            + ((seq_num >> 8) & 0xFFFF)
+            + ((seq_num & 0xFF) << 8) + ((data_len >> 8) & 0xFF)
+            + ((data_len & 0xFF) << 8))
+
+def packet_checksum(packet_type, seq_num, data, data_sum=None):
+    # checksum = one's complement ของ (header + data) เหมือนเดิม
+    # header ยาว 7 bytes → data เริ่มที่ offset คี่ ผลรวมของ data จึงต้องสลับ byte ก่อนบวก
+    if data_sum is None:
+        data_sum = checksum.sum16(data)
+    s = header_sum(packet_type, seq_num, len(data)) + checksum._swap16(data_sum)
+    return ~checksum._fold(s) & 0xFFFF
+
+def encode_into(buf, packet_type, seq_num, data=b'', offset=0, data_sum=None):
+    # เขียน header + data ลง buffer ที่จองไว้แล้ว (ไม่สร้าง bytes ชั่วคราว) คืนค่าความยาวทั้งหมด
+    n = len(data)
+    HEADER.pack_into(buf, offset, packet_type, seq_num, n,
+                     packet_checksum(packet_type, seq_num, data, data_sum))
+    buf[offset + HEADER_SIZE:offset + HEADER_SIZE + n] = data
+    return HEADER_SIZE + n
+
+def encode_packet(packet_type, seq_num, data=b'', data_sum=None):
+    # bytes ของ packet ทั้งก้อน (copy data ครั้งเดียว) — data_sum จาก index ล่วงหน้าถ้ามี
+    return b''.join((HEADER.pack(packet_type, seq_num, len(data),
+                                 packet_checksum(packet_type, seq_num, data, data_sum)), data))
 
 class Packet:
+    __slots__ = ('type', 'seq_num', 'data', 'checksum')
+
     def __init__(self, packet_type, seq_num, data=b''):  # ใช้ตรวจสอบลำดับ, ป้องกัน packet หาย/ซ้ำ
         self.type = packet_type
         self.seq_num = seq_num 
-        self.data = data[:PACKET_SIZE]
+        self.data = data[:MAX_PAYLOAD]
         self.checksum = 0
 
     def calculate_checksum(self): # คำนวณ checksum ของ packet
-            # สร้าง packet ชั่วคราว (ไม่รวม checksum)
-            temp_packet = struct.pack('!BIH', 
-                                    self.type, 
-                                    self.seq_num, 
-                                    len(self.data))
-            temp_packet += self.data
-            checksum = 0
-            # อ่านทีละ 16-bit (2 bytes)
-            for i in range(0, len(temp_packet), 2):
-                if i + 1 < len(temp_packet):
-                    # มี 2 bytes เต็ม
-                    word = (temp_packet[i] << 8) + temp_packet[i + 1]
-                else:
-                    # เหลือ 1 byte สุดท้าย
-                    word = temp_packet[i] << 8 
-                
-                checksum += word
-                # ถ้ามี carry ให้บวกกลับ
-                checksum = (checksum & 0xFFFF) + (checksum >> 16)
-            
-            # One's complement
-            checksum = ~checksum & 0xFFFF
-            return checksum
-    
+        return packet_checksum(self.type, self.seq_num, self.data)
+
     def to_bytes(self): # แปลง packet เป็น bytes สำหรับส่งผ่าน network
         self.checksum = self.calculate_checksum() # คำนวณ checksum ก่อนส่ง
-        header = struct.pack('!BIHH',
-                             self.type, 
-                             self.seq_num, 
-                             len(self.data), 
-                             self.checksum)
-        return header + self.data
-    
+        return HEADER.pack(self.type, 
+                           self.seq_num, 
+                           len(self.data), 
+                           self.checksum) + self.data
+
+    def pack_into(self, buf, offset=0): # เขียน packet ลง buffer ที่ใช้ซ้ำได้ คืนค่าจำนวน bytes
+        n = encode_into(buf, self.type, self.seq_num, self.data, offset)
+        self.checksum = HEADER.unpack_from(buf, offset)[3]
+        return n
+
+    def load(self, buffer, nbytes=None):
+        # parse ข้อมูลจาก buffer ลง packet ตัวเดิม (ใช้ซ้ำได้ทุก datagram)
+        # ถ้า buffer เป็น memoryview → data จะเป็น view ที่ชี้ไปยัง buffer (ไม่ copy)
+        # คืน False ถ้า packet ไม่สมบูรณ์หรือ checksum ไม่ตรง (ค่าเดิมใน packet ไม่ถูกแก้)
+        if nbytes is None:
+            nbytes = len(buffer)
+        if nbytes < HEADER_SIZE:
+            return False
+        packet_type, seq_num, data_len, recv_checksum = HEADER.unpack_from(buffer)
+        if nbytes < HEADER_SIZE + data_len:
+            return False
+        ptype = _TYPES.get(packet_type)
+        if ptype is None:
+            return False
+        data = buffer[HEADER_SIZE:HEADER_SIZE + data_len]
+        if packet_checksum(ptype, seq_num, data) != recv_checksum:
+            return False
+        self.type = ptype
+        self.seq_num = seq_num
+        self.data = data
+        self.checksum = recv_checksum
+        return True
+
     @classmethod
     def from_bytes(cls, byte_data): # แปลง bytes ที่รับมาเป็น packet
-        if len(byte_data) < HEADER_SIZE:
-            return None, False
-        packet_type, seq_num, data_len, recv_checksum = struct.unpack('!BIHH', byte_data[:HEADER_SIZE]) 
-        if len(byte_data) < HEADER_SIZE + data_len: 
-            return None, False 
-        data = byte_data[HEADER_SIZE:HEADER_SIZE + data_len] 
-
-        pkt = cls(PacketType(packet_type), seq_num, data)
-        calc_checksum = pkt.calculate_checksum()
-        if calc_checksum != recv_checksum:
+        pkt = cls.__new__(cls)
+        if not pkt.load(byte_data):
             return None, False
-
-        pkt.checksum = recv_checksum
         return pkt, True
 
 # ฟังก์ชันช่วยสร้าง packet ประเภทต่างๆ
-def create_request_packet(filename): # สร้าง packet สำหรับขอไฟล์
-    return Packet(PacketType.REQUEST, 0, filename.encode('utf-8'))
+def create_request_packet(filename, **options): # สร้าง packet สำหรับขอไฟล์
+    # options (ถ้ามี) ต่อท้ายชื่อไฟล์: name\0key=value\0key=value เช่น payload=8192
+    data = filename.encode('utf-8')
+    for key, value in options.items():
+        if value is not None:
+            data += f"\0{key}={value}".encode('utf-8')
+    return Packet(PacketType.REQUEST, 0, data)
+
+def parse_request(data):  # แยกชื่อไฟล์และ options จาก payload ของ REQUEST
+    parts = str(data, 'utf-8', errors='ignore').split('\0')
+    options = {}
+    for part in parts[1:]:
+        key, _, value = part.partition('=')
+        options[key] = value
+    return parts[0], options
+
+def clamp_payload(size):  # ขนาด data ต่อ packet ที่ใช้ได้จริง (ทั้งสองฝั่งคำนวณตรงกัน)
+    return max(MIN_PAYLOAD, min(MAX_PAYLOAD, int(size)))
+
+def request_payload(options):  # ขนาด data ต่อ packet ที่ client ขอมา (ไม่ระบุ = PACKET_SIZE)
+    try:
+        return clamp_payload(options.get('payload', PACKET_SIZE))
+    except ValueError:
+        return PACKET_SIZE
+
+def request_range(options):
+    # ช่วง byte [start, end) ของไฟล์ที่ client ขอ (range=START-END, ไม่มี END = ถึงท้ายไฟล์)
+    # คืน (start, end หรือ None) หรือ None ถ้าขอทั้งไฟล์/รูปแบบไม่ถูกต้อง — seq ของ DATA นับจาก start
+    start, _, end = options.get('range', '').partition('-')
+    try:
+        start, end = int(start), int(end) if end else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end < start):
+        return None
+    return start, end
 
 def create_data_packet(seq_num, data):  # สร้าง packet สำหรับส่งข้อมูลไฟล์
     return Packet(PacketType.DATA, seq_num, data)
 
-def create_ack_packet(seq_num):  # สร้าง packet สำหรับตอบรับข้อมูล
-    return Packet(PacketType.ACK, seq_num)
+def create_ack_packet(seq_num, rwnd=None):  # สร้าง packet สำหรับตอบรับข้อมูล (แนบ rwnd ได้)
+    return Packet(PacketType.ACK, seq_num, ack_payload(rwnd))
+
+def ack_payload(rwnd=None, sack=()):  # payload ของ ACK (ว่างถ้าไม่ประกาศ rwnd และไม่มี SACK)
+    if not sack:
+        return ACK_WINDOW.pack(min(rwnd, NO_RWND)) if rwnd is not None else b''
+    sack = sack[:MAX_SACK_BLOCKS]
+    data = bytearray(ACK_WINDOW.size + SACK_BLOCK.size * len(sack))
+    ACK_WINDOW.pack_into(data, 0, min(rwnd, NO_RWND) if rwnd is not None else NO_RWND)
+    for i, (start, end) in enumerate(sack):
+        SACK_BLOCK.pack_into(data, ACK_WINDOW.size + i * SACK_BLOCK.size, start, end)
+    return data
+
+def parse_ack_window(data):  # อ่าน rwnd จาก payload ของ ACK (None ถ้าไม่มี)
+    if len(data) < ACK_WINDOW.size:
+        return None
+    rwnd = ACK_WINDOW.unpack_from(data)[0]
+    return None if rwnd == NO_RWND and len(data) > ACK_WINDOW.size else rwnd
+
+def parse_ack_sack(data):  # อ่าน SACK block [(start, end), ...] จาก payload ของ ACK (ว่างถ้าไม่มี)
+    count = (len(data) - ACK_WINDOW.size) // SACK_BLOCK.size
+    return [SACK_BLOCK.unpack_from(data, ACK_WINDOW.size + i * SACK_BLOCK.size)
+            for i in range(min(count, MAX_SACK_BLOCKS))]
+
+def sack_blocks(seqs, limit=MAX_SACK_BLOCKS):  # รวม seq ที่รับไว้ (เรียงแล้ว) เป็นช่วง [start, end)
+    blocks = []
+    for s in seqs:
+        if blocks and blocks[-1][1] == s:
+            blocks[-1][1] = s + 1
+        elif len(blocks) == limit:
+            break
+        else:
+            blocks.append([s, s + 1])
+    return [tuple(b) for b in blocks]
+
+def sack_holes(base, hi, sacked, skip=()):  # seq ใน [base, hi) ที่ยังไม่อยู่ใน SACK (และไม่อยู่ใน skip) = ต้องส่งซ้ำ
+    return [s for s in range(base, hi) if s not in sacked and s not in skip]
 
 def create_eof_packet(seq_num, file_hash):  # สร้าง packet สำหรับบอกว่าไฟล์จบแล้ว
     return Packet(PacketType.EOF, seq_num, file_hash)
@@ -89,7 +206,14 @@ def create_eof_packet(seq_num, file_hash):  # สร้าง packet สำห
 def create_error_packet(error_msg):  # สร้าง packet สำหรับแจ้ง error
     return Packet(PacketType.ERROR, 0, error_msg.encode('utf-8'))
 
+def create_probe_packet(payload):  # packet ทดสอบขนาด: data ยาว payload bytes, seq = payload
+    return Packet(PacketType.PROBE, payload, bytes(payload))
 
-    
+def create_info_packet(**fields):  # packet แจ้งข้อมูลไฟล์: key=value\0key=value
+    data = '\0'.join(f"{key}={value}" for key, value in fields.items() if value is not None)
+    return Packet(PacketType.INFO, 0, data.encode('utf-8'))
 
-        
\ No newline at end of file
+def parse_info(data):  # อ่าน key=value จาก payload ของ INFO → dict (ค่าเป็น str)
+    if not data:
+        return {}
+    return parse_request(b'\0' + bytes(data))[1]
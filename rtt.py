@@ -0,0 +1,52 @@
+from proto import TIMEOUT, MIN_RTO, MAX_RTO
+
+class RTTEstimator:
+    # ประมาณ RTO แบบ Jacobson/Karels (RFC 6298)
+    #   SRTT   = (1 - a) * SRTT + a * R
+    #   RTTVAR = (1 - b) * RTTVAR + b * |SRTT - R|
+    #   RTO    = SRTT + max(G, K * RTTVAR)
+    # Karn's algorithm: ผู้ส่งต้องเรียก sample() เฉพาะ packet ที่ไม่เคยส่งซ้ำเท่านั้น
+    # และเมื่อ timeout ให้เรียก on_timeout() เพื่อ backoff (RTO x2) จนกว่าจะได้ sample ใหม่
+    # หรือจนกว่า ACK ใหม่จะยืนยันว่าเส้นทางกลับมาปกติ (reset_backoff)
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+    G = 0.001  # ความละเอียดของนาฬิกา (วินาที)
+
+    def __init__(self, initial_rto=TIMEOUT, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self._base_rto = initial_rto  # RTO ก่อน backoff
+
+        # สถิติ
+        self.samples = 0
+        self.timeouts = 0
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = min(self.max_rto, max(self.min_rto, self.srtt + max(self.G, self.K * self.rttvar)))
+        self._base_rto = self.rto
+        self.samples += 1
+
+    def on_timeout(self):  # exponential backoff
+        self.rto = min(self.max_rto, self.rto * 2)
+        self.timeouts += 1
+
+    def reset_backoff(self):
+        # ได้ ACK ของข้อมูลใหม่ (แม้เป็น packet ที่ส่งซ้ำ) → เลิก backoff กลับไปใช้ RTO จาก SRTT
+        # ไม่งั้นหลัง go-back ซึ่งไม่มี sample ใหม่เลย RTO จะโตไปถึง MAX_RTO แล้วค้าง
+        self.rto = self._base_rto
+
+    def summary(self):  # ข้อความสรุปสำหรับแสดงในสถิติ
+        if self.srtt is None:
+            return f"RTO={self.rto * 1000:.1f}ms (no RTT samples, timeouts={self.timeouts})"
+        return (f"SRTT={self.srtt * 1000:.2f}ms RTTVAR={self.rttvar * 1000:.2f}ms "
+                f"RTO={self.rto * 1000:.1f}ms (samples={self.samples}, timeouts={self.timeouts})")
@@ -1,18 +1,180 @@
 import argparse
-import os
 import socket
-import sys
-from proto import Packet, PacketType, PACKET_SIZE, TIMEOUT, MAX_RETRIES, create_request_packet, create_data_packet, create_ack_packet, create_eof_packet, create_error_packet
+import time
+from proto import (
+    PacketType, HEADER_SIZE, MAX_PACKET_SIZE, MAX_RETRIES,
+    create_eof_packet, create_info_packet, encode_into, parse_request, request_payload
+)
 from errorsim import ErrorSim
+from rtt import RTTEstimator
+from filesource import CACHE_BYTES, FileCache
+from sessions import SessionMux, open_request
 
-BUF_SIZE = PACKET_SIZE   # ขนาด buffer สำหรับรับ packet (header + data)
+BUF_SIZE = MAX_PACKET_SIZE   # ขนาด buffer สำหรับรับ packet (header + data)
 REQUEST_TIMEOUT = 60.0   # ตั้ง timeout สำหรับรอ client ใหม่ 
+
+# cache ไฟล์ที่เปิดไว้และ packet ที่ encode แล้ว ใช้ร่วมกันทุก session ใน process นี้ (None = ปิด)
+file_cache = FileCache()
+
+def set_cache_size(cache_mb):
+    global file_cache
+    file_cache = FileCache(cache_mb << 20) if cache_mb > 0 else None
+
+class SWSession:
+    # สถานะการส่งไฟล์แบบ Stop-and-Wait ของ client หนึ่งราย (หลาย client ส่งพร้อมกันผ่าน SessionMux)
+    def __init__(self, mux, client, filename, source):
+        self.mux = mux
+        self.client = client
+        self.filename = filename
+        self.source = source
+        self.seq = 0
+        self.rtt = RTTEstimator()   # RTO ปรับตาม RTT ที่วัดได้ของ client นี้
+
+        # buffer ส่งที่จองไว้ครั้งเดียวแล้วใช้ซ้ำตลอด (ไม่สร้าง bytes ใหม่ทุก packet)
+        self.tx_buf = bytearray(HEADER_SIZE + source.chunk_size)
+        self.tx_view = memoryview(self.tx_buf)
+        self.raw = None
+        self.chunk_len = 0
+
+        self.retries = 0
+        self.sends = 0
+        self.sent_at = 0.0
+        self.deadline = None
+        self.done = False
+        self.ok = False    # True เมื่อส่งไฟล์ครบและ (ถ้ามี) ได้ ACK ของ EOF
+
+    def start(self):
+        # แจ้งขนาดและ mtime ของไฟล์ให้ client จำไว้ใน checkpoint (ใช้ตรวจก่อนรับต่อ) — client เก่าจะข้าม packet นี้ไป
+        info = create_info_packet(size=self.source.raw_size, mtime=self.source.mtime)
+        self.mux.send(info.to_bytes(), self.client)
+        self._next_chunk()
+
+    def _next_chunk(self):
+        if self.seq >= self.source.num_chunks:
+            self._send_eof()
+            return
+        if self.source.cache is not None:
+            # packet ที่ encode แล้วจาก cache ที่แชร์ (client อื่นที่ขอไฟล์เดียวกันใช้ซ้ำได้)
+            self.raw = self.source.encoded(self.seq)
+            self.chunk_len = len(self.raw) - HEADER_SIZE
+        else:
+            chunk = self.source.chunk(self.seq)
+            self.chunk_len = len(chunk)
+            self.raw = self.tx_view[:encode_into(self.tx_buf, PacketType.DATA, self.seq, chunk,
+                                                data_sum=self.source.chunk_sum(self.seq))]
+        self.retries = 0
+        self.sends = 0
+        self._send()
+
+    def _send(self):
+        # ส่ง DATA packet แล้วรอ ACK ไม่เกิน RTO
+        self.mux.send(self.raw, self.client, self.seq)
+        self.sent_at = time.time()
+        self.sends += 1
+        self.deadline = self.sent_at + self.rtt.rto
+        print(f"[server] Sent seq={self.seq} (len={self.chunk_len})")
+
+    def on_packet(self, pkt):
+        if self.raw is None or pkt.type != PacketType.ACK or pkt.seq_num != self.seq:
+            return
+        # Karn: วัด RTT เฉพาะ packet ที่ส่งครั้งเดียว
+        if self.sends == 1:
+            self.rtt.sample(time.time() - self.sent_at)
+        else:
+            self.rtt.reset_backoff()
+        print(f"[server] ACK received for seq={self.seq}")
+        self.seq += 1
+        self._next_chunk()
+
+    def next_deadline(self):
+        return self.deadline
+
+    def on_timer(self, now):
+        self.rtt.on_timeout()
+        self.retries += 1
+        print(f"[server] Timeout -> Retransmit seq={self.seq} (retry={self.retries}, rto={self.rtt.rto:.3f}s)")
+        if self.retries > MAX_RETRIES:
+            print(f"[server] Too many retries, aborting transfer to {self.client}")
+            self.deadline = None
+            self.done = True
+            return
+        self._send()
+
+    def _send_eof(self):
+        # ส่ง EOF
+        self.raw = None
+        self.deadline = None
+        eof = create_eof_packet(self.seq, self.source.eof_hash()).to_bytes()
+        for _ in range(3):  # ส่งซ้ำกันหล่น
+            self.mux.send(eof, self.client, self.seq)
+        print(f"[server] Finished sending {self.filename} to {self.client}")
+        print(f"[server] {self.rtt.summary()}")
+        if self.source.compress:
+            print(f"[server] Compression {self.source.summary()}")
+        if file_cache is not None:
+            print(f"[server] File cache: {file_cache.summary()}")
+        self.done = True
+        self.ok = True
+
+    def close(self):
+        self.source.close()
+
+def open_session(mux, addr, pkt):
+    # REQUEST จาก client ใหม่ → เปิด session ของ client นั้น
+    filename, options = parse_request(pkt.data)
+    payload = request_payload(options)
+    print(f"[server] Client {addr} requested file: {filename} (payload={payload})")
+    return open_request(mux, addr, filename, options, payload, file_cache,
+                        lambda source: SWSession(mux, addr, filename, source),
+                        log=lambda msg: print(f"[server] {msg}"))
+
+def serve_mux(sock, sim):
+    # รอ REQUEST จาก client (timeout 60 วินาทีเมื่อไม่มี client ค้างอยู่) คืนค่าสถิติของ mux
+    mux = SessionMux(sock, sim, open_session, idle_timeout=REQUEST_TIMEOUT)
+    try:
+        mux.run()
+        print("[server] No client request for 60 seconds, shutting down...")
+    except KeyboardInterrupt:
+        print("\n[server] Shutting down...")
+    finally:
+        mux.close()
+    return mux.stats()
+
 def main(): 
     parser = argparse.ArgumentParser(description="Reliable UDP Server (Stop-and-Wait)") 
     parser.add_argument("port", type=int, help="UDP port สำหรับรับ request")
     parser.add_argument("--loss", type=float, default=0.0, help="loss rate (0.0-1.0)")
     parser.add_argument("--corrupt", type=float, default=0.0, help="corruption rate (0.0-1.0)")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES >> 20, help="ขนาด cache ไฟล์/packet ที่แชร์ระหว่าง client (MB, 0 = ปิด)")
+    parser.add_argument("--asyncio", action="store_true", help="ใช้ asyncio transport (aio.py)")
+    parser.add_argument("--workers", type=int, default=1, help="จำนวน worker process ที่แชร์ port เดียวกัน (SO_REUSEPORT)")
     args = parser.parse_args()
+    set_cache_size(args.cache_mb)
+
+    if args.workers > 1:
+        import workers
+        print(f"[server] Listening on UDP port {args.port} with {args.workers} workers (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
+        if args.asyncio:
+            import asyncio
+            import aio
+            serve = lambda sock: asyncio.run(aio.serve(args.port, 'sw', args.loss, args.corrupt, sock=sock,
+                                                       idle_timeout=REQUEST_TIMEOUT, cache_mb=args.cache_mb)).stats()
+        else:
+            serve = lambda sock: serve_mux(sock, ErrorSim(loss_rate=args.loss, corrupt_rate=args.corrupt))
+        workers.run(args.workers, args.port, serve)
+        return
+
+    if args.asyncio:
+        import asyncio
+        import aio
+        print(f"[server] Listening on UDP port {args.port} with asyncio (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
+        try:
+            asyncio.run(aio.serve(args.port, 'sw', args.loss, args.corrupt, idle_timeout=REQUEST_TIMEOUT,
+                                  cache_mb=args.cache_mb))
+            print("[server] No client request for 60 seconds, shutting down...")
+        except KeyboardInterrupt:
+            print("\n[server] Shutting down...")
+        return
 
     # ตั้งค่า error simulator
     sim = ErrorSim(loss_rate=args.loss, corrupt_rate=args.corrupt)
@@ -22,88 +184,10 @@ def main():
     sock.bind(("", args.port))
     print(f"[server] Listening on UDP port {args.port} (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
 
-    while True:
-        try:
-            # รอ REQUEST จาก client (timeout 60 วินาที)
-            sock.settimeout(REQUEST_TIMEOUT)
-            try:
-                req_bytes, addr = sock.recvfrom(BUF_SIZE)
-            except socket.timeout:
-                print("[server] No client request for 60 seconds, shutting down...")
-                return
-            pkt = Packet.from_bytes(req_bytes)
-            if isinstance(pkt, tuple):  # รองรับกรณีคืน (pkt, ok)
-                pkt, ok = pkt
-                if not ok:
-                    continue
-
-            if pkt.type != PacketType.REQUEST:
-                continue
-
-            filename = pkt.data.decode("utf-8", errors="ignore")
-            print(f"[server] Client {addr} requested file: {filename}")
-
-            if not os.path.exists(filename):
-                err = create_error_packet("File not found")
-                out = sim.process(err.to_bytes())
-                if out is not None:
-                    sock.sendto(out, addr)
-                print("[server] File not found, sent ERROR")
-                continue
-
-            # เริ่มส่งไฟล์
-            with open(filename, "rb") as f:
-                seq = 0
-                while True:
-                    chunk = f.read(PACKET_SIZE)
-                    if not chunk:
-                        # ส่ง EOF
-                        eof = create_eof_packet(seq, b"")
-                        for _ in range(3):  # ส่งซ้ำกันหล่น
-                            out = sim.process(eof.to_bytes(), seq)
-                            if out is not None:
-                                sock.sendto(out, addr)
-                        print(f"[server] Finished sending {filename}")
-                        break
-
-                    data_pkt = create_data_packet(seq, chunk)
-                    retries = 0
-                    while True:
-                        # ส่ง DATA packet
-                        out = sim.process(data_pkt.to_bytes(), seq)
-                        if out is not None:
-                            sock.sendto(out, addr)
-                        print(f"[server] Sent seq={seq} (len={len(chunk)})")
-
-                        # รอ ACK
-                        sock.settimeout(TIMEOUT)
-                        got_ack = False
-                        try:
-                            resp, _ = sock.recvfrom(BUF_SIZE)
-                            ack = Packet.from_bytes(resp)
-                            if isinstance(ack, tuple):
-                                ack, ok = ack
-                                if not ok:
-                                    continue
-                            if ack.type == PacketType.ACK and ack.seq_num == seq:
-                                got_ack = True
-                        except socket.timeout:
-                            got_ack = False
-
-                        if got_ack:
-                            print(f"[server] ACK received for seq={seq}")
-                            seq += 1
-                            break
-                        else:
-                            retries += 1
-                            print(f"[server] Timeout -> Retransmit seq={seq} (retry={retries})")
-                            if retries > MAX_RETRIES:
-                                print("[server] Too many retries, aborting transfer")
-                                return
-
-        except KeyboardInterrupt:
-            print("\n[server] Shutting down...")
-            sys.exit(0)
+    try:
+        serve_mux(sock, sim)
+    finally:
+        sock.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,186 +1,402 @@
 import socket
 import sys
-import os
 import time
 import logging
 from proto import (
-    PACKET_SIZE, MAX_PACKET_SIZE, TIMEOUT, MAX_RETRIES,
-    Packet, PacketType,
-    create_data_packet, create_eof_packet, create_error_packet
+    HEADER_SIZE, MAX_RETRIES, MAX_PAYLOAD, Packet, PacketType, parse_request, request_payload,
+    create_eof_packet, create_info_packet, parse_ack_window, parse_ack_sack, sack_holes
 )
 from errorsim import ErrorSim
+from filesource import CACHE_BYTES, FileCache, WireCache
+from rtt import RTTEstimator
+from congestion import make_window, MAX_WINDOW, MODES
+from sessions import SessionMux, open_request
+from fec import FEC_OVERHEAD, request_fec, parity_packets
+from pacing import make_pacer, parse_rate
 
 logging.basicConfig(level=logging.INFO, format='[SERVER-GBN] %(message)s')
 
 WINDOW_SIZE = 4   # ขนาดหน้าต่าง GBN (ปรับได้ตามเหมาะสม)
+CACHE_LOOKAHEAD = 4  # จำนวน packet ที่ cache เผื่อไว้นอกหน้าต่าง
+DUP_ACK_THRESHOLD = 3  # ได้ ACK ซ้ำครบเท่านี้ → fast retransmit โดยไม่รอ timeout
 
-class GBNServer:
-    def __init__(self, port, loss_rate=0.0, corrupt_rate=0.0):
-        self.port = port
-        self.sock = None
-        self.sim = ErrorSim(loss_rate, corrupt_rate)
+class GBNSession:
+    # สถานะการส่งไฟล์ด้วย GBN ของ client หนึ่งราย (ขับเคลื่อนด้วย ACK และ timer จาก SessionMux)
+    def __init__(self, server, mux, client, source, fec=None):
+        self.server = server
+        self.mux = mux
+        self.client = client
+        self.source = source
+        self.n = source.num_chunks
+        self.fec = fec      # (K, M): ส่ง PARITY M ตัวหลัง DATA ครบทุก K ตัว (None = ไม่ใช้ FEC)
+
+        self.base = 0
+        self.next_seq = 0
+        self.sent_hi = 0    # seq สูงสุดที่เคยส่งไปแล้ว + 1 (next_seq อาจถอยกลับมาตอน timeout)
+        self.sent_at = {}   # seq -> เวลาที่ส่งครั้งแรก (ตัวที่ส่งซ้ำจะถูกลบออก ตาม Karn's algorithm)
+        self.sacked = set() # seq หลัง base ที่ client แจ้งใน SACK ว่าได้รับแล้ว (ไม่ต้องส่งซ้ำ)
+
+        # fast retransmit: นับ ACK ซ้ำของ base-1 และไม่ fast retransmit ซ้ำจนกว่า base จะเลื่อนจาก fast_base
+        # (ACK ซ้ำจาก packet เก่าที่ยังค้างในเส้นทาง) และ (SACK) จนกว่าจะพ้นช่วง recovery ถึง recover
+        self.dup_acks = 0
+        # FEC: packet ที่หายในบล็อกจะทำให้เกิด ACK ซ้ำจนกว่า PARITY ท้ายบล็อกจะไปถึง → รอเพิ่มอีก K ตัว
+        self.dup_threshold = DUP_ACK_THRESHOLD + (fec[0] if fec else 0)
+        self.fast_base = None
+        self.recover = None
+        self.fast_sent = set()  # ช่องว่างที่ส่งซ้ำไปแล้วในช่วง recovery นี้ (SACK)
+
+        # ตัวจับเวลาแบบ window-level (ระยะเวลาตาม RTO ที่ปรับจาก RTT)
+        self.timer_running = False
+        self.timer_start = 0.0
+        self.timeouts = 0   # timeout ติดกันที่ base ไม่เลื่อนเลย (client หายไปแล้ว → เลิกส่ง)
+
+        self.rtt = RTTEstimator()
+        self.cc = make_window(server.cc_mode, server.max_window)
+        self.rwnd = None   # หน้าต่างที่ client ประกาศมาล่าสุด (None = ไม่จำกัด)
+        self.cache = WireCache(server.max_window + CACHE_LOOKAHEAD)
+
+        # pacing (ถ้าเปิด): DATA ในหน้าต่างถูกเว้นระยะตาม token bucket แทนการส่งติดกันรวดเดียว
+        self.pacer = make_pacer(server.pace)
+        self.pace_deadline = None   # เวลาที่ token จะพอส่ง packet ถัดไป (None = ไม่ได้รอ)
+
+        # EOF ส่งแบบ Stop-and-Wait หลังข้อมูลถูก ACK ครบ
+        self.eof_raw = None
+        self.eof_attempts = 0
+        self.eof_deadline = None
+        self.done = False
+        self.ok = False    # True เมื่อส่งไฟล์ครบและ (ถ้ามี) ได้ ACK ของ EOF
 
         # สถิติ
         self.retx = 0
-        self.start_time = None
+        self.acks_rx = 0     # ACK ที่เลื่อน base ได้
+        self.stale_acks = 0  # ACK ซ้ำหรือเก่ากว่า base (ไม่มีผล)
+        self.sack_retx = 0   # ส่งซ้ำเฉพาะช่องว่างตอน timeout
+        self.sack_skipped = 0  # packet ที่ไม่ต้องส่งซ้ำเพราะ SACK แจ้งว่าได้รับแล้ว
+        self.fast_retx = 0     # จำนวนครั้งที่ fast retransmit
+        self.parity_sent = 0
+        self.start_time = time.time()
 
     def start(self):
-        try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.sock.bind(('', self.port))
-            print(f"[server] Listening on UDP port {self.port} (loss={self.sim.loss_rate:.0%}, corrupt={self.sim.corrupt_rate:.0%})")
+        # แจ้งขนาดไฟล์ (ข้อมูลดิบ) ให้ client จองพื้นที่ดิสก์ล่วงหน้าได้ และ mtime ให้ client จำไว้ใน checkpoint
+        # — client เก่าจะข้าม packet นี้ไป
+        info = create_info_packet(size=self.source.raw_size, chunks=self.n, mtime=self.source.mtime)
+        self.mux.send(info.to_bytes(), self.client)
+        if self.n == 0:
+            self._finish_data()
+        else:
+            self._pump()
 
-            while True:
-                try:
-                    # รอ REQUEST จาก client (timeout 60 วินาที)
-                    self.sock.settimeout(60.0)
-                    self.handle_once()
-                except socket.timeout:
-                    print("[server] No client request for 60 seconds, shutting down...")
-                    return
-                except KeyboardInterrupt:
+    def window(self):
+        # หน้าต่างที่ใช้จริง = min(cwnd, rwnd ที่ client ประกาศ) อย่างน้อย 1 packet
+        win = self.cc.window
+        if self.rwnd is not None:
+            win = min(win, self.rwnd)
+        return max(1, win)
+
+    def _pump(self):
+        # ส่งได้เมื่อยังไม่เต็มหน้าต่าง (หน้าต่าง = min(cwnd, rwnd))
+        win = self.window()
+        self.pace_deadline = None
+        if self.pacer is not None:
+            self.pacer.update(win, self.rtt.srtt or self.rtt.rto, HEADER_SIZE + self.source.chunk_size)
+        while self.next_seq < self.base + win and self.next_seq < self.n:
+            seq = self.next_seq
+            if seq in self.sacked:
+                self.next_seq += 1
+                continue
+            raw = self.cache.get(seq, self.source.encoded)  # ส่งซ้ำใช้ bytes เดิม ไม่คำนวณ checksum ซ้ำ
+            if self.pacer is not None:
+                wait = self.pacer.take(len(raw))
+                if wait > 0:
+                    # token ไม่พอ → ให้ timer ปลุกกลับมาส่งส่วนที่เหลือของหน้าต่าง
+                    self.pace_deadline = time.time() + wait
                     break
-        finally:
-            if self.sock:
-                self.sock.close()
+            first = seq >= self.sent_hi
+            if not first:
+                self.retx += 1   # ส่งซ้ำหลังถอยกลับ (go-back)
+            else:
+                self.sent_at[seq] = time.time()
+                self.sent_hi = seq + 1
+            if self.mux.send(raw, self.client, seq):
+                if self.pacer is not None:
+                    self.mux.flush()   # ออกตามจังหวะ token จริง ไม่ไปรวม batch กับ packet อื่นตอนจบรอบ
+                    self.pacer.sent(len(raw))
+                logging.info(f"Send DATA #{seq} (window {self.base}..{self.base+win-1})")
+            else:
+                logging.info(f"Drop DATA #{seq} (simulated)")
+            # ส่ง DATA ตัวสุดท้ายของบล็อกครั้งแรก → ตามด้วย PARITY ของบล็อก (ไม่ส่งซ้ำ และไม่นับในหน้าต่าง)
+            if first and self.fec and (seq % self.fec[0] == self.fec[0] - 1 or seq == self.n - 1):
+                self._send_parity(seq // self.fec[0])
+
+            # เริ่มจับเวลาเมื่อส่งแพ็กเก็ตแรกในหน้าต่าง
+            if not self.timer_running:
+                self.timer_running = True
+                self.timer_start = time.time()
 
-    def handle_once(self):
-        # รับ REQUEST
-        data, client = self.sock.recvfrom(MAX_PACKET_SIZE)
-        pkt, ok = Packet.from_bytes(data)
-        if not ok or pkt.type != PacketType.REQUEST:
-            logging.info('Ignore non-REQUEST')
+            self.next_seq += 1
+
+    def on_packet(self, pkt):
+        if pkt.type != PacketType.ACK:
+            return
+        if self.eof_raw is not None:
+            if pkt.seq_num == self.n:
+                logging.info(f"EOF ACKed by {self.client}.")
+                self.done = True
+                self.ok = True
             return
 
-        filename = pkt.data.decode('utf-8', errors='ignore')
-        logging.info(f"Request '{filename}' from {client}")
+        rwnd = parse_ack_window(pkt.data)
+        if rwnd is not None:
+            self.rwnd = rwnd
 
-        if not os.path.exists(filename):
-            self._send_error(client, f'File not found: {filename}')
+        ackno = pkt.seq_num  # cumulative ACK ถึงแพ็กเก็ตหมายเลขนี้ (client อาจหน่วงไว้ ACK ทีละหลาย packet)
+        if len(pkt.data) > 2:
+            # SACK: ช่วงที่ client ได้รับแล้วหลังช่องว่าง (มักมากับ ACK ซ้ำ จึงต้องอ่านก่อนตรวจ ackno)
+            for start, end in parse_ack_sack(pkt.data):
+                self.sacked.update(range(max(start, self.base, ackno + 1), min(end, self.sent_hi)))
+        if not self.base <= ackno < self.sent_hi:
+            self.stale_acks += 1
+            if ackno == self.base - 1 and self.next_seq > self.base:
+                # ACK ซ้ำ = client ได้ packet หลังช่องว่าง → base น่าจะหาย
+                self.dup_acks += 1
+                if (self.dup_acks == self.dup_threshold and self.base != self.fast_base
+                        and (self.recover is None or self.base >= self.recover)):
+                    self._fast_retransmit()
+                    return
+            if self.rwnd is not None:
+                self._pump()   # rwnd อาจเปิดกว้างขึ้น
             return
+        self.acks_rx += 1
+        self.dup_acks = 0
 
-        # อ่านข้อมูลและสร้างแพ็กเก็ตทั้งหมดล่วงหน้า
-        with open(filename, 'rb') as f:
-            file_data = f.read()
-        total = len(file_data)
-        num_packets = (total + PACKET_SIZE - 1) // PACKET_SIZE
-        logging.info(f"Size={total} bytes, packets={num_packets}")
+        # วัด RTT จาก packet ที่ถูก ACK (ถ้าไม่เคยส่งซ้ำ)
+        # ACK ที่เลื่อนข้ามช่องว่างที่ส่งซ้ำไป (SACK) ไม่ใช้วัด เพราะ packet ล่าสุดรอช่องว่างนั้นอยู่
+        sample = None
+        first_sent = self.sent_at.get(ackno)
+        if first_sent is not None and self.sacked and self.base not in self.sent_at:
+            first_sent = None
+        if first_sent is not None:
+            sample = time.time() - first_sent
+            self.rtt.sample(sample)
+        else:
+            self.rtt.reset_backoff()
+        if len(self.sent_at) <= ackno + 1 - self.base:
+            self.sent_at = {s: t for s, t in self.sent_at.items() if s > ackno}
+        else:
+            for s in range(self.base, ackno + 1):
+                self.sent_at.pop(s, None)
+        self.timeouts = 0
+        self.cc.on_ack(ackno + 1 - self.base, sample)
+        self.base = ackno + 1
+        self.next_seq = max(self.next_seq, self.base)
+        if self.sacked:
+            self.sacked = {s for s in self.sacked if s >= self.base}
+        self.cache.release_below(self.base)
+        logging.info(f"ACK up to #{ackno}, slide base -> {self.base}")
 
-        packets = []
-        for i in range(num_packets):
-            off = i * PACKET_SIZE
-            chunk = file_data[off: off + PACKET_SIZE]
-            packets.append(create_data_packet(i, chunk))
+        if self.base >= self.n:
+            self._finish_data()
+            return
+        if self.recover is not None:
+            if self.base >= self.recover:
+                self.recover = None   # ช่องว่างทั้งหมดก่อน recover ถูกเติมแล้ว
+                self.fast_sent.clear()
+            elif self.sacked:
+                # partial ACK: ยังมีช่องว่างเหลือหลัง base ใหม่ → ส่งซ้ำเลยไม่ต้องรอ ACK ซ้ำอีก 3 ตัว
+                self.fast_sent.update(self._retransmit_holes(max(self.sacked), self.fast_sent))
+        # ถ้าเลื่อน base ไปถึง next_seq แสดงว่าไม่มี outstanding packet
+        if self.base == self.next_seq:
+            self.timer_running = False
+        else:
+            # ยังมี outstanding → รีสตาร์ทนาฬิกา
+            self.timer_running = True
+            self.timer_start = time.time()
+        self._pump()
 
-        # ส่งด้วย GBN
-        self._send_gbn(client, packets)
+    def next_deadline(self):
+        if self.eof_raw is not None:
+            return self.eof_deadline
+        deadline = self.timer_start + self.rtt.rto if self.timer_running else None
+        if self.pace_deadline is not None and (deadline is None or self.pace_deadline < deadline):
+            return self.pace_deadline
+        return deadline
 
-        # ส่ง EOF (seq = จำนวนแพ็กเก็ตข้อมูล)
-        eof = create_eof_packet(num_packets, b'')
-        self._send_stop_and_wait(client, eof, num_packets)
+    def on_timer(self, now):
+        if self.eof_raw is not None:
+            self.rtt.on_timeout()
+            logging.info(f"EOF timeout, retry {self.eof_attempts}/{MAX_RETRIES}")
+            self._send_eof()
+            return
+        if self.pace_deadline is not None and not (self.timer_running and now >= self.timer_start + self.rtt.rto):
+            # ถึงเวลาส่งตาม pacing (ไม่ใช่ timeout)
+            self._pump()
+            return
 
-    def _send_gbn(self, client, packets):
-        base = 0
-        next_seq = 0
-        n = len(packets)
+        self.timeouts += 1
+        if self.timeouts > MAX_RETRIES:
+            logging.info(f"Too many retries at #{self.base}, aborting transfer to {self.client}")
+            self.timer_running = False
+            self.pace_deadline = None
+            self.done = True
+            return
+        self.rtt.on_timeout()
+        self.cc.on_timeout()
+        # ACK ซ้ำจาก packet ที่ส่งไปก่อน timeout ไม่ต้อง fast retransmit อีก
+        self.dup_acks = 0
+        self.fast_base = self.base
+        self.recover = self.sent_hi if self.sacked else None
+        self.fast_sent.clear()
+        if self.sacked:
+            # client แจ้ง SACK มา → ส่งซ้ำเฉพาะช่องว่างในส่วนที่ส่งไปแล้ว ไม่ต้องถอยทั้งหน้าต่าง
+            holes = self._retransmit_holes(self.next_seq)
+            logging.info(f"Timeout -> retransmit {len(holes)} hole(s) from #{self.base}, "
+                         f"skip {len(self.sacked)} SACKed (rto={self.rtt.rto:.3f}s, cwnd={self.cc.window})")
+            self.sack_skipped += len(self.sacked)
+            self.timer_start = now
+            return
 
-        # ตัวจับเวลาแบบ window-level
-        timer_running = False
-        timer_start = 0.0
+        # ถอยกลับไปส่งซ้ำตั้งแต่ base (ตามขนาดหน้าต่างใหม่) และ backoff RTO
+        logging.info(f"Timeout window -> go back to #{self.base} (rto={self.rtt.rto:.3f}s, cwnd={self.cc.window})")
+        for s in range(self.base, self.next_seq):
+            self.sent_at.pop(s, None)
+        self.next_seq = self.base
+        # รีสตาร์ทนาฬิกาใหม่
+        self.timer_start = now
+        self._pump()
 
-        # ตั้งค่า recv timeout สำหรับรอ ACK
-        self.sock.settimeout(TIMEOUT)
+    def _send_parity(self, block):
+        k, m = self.fec
+        for pseq, data in parity_packets(self.source, block, k, m):
+            self.mux.send(Packet(PacketType.PARITY, pseq, data).to_bytes(), self.client)
+            self.parity_sent += 1
 
-        # รีเซ็ตสถิติ
-        self.retx = 0
-        self.start_time = time.time()
+    def _fast_retransmit(self):
+        # ได้ ACK ซ้ำครบ DUP_ACK_THRESHOLD → ส่งซ้ำทันที (เสียเวลา ~1 RTT แทนที่จะรอ RTO)
+        self.fast_retx += 1
+        self.cc.on_fast_retransmit()
+        self.fast_base = self.base
+        if self.sacked:
+            self.recover = self.sent_hi
+            # มี SACK → ส่งซ้ำเฉพาะช่องว่างที่อยู่ต่ำกว่า seq สูงสุดที่ client ได้รับแล้ว
+            holes = self._retransmit_holes(max(self.sacked))
+            self.fast_sent.update(holes)
+            logging.info(f"{self.dup_acks} duplicate ACKs -> fast retransmit {len(holes)} hole(s) from #{self.base}")
+        else:
+            # GBN แท้ → ถอยกลับไปส่งใหม่ตั้งแต่ base
+            logging.info(f"{self.dup_acks} duplicate ACKs -> fast retransmit from #{self.base}")
+            for s in range(self.base, self.next_seq):
+                self.sent_at.pop(s, None)
+            self.next_seq = self.base
+            self._pump()
+        self.timer_running = True
+        self.timer_start = time.time()
+
+    def _retransmit_holes(self, hi, skip=()):
+        # ส่งซ้ำ seq ใน [base, hi) ที่ client ยังไม่ได้รับ (ไม่อยู่ใน SACK) คืนรายการที่ส่ง
+        holes = sack_holes(self.base, hi, self.sacked, skip)
+        for s in holes:
+            self.sent_at.pop(s, None)
+            self.mux.send(self.cache.get(s, self.source.encoded), self.client, s)
+        self.retx += len(holes)
+        self.sack_retx += len(holes)
+        return holes
 
-        # ส่งจนกว่าจะ ACK ครบทุกตัว (base เคลื่อนไปถึง n)
-        while base < n:
-            # ส่งได้เมื่อยังไม่เต็มหน้าต่าง
-            while next_seq < base + WINDOW_SIZE and next_seq < n:
-                raw = packets[next_seq].to_bytes()
-                simd = self.sim.process(raw, next_seq)
-                if simd is not None:
-                    self.sock.sendto(simd, client)
-                    logging.info(f"Send DATA #{next_seq} (window {base}..{base+WINDOW_SIZE-1})")
-                else:
-                    logging.info(f"Drop DATA #{next_seq} (simulated)")
-
-                # เริ่มจับเวลาเมื่อส่งแพ็กเก็ตแรกในหน้าต่าง
-                if not timer_running and base < next_seq + 1:
-                    timer_running = True
-                    timer_start = time.time()
-
-                next_seq += 1
-
-            # พยายามรับ ACK
-            try:
-                ack_bytes, addr = self.sock.recvfrom(MAX_PACKET_SIZE)
-                if addr != client:
-                    continue
-                ack_pkt, ok = Packet.from_bytes(ack_bytes)
-                if not ok or ack_pkt.type != PacketType.ACK:
-                    continue
-
-                ackno = ack_pkt.seq_num  # cumulative ACK ถึงแพ็กเก็ตหมายเลขนี้
-                if ackno >= base:
-                    base = ackno + 1
-                    logging.info(f"ACK up to #{ackno}, slide base -> {base}")
-                    # ถ้าเลื่อน base ไปถึง next_seq แสดงว่าไม่มี outstanding packet 
-                    if base == next_seq:
-                        timer_running = False
-                    else:
-                        # ยังมี outstanding → รีสตาร์ทนาฬิกา
-                        timer_running = True
-                        timer_start = time.time()
-            except socket.timeout:
-                pass
-
-            # ตรวจ timeout window
-            if timer_running and (time.time() - timer_start >= TIMEOUT):
-                # ส่งซ้ำตั้งแต่ base ถึง next_seq-1
-                logging.info(f"Timeout window -> retransmit from #{base} to #{next_seq-1}")
-                for s in range(base, next_seq):
-                    raw = packets[s].to_bytes()
-                    simd = self.sim.process(raw, s)
-                    if simd is not None:
-                        self.sock.sendto(simd, client)
-                    self.retx += 1
-                # รีสตาร์ทนาฬิกาใหม่
-                timer_start = time.time()
+    def _finish_data(self):
+        self.timer_running = False
+        self.pace_deadline = None
 
         # สรุปสถิติ
         duration = time.time() - self.start_time
-        kbps = (sum(len(p.data) for p in packets) / duration) / 1024 if duration > 0 else 0
-        logging.info("All data packets ACKed.")
-        logging.info(f"Retransmissions: {self.retx}")
+        kbps = (self.source.size / duration) / 1024 if duration > 0 else 0
+        logging.info(f"All data packets ACKed by {self.client}.")
+        logging.info(f"Retransmissions: {self.retx} (SACK holes={self.sack_retx}, skipped={self.sack_skipped})")
+        logging.info(f"Fast retransmits: {self.fast_retx}")
+        if self.fec:
+            logging.info(f"FEC {self.fec[0]}:{self.fec[1]}: parity sent={self.parity_sent}")
+        logging.info(f"ACKs: {self.acks_rx} ({self.n / max(1, self.acks_rx):.1f} DATA/ACK), stale={self.stale_acks}")
+        logging.info(f"RTT: {self.rtt.summary()}")
+        logging.info(f"Window ({self.server.cc_mode}): {self.cc.summary()} rwnd={self.rwnd if self.rwnd is not None else '-'}")
+        if self.pacer is not None:
+            logging.info(f"Pacing: {self.pacer.summary()}")
+        logging.info(f"Wire cache: hits={self.cache.hits}, misses={self.cache.misses}, evictions={self.cache.evictions}")
+        if self.server.files:
+            logging.info(f"File cache: {self.server.files.summary()}")
         logging.info(f"Throughput: {kbps:.2f} KB/s")
+        if self.source.compress:
+            eff = (self.source.raw_size / duration) / 1024 if duration > 0 else 0
+            logging.info(f"Compression {self.source.summary()}, effective throughput {eff:.2f} KB/s")
 
-    def _send_stop_and_wait(self, client, pkt, seq):
-        """ส่ง EOF แบบ Stop-and-Wait ให้แน่ใจว่าอีกฝั่งได้รับแน่นอน"""
-        raw = pkt.to_bytes()
-        for attempt in range(MAX_RETRIES):
-            simd = self.sim.process(raw, seq)
-            if simd is not None:
-                self.sock.sendto(simd, client)
-            try:
-                self.sock.settimeout(TIMEOUT)
-                ack_bytes, addr = self.sock.recvfrom(MAX_PACKET_SIZE)
-                if addr != client:
-                    continue
-                ack_pkt, ok = Packet.from_bytes(ack_bytes)
-                if ok and ack_pkt.type == PacketType.ACK and ack_pkt.seq_num == seq:
-                    logging.info("EOF ACKed.")
-                    return
-            except socket.timeout:
-                logging.info(f"EOF timeout, retry {attempt+1}/{MAX_RETRIES}")
-        logging.info("EOF failed after retries.")
+        # ส่ง EOF (seq = จำนวนแพ็กเก็ตข้อมูล) แบบ Stop-and-Wait ให้แน่ใจว่าอีกฝั่งได้รับแน่นอน
+        self.eof_raw = create_eof_packet(self.n, self.source.eof_hash()).to_bytes()
+        self._send_eof()
+
+    def _send_eof(self):
+        if self.eof_attempts >= MAX_RETRIES:
+            logging.info("EOF failed after retries.")
+            self.done = True
+            return
+        self.eof_attempts += 1
+        self.mux.send(self.eof_raw, self.client, self.n)
+        self.eof_deadline = time.time() + self.rtt.rto
+
+    def close(self):
+        self.source.close()
+
+class GBNServer:
+    def __init__(self, port, loss_rate=0.0, corrupt_rate=0.0, cc='fixed', window=None, cache_mb=CACHE_BYTES >> 20,
+                 pace=None):
+        self.port = port
+        self.sock = None
+        self.sim = ErrorSim(loss_rate, corrupt_rate)
+
+        # cache ไฟล์ที่เปิดไว้และ packet ที่ encode แล้ว ใช้ร่วมกันทุก session (cache_mb=0 → ปิด)
+        self.files = FileCache(cache_mb << 20) if cache_mb > 0 else None
+
+        # หน้าต่างส่ง: 'fixed' ใช้ขนาดคงที่, 'aimd'/'delay' ปรับตาม ACK/timeout ไม่เกิน max_window
+        self.cc_mode = cc
+        self.max_window = window or (WINDOW_SIZE if cc == 'fixed' else MAX_WINDOW)
+        self.pace = pace   # None = ไม่ pace, 'auto' = ตาม cwnd/RTT, หรือ byte/s
+
+        # session ของแต่ละ client (หลาย client ส่งพร้อมกันได้)
+        self.mux = None
+
+    def start(self):
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind(('', self.port))
+            print(f"[server] Listening on UDP port {self.port} (loss={self.sim.loss_rate:.0%}, corrupt={self.sim.corrupt_rate:.0%})")
+            self.serve(self.sock)
+        finally:
+            if self.sock:
+                self.sock.close()
 
-    def _send_error(self, client, msg):
-        ep = create_error_packet(msg)
-        self.sock.sendto(ep.to_bytes(), client)
-        logging.info(f"Send ERROR: {msg}")
+    def serve(self, sock):
+        # รอ REQUEST จาก client บน socket ที่ bind แล้ว (timeout 60 วินาทีเมื่อไม่มี client ค้างอยู่)
+        # คืนค่าสถิติของ mux (ใช้รวมผลในโหมด --workers)
+        self.mux = SessionMux(sock, self.sim, self.open_session)
+        try:
+            self.mux.run()
+            print("[server] No client request for 60 seconds, shutting down...")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.mux.close()
+        return self.mux.stats()
+
+    def open_session(self, mux, client, pkt):
+        # สร้าง session ใหม่เมื่อได้ REQUEST จาก client ที่ยังไม่มี session
+        filename, options = parse_request(pkt.data)
+        payload = request_payload(options)
+        fec = request_fec(options)
+        if fec:
+            payload = min(payload, MAX_PAYLOAD - FEC_OVERHEAD)   # PARITY ยาวกว่า DATA เต็มขนาด
+        logging.info(f"Request '{filename}' from {client} (payload={payload}, fec={fec}, compress={options.get('compress')})")
+
+        def build(source):
+            logging.info(f"Size={source.size} bytes (offset {source.offset}), packets={source.num_chunks}")
+            return GBNSession(self, mux, client, source, fec)
+        # map ไฟล์แบบ streaming → สร้าง packet เฉพาะที่อยู่ในหน้าต่างปัจจุบัน
+        return open_request(mux, client, filename, options, payload, self.files, build)
 
 def main():
     import argparse
@@ -188,9 +404,46 @@ def main():
     ap.add_argument("port", type=int)
     ap.add_argument("--loss", type=float, default=0.0)
     ap.add_argument("--corrupt", type=float, default=0.0)
+    ap.add_argument("--cc", choices=MODES, default="fixed",
+                    help="window control: fixed, aimd (slow start + AIMD) or delay (Vegas-style)")
+    ap.add_argument("--window", type=int, default=None,
+                    help=f"window size for fixed mode / max window otherwise (default {WINDOW_SIZE} / {MAX_WINDOW})")
+    ap.add_argument("--cache-mb", type=int, default=CACHE_BYTES >> 20,
+                    help="shared cache of open files and encoded packets (MB, 0 = off)")
+    ap.add_argument("--pace", type=parse_rate, default=None, metavar="KBPS|auto",
+                    help="space DATA packets with a token bucket: fixed rate in KB/s or 'auto' (cwnd/RTT)")
+    ap.add_argument("--asyncio", action="store_true", help="use the asyncio transport (aio.py)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="number of worker processes sharing the port via SO_REUSEPORT")
     args = ap.parse_args()
 
-    srv = GBNServer(args.port, args.loss, args.corrupt)
+    if args.workers > 1:
+        import workers
+        print(f"[server] Listening on UDP port {args.port} with {args.workers} workers (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
+        if args.asyncio:
+            import asyncio
+            import aio
+            serve = lambda sock: asyncio.run(aio.serve(args.port, 'gbn', args.loss, args.corrupt, sock=sock,
+                                                       cc=args.cc, window=args.window, cache_mb=args.cache_mb,
+                                                       pace=args.pace)).stats()
+        else:
+            serve = lambda sock: GBNServer(args.port, args.loss, args.corrupt, args.cc, args.window, args.cache_mb,
+                                           args.pace).serve(sock)
+        workers.run(args.workers, args.port, serve)
+        return
+
+    if args.asyncio:
+        import asyncio
+        import aio
+        print(f"[server] Listening on UDP port {args.port} with asyncio (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
+        try:
+            asyncio.run(aio.serve(args.port, 'gbn', args.loss, args.corrupt, cc=args.cc, window=args.window, cache_mb=args.cache_mb,
+                                  pace=args.pace))
+        except KeyboardInterrupt:
+            print("\n[SERVER-GBN] Shutting down...")
+        return
+
+    srv = GBNServer(args.port, args.loss, args.corrupt, args.cc, args.window, args.cache_mb, args.pace)
     try:
         srv.start()
     except KeyboardInterrupt:
@@ -26,7 +26,7 @@ class ServerGUI:
         ttk.Label(config_frame, text="โปรโตคอล:").grid(row=0, column=0, sticky="w", padx=5, pady=5)
         self.protocol_var = tk.StringVar(value="Go-Back-N")
         protocol_combo = ttk.Combobox(config_frame, textvariable=self.protocol_var,
-                                      values=["Stop-and-Wait", "Go-Back-N"], state="readonly", width=20)
+                                      values=["Stop-and-Wait", "Go-Back-N", "Selective Repeat"], state="readonly", width=20)
         protocol_combo.grid(row=0, column=1, padx=5, pady=5)
 
         # Port
@@ -94,6 +94,8 @@ class ServerGUI:
             # เลือกไฟล์ server ตาม protocol
             if self.protocol_var.get() == "Stop-and-Wait":
                 server_file = "server.py"
+            elif self.protocol_var.get() == "Selective Repeat":
+                server_file = "server_sr.py"
             else:
                 server_file = "server_gbn.py"
 
@@ -0,0 +1,287 @@
+import socket
+import time
+import logging
+from proto import (
+    HEADER_SIZE, MAX_RETRIES, PacketType, parse_request, request_payload, create_eof_packet
+)
+from errorsim import ErrorSim
+from filesource import CACHE_BYTES, FileCache, WireCache
+from rtt import RTTEstimator
+from sessions import SessionMux, open_request
+from pacing import make_pacer, parse_rate
+
+logging.basicConfig(level=logging.INFO, format='[SERVER-SR] %(message)s')
+
+WINDOW_SIZE = 8   # ขนาดหน้าต่าง SR (ต้องเท่ากับหน้าต่างฝั่ง client)
+CACHE_LOOKAHEAD = 4  # จำนวน packet ที่ cache เผื่อไว้นอกหน้าต่าง
+
+class SRSession:
+    # สถานะการส่งไฟล์ด้วย Selective Repeat ของ client หนึ่งราย (ขับเคลื่อนด้วย ACK และ timer จาก SessionMux)
+    def __init__(self, server, mux, client, source):
+        self.server = server
+        self.mux = mux
+        self.client = client
+        self.source = source
+        self.window = server.window
+        self.n = source.num_chunks
+
+        self.base = 0          # seq ที่เล็กที่สุดที่ยังไม่ได้ ACK
+        self.next_seq = 0
+        self.acked = set()     # seq ในหน้าต่างที่ได้ ACK แล้ว (แต่ base ยังเลื่อนไม่ถึง)
+        self.deadlines = {}    # ตัวจับเวลาแยกต่อ packet: seq -> เวลาที่จะหมดเวลา
+        self.sent_at = {}      # seq -> เวลาที่ส่งครั้งแรก (ตัวที่ส่งซ้ำจะถูกลบออก ตาม Karn's algorithm)
+        self.retries = {}      # seq -> จำนวนครั้งที่ส่งซ้ำเพราะ timeout (เกิน MAX_RETRIES → client หายไปแล้ว เลิกส่ง)
+
+        self.rtt = RTTEstimator()
+        self.cache = WireCache(self.window + CACHE_LOOKAHEAD)
+
+        # pacing (ถ้าเปิด): DATA ในหน้าต่างถูกเว้นระยะตาม token bucket แทนการส่งติดกันรวดเดียว
+        self.pacer = make_pacer(server.pace)
+        self.pace_deadline = None   # เวลาที่ token จะพอส่ง packet ถัดไป (None = ไม่ได้รอ)
+
+        # EOF ส่งแบบ Stop-and-Wait หลังข้อมูลถูก ACK ครบ
+        self.eof_raw = None
+        self.eof_attempts = 0
+        self.eof_deadline = None
+        self.done = False
+        self.ok = False    # True เมื่อส่งไฟล์ครบและ (ถ้ามี) ได้ ACK ของ EOF
+
+        # สถิติ
+        self.retx = 0
+        self.start_time = time.time()
+
+    def start(self):
+        if self.n == 0:
+            self._finish_data()
+        else:
+            self._pump()
+
+    def _pump(self):
+        # ส่ง packet ใหม่เมื่อหน้าต่างยังไม่เต็ม
+        self.pace_deadline = None
+        if self.pacer is not None:
+            self.pacer.update(self.window, self.rtt.srtt or self.rtt.rto, HEADER_SIZE + self.source.chunk_size)
+        while self.next_seq < self.base + self.window and self.next_seq < self.n:
+            seq = self.next_seq
+            raw = self.cache.get(seq, self.source.encoded)
+            if self.pacer is not None:
+                wait = self.pacer.take(len(raw))
+                if wait > 0:
+                    # token ไม่พอ → ให้ timer ปลุกกลับมาส่งส่วนที่เหลือของหน้าต่าง
+                    self.pace_deadline = time.time() + wait
+                    break
+            if self.mux.send(raw, self.client, seq) and self.pacer is not None:
+                self.mux.flush()   # ออกตามจังหวะ token จริง ไม่ไปรวม batch กับ packet อื่นตอนจบรอบ
+                self.pacer.sent(len(raw))
+            self.sent_at[seq] = time.time()
+            self.deadlines[seq] = self.sent_at[seq] + self.rtt.rto
+            logging.info(f"Send DATA #{seq} (window {self.base}..{self.base+self.window-1})")
+            self.next_seq += 1
+
+    def on_packet(self, pkt):
+        if pkt.type != PacketType.ACK:
+            return
+        if self.eof_raw is not None:
+            if pkt.seq_num == self.n:
+                logging.info(f"EOF ACKed by {self.client}.")
+                self.done = True
+                self.ok = True
+            return
+
+        ackno = pkt.seq_num  # ACK แยกรายตัว (ไม่ใช่ cumulative)
+        if not (self.base <= ackno < self.next_seq) or ackno in self.acked:
+            return
+        self.acked.add(ackno)
+        self.deadlines.pop(ackno, None)
+        self.retries.pop(ackno, None)
+        first_sent = self.sent_at.pop(ackno, None)
+        if first_sent is not None:
+            self.rtt.sample(time.time() - first_sent)
+        else:
+            self.rtt.reset_backoff()
+        self.cache.discard(ackno)
+        logging.info(f"ACK #{ackno}")
+
+        # เลื่อน base ข้ามทุกตัวที่ ACK ต่อเนื่องกันแล้ว
+        while self.base in self.acked:
+            self.acked.discard(self.base)
+            self.base += 1
+        if self.base >= self.n:
+            self._finish_data()
+        else:
+            self._pump()
+
+    def next_deadline(self):
+        if self.eof_raw is not None:
+            return self.eof_deadline
+        deadline = min(self.deadlines.values()) if self.deadlines else None
+        if self.pace_deadline is not None and (deadline is None or self.pace_deadline < deadline):
+            return self.pace_deadline
+        return deadline
+
+    def on_timer(self, now):
+        if self.eof_raw is not None:
+            self.rtt.on_timeout()
+            logging.info(f"EOF timeout, retry {self.eof_attempts}/{MAX_RETRIES}")
+            self._send_eof()
+            return
+
+        # ส่งซ้ำเฉพาะ packet ที่ timer หมดเวลา
+        expired = [s for s, t in self.deadlines.items() if t <= now]
+        if expired:
+            if max(self.retries.get(s, 0) for s in expired) >= MAX_RETRIES:
+                logging.info(f"Too many retries, aborting transfer to {self.client}")
+                self.deadlines.clear()
+                self.pace_deadline = None
+                self.done = True
+                return
+            self.rtt.on_timeout()  # backoff ครั้งเดียวต่อรอบที่มี timer หมดเวลา
+        for s in expired:
+            logging.info(f"Timeout #{s} -> retransmit (rto={self.rtt.rto:.3f}s)")
+            self._transmit(s)
+            self.sent_at.pop(s, None)
+            self.deadlines[s] = now + self.rtt.rto
+            self.retries[s] = self.retries.get(s, 0) + 1
+            self.retx += 1
+        if self.pace_deadline is not None and now >= self.pace_deadline:
+            self._pump()   # ถึงเวลาส่งตาม pacing
+
+    def _transmit(self, seq):
+        raw = self.cache.get(seq, self.source.encoded)
+        self.mux.send(raw, self.client, seq)
+
+    def _finish_data(self):
+        self.deadlines.clear()
+        self.pace_deadline = None
+
+        # สรุปสถิติ
+        duration = time.time() - self.start_time
+        kbps = (self.source.size / duration) / 1024 if duration > 0 else 0
+        logging.info(f"All data packets ACKed by {self.client}.")
+        logging.info(f"Retransmissions: {self.retx}")
+        logging.info(f"RTT: {self.rtt.summary()}")
+        if self.pacer is not None:
+            logging.info(f"Pacing: {self.pacer.summary()}")
+        logging.info(f"Wire cache: hits={self.cache.hits}, misses={self.cache.misses}, evictions={self.cache.evictions}")
+        if self.server.files:
+            logging.info(f"File cache: {self.server.files.summary()}")
+        logging.info(f"Throughput: {kbps:.2f} KB/s")
+        if self.source.compress:
+            eff = (self.source.raw_size / duration) / 1024 if duration > 0 else 0
+            logging.info(f"Compression {self.source.summary()}, effective throughput {eff:.2f} KB/s")
+
+        # ส่ง EOF (seq = จำนวนแพ็กเก็ตข้อมูล) แบบ Stop-and-Wait ให้แน่ใจว่าอีกฝั่งได้รับแน่นอน
+        self.eof_raw = create_eof_packet(self.n, self.source.eof_hash()).to_bytes()
+        self._send_eof()
+
+    def _send_eof(self):
+        if self.eof_attempts >= MAX_RETRIES:
+            logging.info("EOF failed after retries.")
+            self.done = True
+            return
+        self.eof_attempts += 1
+        self.mux.send(self.eof_raw, self.client, self.n)
+        self.eof_deadline = time.time() + self.rtt.rto
+
+    def close(self):
+        self.source.close()
+
+class SRServer:
+    def __init__(self, port, loss_rate=0.0, corrupt_rate=0.0, window=WINDOW_SIZE, cache_mb=CACHE_BYTES >> 20,
+                 pace=None):
+        self.port = port
+        self.sock = None
+        self.sim = ErrorSim(loss_rate, corrupt_rate)
+        self.window = window
+        self.pace = pace   # None = ไม่ pace, 'auto' = ตาม window/RTT, หรือ byte/s
+
+        # cache ไฟล์ที่เปิดไว้และ packet ที่ encode แล้ว ใช้ร่วมกันทุก session (cache_mb=0 → ปิด)
+        self.files = FileCache(cache_mb << 20) if cache_mb > 0 else None
+
+        # session ของแต่ละ client (หลาย client ส่งพร้อมกันได้)
+        self.mux = None
+
+    def start(self):
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind(('', self.port))
+            print(f"[server] Listening on UDP port {self.port} (loss={self.sim.loss_rate:.0%}, corrupt={self.sim.corrupt_rate:.0%})")
+            self.serve(self.sock)
+        finally:
+            if self.sock:
+                self.sock.close()
+
+    def serve(self, sock):
+        # รอ REQUEST จาก client บน socket ที่ bind แล้ว (timeout 60 วินาทีเมื่อไม่มี client ค้างอยู่)
+        # คืนค่าสถิติของ mux (ใช้รวมผลในโหมด --workers)
+        self.mux = SessionMux(sock, self.sim, self.open_session)
+        try:
+            self.mux.run()
+            print("[server] No client request for 60 seconds, shutting down...")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.mux.close()
+        return self.mux.stats()
+
+    def open_session(self, mux, client, pkt):
+        # สร้าง session ใหม่เมื่อได้ REQUEST จาก client ที่ยังไม่มี session
+        filename, options = parse_request(pkt.data)
+        payload = request_payload(options)
+        logging.info(f"Request '{filename}' from {client} (payload={payload})")
+
+        def build(source):
+            logging.info(f"Size={source.size} bytes (offset {source.offset}), packets={source.num_chunks}")
+            return SRSession(self, mux, client, source)
+        return open_request(mux, client, filename, options, payload, self.files, build)
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Selective Repeat UDP Server")
+    ap.add_argument("port", type=int)
+    ap.add_argument("--loss", type=float, default=0.0)
+    ap.add_argument("--corrupt", type=float, default=0.0)
+    ap.add_argument("--window", type=int, default=WINDOW_SIZE)
+    ap.add_argument("--cache-mb", type=int, default=CACHE_BYTES >> 20,
+                    help="shared cache of open files and encoded packets (MB, 0 = off)")
+    ap.add_argument("--pace", type=parse_rate, default=None, metavar="KBPS|auto",
+                    help="space DATA packets with a token bucket: fixed rate in KB/s or 'auto' (window/RTT)")
+    ap.add_argument("--asyncio", action="store_true", help="use the asyncio transport (aio.py)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="number of worker processes sharing the port via SO_REUSEPORT")
+    args = ap.parse_args()
+
+    if args.workers > 1:
+        import workers
+        print(f"[server] Listening on UDP port {args.port} with {args.workers} workers (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
+        if args.asyncio:
+            import asyncio
+            import aio
+            serve = lambda sock: asyncio.run(aio.serve(args.port, 'sr', args.loss, args.corrupt, sock=sock,
+                                                       window=args.window, cache_mb=args.cache_mb,
+                                                       pace=args.pace)).stats()
+        else:
+            serve = lambda sock: SRServer(args.port, args.loss, args.corrupt, args.window, args.cache_mb,
+                                          args.pace).serve(sock)
+        workers.run(args.workers, args.port, serve)
+        return
+
+    if args.asyncio:
+        import asyncio
+        import aio
+        print(f"[server] Listening on UDP port {args.port} with asyncio (loss={args.loss:.0%}, corrupt={args.corrupt:.0%})")
+        try:
+            asyncio.run(aio.serve(args.port, 'sr', args.loss, args.corrupt, window=args.window, cache_mb=args.cache_mb,
+                                  pace=args.pace))
+        except KeyboardInterrupt:
+            print("\n[SERVER-SR] Shutting down...")
+        return
+
+    srv = SRServer(args.port, args.loss, args.corrupt, args.window, args.cache_mb, args.pace)
+    try:
+        srv.start()
+    except KeyboardInterrupt:
+        print("\n[SERVER-SR] Shutting down...")
+
+if __name__ == "__main__":
+    main()
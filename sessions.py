@@ -0,0 +1,266 @@
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from proto import MAX_DATAGRAM, Packet, PacketType, create_error_packet, create_info_packet, request_range
+from batchio import BatchSender, BatchReceiver
+from compress import request_compress
+from filesource import open_source
+
+IDLE_TIMEOUT = 60.0   # ไม่มี client และไม่มี request ใหม่นานเท่านี้ → ปิด server
+POLL_INTERVAL = 0.05  # รอบตรวจ timer สูงสุดเมื่อ session ไม่มี deadline
+MIN_WAIT = 0.0001     # รอสั้นสุดต่อรอบ (ละเอียดพอให้ pacing ปลุกได้ระดับ 100 µs)
+PREPARE_WORKERS = 2   # จำนวน thread ที่เตรียม source (บีบอัดไฟล์) พร้อมกันได้ต่อ process
+PREPARE_POLL = 0.01   # ระยะที่ PreparingSession กลับมาดูว่าเตรียม source เสร็จหรือยัง
+KEEPALIVE_INTERVAL = 0.5   # ระหว่างเตรียม source ส่ง INFO ให้ client ทุกเท่านี้ (สั้นกว่า tick ส่ง REQUEST ซ้ำ 1 s ของ client)
+
+_prepare_pool = None
+
+def _pool():
+    global _prepare_pool
+    if _prepare_pool is None:
+        _prepare_pool = ThreadPoolExecutor(PREPARE_WORKERS, thread_name_prefix='prepare')
+    return _prepare_pool
+
+class PreparingSession:
+    # ห่อ session ที่ source ต้องเตรียมนานก่อนส่ง (CompressedSource บีบทั้งไฟล์) ให้ใช้กับ SessionMux/aio ได้
+    # source.prepare() ทำใน thread แยก (zlib/lzma ปล่อย GIL) → mux ยังส่ง/รับของ session อื่นต่อได้
+    # ระหว่างรอ REQUEST ซ้ำจาก client ถูกทิ้ง เสร็จแล้วสร้าง session จริงด้วย build() และส่งต่อทุกอย่างให้
+    # ไฟล์ใหญ่อาจบีบนานกว่า timeout ของ client → ส่ง INFO (preparing=1) เป็น keepalive ทุก KEEPALIVE_INTERVAL
+    # ให้ client รู้ว่า server ยังทำงานอยู่และรีเซ็ตตัวนับความเงียบ
+    def __init__(self, mux, client, source, build, keepalive=KEEPALIVE_INTERVAL):
+        self.mux = mux
+        self.client = client
+        self.source = source
+        self.build = build       # build(source) -> session ที่ใช้ source ที่เตรียมเสร็จแล้ว
+        self.keepalive = keepalive
+        self.session = None
+        self.future = None
+        self.deadline = None
+        self.next_keepalive = None
+        self.failed = False
+        self.keepalives = 0      # สถิติ: จำนวน INFO keepalive ที่ส่ง
+
+    @property
+    def done(self):
+        return self.session.done if self.session is not None else self.failed
+
+    @property
+    def ok(self):
+        return self.session is not None and self.session.ok
+
+    def start(self):
+        self.future = _pool().submit(self.source.prepare)
+        now = time.time()
+        self.deadline = now + PREPARE_POLL
+        self._send_keepalive(now)
+
+    def on_packet(self, pkt):
+        if self.session is not None:
+            self.session.on_packet(pkt)
+
+    def next_deadline(self):
+        if self.session is not None:
+            return self.session.next_deadline()
+        return self.deadline
+
+    def on_timer(self, now):
+        if self.session is not None:
+            self.session.on_timer(now)
+            return
+        if not self.future.done():
+            if now >= self.next_keepalive:
+                self._send_keepalive(now)
+            self.deadline = now + PREPARE_POLL
+            return
+        try:
+            self.future.result()
+        except (OSError, ValueError) as e:
+            self.mux.send_error(self.client, f"Cannot prepare {self.source.filename}: {e}")
+            self.failed = True
+            return
+        self.session = self.build(self.source)
+        self.session.start()
+
+    def _send_keepalive(self, now):
+        self.mux.send(create_info_packet(preparing=1).to_bytes(), self.client)
+        self.keepalives += 1
+        self.next_keepalive = now + self.keepalive
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        elif self.future is not None and not self.future.cancel():
+            # ยังบีบอยู่ใน thread → ปิด source (ไฟล์ชั่วคราว) เมื่อบีบเสร็จ
+            self.future.add_done_callback(lambda _: self.source.close())
+        else:
+            self.source.close()
+
+def open_request(mux, client, filename, options, chunk_size, cache, build, log=logging.info):
+    # ส่วนที่ทุก server ใช้ร่วมกันเมื่อได้ REQUEST จาก client ใหม่: ตรวจไฟล์, ตอบ stat, เปิด source
+    # แล้วสร้าง session ด้วย build(source) คืน session หรือ None (ตอบ INFO/ERROR ไปแล้ว ไม่ต้องเปิด session)
+    # ERROR แจ้งเฉพาะ client รายนั้น — exception จากไฟล์ของ client หนึ่งต้องไม่หลุดไปปิด mux ทั้งตัว
+    if not os.path.exists(filename):
+        return _refuse(mux, client, f"File not found: {filename}", log)
+    try:
+        if 'stat' in options:
+            # ขอแค่ขนาด/mtime ของไฟล์ (ก่อนแบ่งช่วงให้หลาย stream หรือก่อนรับต่อ) → ตอบ INFO อย่างเดียว
+            # ส่งตรงไม่ผ่าน error simulator เหมือนคำตอบ PROBE
+            st = os.stat(filename)
+            mux.send_direct(create_info_packet(size=st.st_size, mtime=st.st_mtime_ns).to_bytes(), client)
+            return None
+        source = open_source(filename, chunk_size, request_compress(options), request_range(options), cache)
+    except ValueError as e:
+        return _refuse(mux, client, str(e), log)
+    except OSError as e:
+        # เช่นเป็น directory หรืออ่านไม่ได้
+        return _refuse(mux, client, f"Cannot open {filename}: {e.strerror}", log)
+    if not source.ready:
+        # บีบอัด → เตรียม stream ใน thread แยกก่อนเริ่มส่ง (ไม่ขวาง session อื่นใน mux)
+        return PreparingSession(mux, client, source, build)
+    return build(source)
+
+def _refuse(mux, client, msg, log):
+    mux.send_error(client, msg)
+    log(f"Send ERROR: {msg}")
+    return None
+
+class SessionMux:
+    # ให้บริการหลาย client พร้อมกันบน socket เดียว
+    # แยก datagram ตาม address ของ client ไปยัง session ของ client นั้น และเรียก timer ของทุก session
+    # session ต้องมี: start(), on_packet(pkt), on_timer(now), next_deadline(), close() และ done
+    # (source ที่ต้องเตรียมนานให้ห่อด้วย PreparingSession ไม่งั้นจะขวางทุก session ใน loop นี้)
+    # batch=True: รับ datagram ที่ค้างอยู่ทั้งหมดในรอบเดียว และเก็บ packet ที่ส่งไว้ส่งรวดเดียวตอน flush()
+    # (buffer ที่ส่งผ่าน send() จึงต้องไม่ถูกแก้จนจบรอบนั้น)
+    def __init__(self, sock, sim, factory, idle_timeout=IDLE_TIMEOUT, batch=True):
+        self.sock = sock
+        self.sim = sim
+        self.factory = factory   # factory(mux, client, request_pkt) -> session หรือ None
+        self.idle_timeout = idle_timeout
+        self.sessions = {}       # client address -> session
+
+        # buffer รับและ packet ที่ใช้ซ้ำ (zero-copy)
+        # รับได้ถึง MAX_DATAGRAM เพราะ PROBE ของ client อาจใหญ่เท่าขนาด payload สูงสุด
+        self._rx_buf = bytearray(MAX_DATAGRAM)
+        self._rx_view = memoryview(self._rx_buf)
+        self._rx_pkt = Packet(PacketType.ACK, 0)
+        self._tx_queue = [] if batch else None
+        self._tx_batch = BatchSender(sock) if batch else None
+        self._rx_batch = BatchReceiver(sock, size=MAX_DATAGRAM) if batch else None
+
+        # สถิติ
+        self.completed = 0
+        self.succeeded = 0
+        self.max_concurrent = 0
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.first_request = None   # เวลาที่ได้ REQUEST แรก
+        self.last_done = None       # เวลาที่ session ล่าสุดจบ
+
+    def send(self, raw, client, seq=None):
+        # ส่งผ่าน error simulator (คืน False ถ้า packet ถูก drop)
+        simd = self.sim.process(raw, seq)
+        if simd is None:
+            return False
+        if self._tx_queue is not None:
+            self._tx_queue.append((simd, client))
+        else:
+            self.sock.sendto(simd, client)
+        self.sent_packets += 1
+        self.sent_bytes += len(simd)
+        return True
+
+    def send_direct(self, raw, client):
+        # ส่งทันทีโดยไม่ผ่าน error simulator (คำตอบควบคุมนอก session เช่น INFO ของ stat, ERROR)
+        self.sock.sendto(raw, client)
+
+    def send_error(self, client, msg):
+        self.send_direct(create_error_packet(msg).to_bytes(), client)
+
+    def flush(self):
+        # ส่ง packet ที่ค้างในคิวทั้งหมด (batch mode)
+        if self._tx_queue:
+            self._tx_batch.send(self._tx_queue)
+            self._tx_queue.clear()
+
+    def run(self):
+        # คืนค่าเมื่อไม่มี session และไม่มี request ใหม่ภายใน idle_timeout
+        while True:
+            self.sock.settimeout(self._wait_time())
+            try:
+                nbytes, addr = self.sock.recvfrom_into(self._rx_buf)
+                self._dispatch(self._rx_view, nbytes, addr)
+                if self._rx_batch is not None:
+                    for view, nbytes, addr in self._rx_batch.drain():
+                        self._dispatch(view, nbytes, addr)
+            except socket.timeout:
+                if not self.sessions:
+                    return
+            self._run_timers()
+            self.flush()
+
+    def _wait_time(self):
+        if not self.sessions:
+            return self.idle_timeout
+        deadlines = [d for d in (s.next_deadline() for s in self.sessions.values()) if d is not None]
+        if not deadlines:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(MIN_WAIT, min(deadlines) - time.time()))
+
+    def _dispatch(self, view, nbytes, addr):
+        pkt = self._rx_pkt
+        if not pkt.load(view, nbytes):
+            return
+        if pkt.type == PacketType.PROBE:
+            # ตอบ PROBE ทันที (ไม่ผ่าน error simulator) ให้ client รู้ว่า datagram ขนาดนี้ผ่านได้
+            self.sock.sendto(Packet(PacketType.PROBE, pkt.seq_num).to_bytes(), addr)
+            return
+        session = self.sessions.get(addr)
+        if session is not None:
+            session.on_packet(pkt)
+        elif pkt.type == PacketType.REQUEST:
+            session = self.factory(self, addr, pkt)
+            if session is not None:
+                self.sessions[addr] = session
+                self.max_concurrent = max(self.max_concurrent, len(self.sessions))
+                if self.first_request is None:
+                    self.first_request = time.time()
+                session.start()
+        self._reap(addr)
+
+    def _run_timers(self):
+        now = time.time()
+        for addr, session in list(self.sessions.items()):
+            deadline = session.next_deadline()
+            if deadline is not None and deadline <= now:
+                session.on_timer(now)
+            self._reap(addr)
+
+    def _reap(self, addr):
+        session = self.sessions.get(addr)
+        if session is not None and session.done:
+            session.close()
+            del self.sessions[addr]
+            self.completed += 1
+            self.succeeded += session.ok
+            self.last_done = time.time()
+
+    def stats(self):
+        # สถิติรวมของ mux นี้ (ใช้รวมผลข้าม worker ใน workers.py)
+        return {
+            'sessions': self.completed,
+            'succeeded': self.succeeded,
+            'max_concurrent': self.max_concurrent,
+            'sent_packets': self.sent_packets,
+            'sent_bytes': self.sent_bytes,
+            'dropped': self.sim.dropped_packets,
+            'corrupted': self.sim.corrupted_packets,
+            'first_request': self.first_request,
+            'last_done': self.last_done,
+        }
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# โมดูลของโปรเจกต์อยู่ที่ root (ไม่ใช่ package) → เพิ่ม root เข้า sys.path ครั้งเดียวให้ทุก test
+#   python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
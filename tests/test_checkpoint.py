@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+import aio
+from checkpoint import PART_SUFFIX, Checkpoint
+from client_gbn import GBNClient, fetch_parallel
+from filehash import HASH_SIZE, hash_prefix, split_eof
+from filesource import FileSource
+
+# การรวมช่วงและหาช่องว่างของ checkpoint (fetch_parallel ใช้ตัดสินว่าต้องขอช่วงไหนซ้ำตอนรับต่อ)
+
+def checkpoint(*ranges):
+    ckpt = Checkpoint('unused.part', 'file')
+    for start, end in ranges:
+        ckpt.add(start, end)
+    return ckpt
+
+class CheckpointRangesTest(unittest.TestCase):
+    # ช่วงที่ add ตามลำดับนี้ -> (ranges, offset)
+    ADD_CASES = [
+        ([], [], 0),
+        ([(0, 10)], [[0, 10]], 10),
+        ([(5, 10)], [[5, 10]], 0),                              # ยังไม่มีต้นไฟล์ → รับต่อจาก 0
+        ([(0, 10), (10, 20)], [[0, 20]], 20),                   # ติดกัน
+        ([(0, 10), (5, 15)], [[0, 15]], 15),                    # ซ้อนกัน
+        ([(0, 20), (5, 10)], [[0, 20]], 20),                    # อยู่ในช่วงเดิมทั้งหมด
+        ([(20, 30), (0, 10)], [[0, 10], [20, 30]], 10),         # มาไม่เรียงลำดับ
+        ([(20, 30), (0, 10), (10, 20)], [[0, 30]], 30),         # เติมช่องว่างพอดี
+        ([(30, 40), (10, 20), (0, 5), (15, 35)], [[0, 5], [10, 40]], 5),
+        ([(0, 10), (10, 10), (12, 11)], [[0, 10]], 10),         # ช่วงว่าง/กลับด้านถูกข้าม
+    ]
+
+    def test_add(self):
+        for adds, ranges, offset in self.ADD_CASES:
+            with self.subTest(adds=adds):
+                ckpt = checkpoint(*adds)
+                self.assertEqual(ckpt.ranges, ranges)
+                self.assertEqual(ckpt.offset, offset)
+
+    # (ranges ที่มี, start, end) -> ช่องว่างใน [start, end)
+    MISSING_CASES = [
+        ([], 0, 100, [(0, 100)]),
+        ([(0, 100)], 0, 100, []),
+        ([(0, 40)], 0, 100, [(40, 100)]),
+        ([(60, 100)], 0, 100, [(0, 60)]),
+        ([(10, 20), (30, 40)], 0, 50, [(0, 10), (20, 30), (40, 50)]),
+        ([(10, 20), (30, 40)], 15, 35, [(20, 30)]),             # ช่วงที่ถามเริ่ม/จบกลางช่วงที่มี
+        ([(10, 20), (30, 40)], 20, 30, [(20, 30)]),
+        ([(10, 20), (30, 40)], 40, 60, [(40, 60)]),             # ช่วงที่มีอยู่ก่อน start ทั้งหมด
+        ([(50, 60)], 0, 30, [(0, 30)]),                         # ช่วงที่มีอยู่หลัง end ทั้งหมด
+        ([(0, 10)], 20, 20, []),
+    ]
+
+    def test_missing(self):
+        for have, start, end, gaps in self.MISSING_CASES:
+            with self.subTest(have=have, start=start, end=end):
+                self.assertEqual(checkpoint(*have).missing(start, end), gaps)
+
+    def test_missing_plus_ranges_cover_everything(self):
+        ckpt = checkpoint((3, 7), (12, 18), (25, 26))
+        for start, end in ckpt.missing(0, 30):
+            ckpt.add(start, end)
+        self.assertEqual(ckpt.ranges, [[0, 30]])
+        self.assertEqual(ckpt.missing(0, 30), [])
+
+class CheckpointFileTest(unittest.TestCase):
+    def test_save_load_clips_to_part_size(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            part = os.path.join(tmp, 'out.part')
+            with open(part, 'wb') as f:
+                f.write(b'x' * 25)
+            ckpt = Checkpoint(part, 'file', size=100, mtime=7)
+            ckpt.add(0, 10)
+            ckpt.add(20, 40)   # เขียนลงดิสก์ได้แค่ถึง byte 25
+            ckpt.add(50, 60)
+            ckpt.save()
+            loaded = Checkpoint.load(part, 'file')
+            self.assertEqual(loaded.ranges, [[0, 10], [20, 25]])
+            self.assertEqual((loaded.size, loaded.mtime), (100, 7))
+            self.assertEqual(Checkpoint.load(part, 'other').ranges, [])
+            loaded.remove()
+            self.assertEqual(Checkpoint.load(part, 'file').ranges, [])
+
+MEDIUM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'medium.txt')
+
+def blake2b(data):
+    return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+
+class EofHashTest(unittest.TestCase):
+    def setUp(self):
+        with open(MEDIUM, 'rb') as f:
+            self.data = f.read()
+
+    def test_range_eof_carries_whole_file_hash(self):
+        with FileSource(MEDIUM, 1000, start=5000) as src:
+            sent, full = split_eof(src.eof_hash())
+        self.assertEqual(sent, blake2b(self.data[5000:]))
+        self.assertEqual(full, blake2b(self.data))
+
+    def test_whole_file_eof_has_one_hash(self):
+        with FileSource(MEDIUM, 1000) as src:
+            self.assertEqual(split_eof(src.eof_hash()), (blake2b(self.data), None))
+
+    def test_hash_prefix(self):
+        with open(MEDIUM, 'rb') as f:
+            self.assertEqual(hash_prefix(f, 12345).digest(), blake2b(self.data[:12345]))
+            self.assertEqual(f.tell(), 12345)
+            self.assertEqual(hash_prefix(f, len(self.data) + 10).digest(), blake2b(self.data))
+
+class ResumeVerifyTest(unittest.TestCase):
+    # รับต่อจาก .part ที่มีอยู่แล้ว: ส่วนเดิมที่เสียต้องถูกจับได้ด้วย hash ของทั้งไฟล์ ก่อนเปลี่ยนชื่อ
+    KEEP = 40000
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.save_as = os.path.join(self.tmp.name, 'out')
+        self.part = self.save_as + PART_SUFFIX
+        with open(MEDIUM, 'rb') as f:
+            self.data = f.read()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.server = threading.Thread(target=lambda: asyncio.run(
+            aio.serve(0, 'gbn', sock=self.sock, idle_timeout=1.5)))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.join(10)
+        self.sock.close()
+        self.tmp.cleanup()
+
+    def keep_part(self, prefix, ranges, size=None):
+        with open(self.part, 'wb') as f:
+            f.write(prefix)
+            if size is not None:
+                f.truncate(size)
+        st = os.stat(MEDIUM)
+        ckpt = Checkpoint(self.part, MEDIUM, size=st.st_size, mtime=st.st_mtime_ns)
+        for start, end in ranges:
+            ckpt.add(start, end)
+        ckpt.save()
+
+    def fetch(self):
+        return GBNClient('127.0.0.1', self.port).request(MEDIUM, self.save_as)
+
+    def test_resume_intact_prefix(self):
+        self.keep_part(self.data[:self.KEEP], [(0, self.KEEP)])
+        self.assertEqual(self.fetch(), 0)
+        with open(self.save_as, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_resume_rejects_damaged_prefix(self):
+        damaged = bytearray(self.data[:self.KEEP])
+        damaged[100] ^= 0xff
+        self.keep_part(bytes(damaged), [(0, self.KEEP)])
+        self.assertEqual(self.fetch(), 1)
+        self.assertFalse(os.path.exists(self.save_as))
+        self.assertFalse(os.path.exists(self.part))
+
+    def test_parallel_rejects_damaged_range(self):
+        # ทุกช่วงอยู่ใน checkpoint แล้ว → ขอช่วงสุดท้ายซ้ำเพื่อเอา hash ของทั้งไฟล์มาตรวจ
+        damaged = bytearray(self.data)
+        damaged[100] ^= 0xff
+        self.keep_part(bytes(damaged), [(0, len(self.data))])
+        self.assertEqual(fetch_parallel('127.0.0.1', self.port, MEDIUM, self.save_as, 2), 1)
+        self.assertFalse(os.path.exists(self.save_as))
+        self.assertFalse(os.path.exists(self.part))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import random
+import unittest
+
+import checksum
+
+# engine ที่เร็วกว่าต้องให้ผลรวม word ตรงกับ sum16_python (reference) ทุก bit
+
+EDGE_CASES = [b'', b'\x00', b'\xff', b'\x01\x02', b'\xff\xff', b'\xff' * 3, b'\xff' * 1400, b'\x00' * 8]
+
+class Sum16EngineTest(unittest.TestCase):
+    def setUp(self):
+        self.rnd = random.Random(1071)
+        self.engines = {name: checksum.ENGINES[name] for name in checksum.available_engines()}
+
+    def check(self, data):
+        want = checksum.sum16_python(data)
+        for name, fn in self.engines.items():
+            for buf in (data, bytearray(data), memoryview(data)):
+                self.assertEqual(fn(buf), want, f"{name} on {len(data)} bytes ({type(buf).__name__})")
+
+    def test_edge_cases(self):
+        for data in EDGE_CASES:
+            self.check(data)
+
+    def test_random_even_and_odd_lengths(self):
+        for n in list(range(0, 64)) + [self.rnd.randrange(64, 9000) for _ in range(200)]:
+            for length in (n, n | 1):   # ทั้งความยาวคู่และคี่ (byte สุดท้ายเดี่ยวถูก pad ด้วย 0)
+                self.check(self.rnd.randbytes(length))
+
+    def test_unaligned_views(self):
+        # chunk จาก mmap/memoryview ที่เริ่มกลาง buffer (offset คี่)
+        data = self.rnd.randbytes(4097)
+        for start in (1, 3, 1023):
+            want = checksum.sum16_python(data[start:])
+            for name, fn in self.engines.items():
+                self.assertEqual(fn(memoryview(data)[start:]), want, f"{name} at offset {start}")
+
+    def test_numpy_present_when_installed(self):
+        if checksum.np is None:
+            self.skipTest("numpy not installed")
+        self.assertIn('numpy', self.engines)
+
+    def test_selected_engine_matches_reference(self):
+        data = self.rnd.randbytes(1401)
+        self.assertEqual(checksum.internet_checksum(data), ~checksum.sum16_python(data) & 0xFFFF)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from client_gbn import GBNClient
+from filehash import new_hash
+from proto import Packet, PacketType, create_eof_packet, parse_ack_sack
+
+# delayed ACK ของ client_gbn: ACK รวบทุก ack_every packet ที่มาเรียงลำดับ, packet ที่ค้างอยู่ได้ ACK เมื่อครบ ack_delay
+# แต่ช่องว่าง (out-of-order) และการเติมช่องว่างต้อง ACK ทันที ให้ server รู้เร็วที่สุด
+
+ACK_EVERY = 4
+ACK_DELAY = 0.2
+
+class DelayedAckTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(2.0)
+        self.sent = {}
+        self.result = []
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp.cleanup()
+
+    def send(self, seq):
+        self.sent[seq] = bytes([seq]) * 100
+        self.server.sendto(Packet(PacketType.DATA, seq, self.sent[seq]).to_bytes(), self.client_addr)
+
+    def ack(self, timeout=2.0):
+        # ACK ถัดไปจาก client → (seq, SACK blocks) หรือ None ถ้าไม่มีภายใน timeout
+        pkt = Packet(PacketType.ACK, 0)
+        self.server.settimeout(timeout)
+        try:
+            data, _ = self.server.recvfrom(2048)
+        except socket.timeout:
+            return None
+        self.assertTrue(pkt.load(memoryview(data)))
+        self.assertEqual(pkt.type, PacketType.ACK)
+        return pkt.seq_num, [tuple(b) for b in parse_ack_sack(pkt.data)]
+
+    def test_coalescing(self):
+        client = GBNClient('127.0.0.1', self.server.getsockname()[1], ack_every=ACK_EVERY, ack_delay=ACK_DELAY)
+        save_as = os.path.join(self.tmp.name, 'out')
+        thread = threading.Thread(target=lambda: self.result.append(client.request('file', save_as)))
+        thread.start()
+        try:
+            _, self.client_addr = self.server.recvfrom(2048)   # REQUEST
+
+            # 8 packet เรียงกัน → ACK แค่ #3 และ #7
+            for seq in range(8):
+                self.send(seq)
+            self.assertEqual(self.ack(), (3, []))
+            self.assertEqual(self.ack(), (7, []))
+            self.assertIsNone(self.ack(ACK_DELAY * 1.5))
+
+            # packet เดียวที่ยังไม่ครบ ack_every → ACK เมื่อครบ ack_delay
+            start = time.time()
+            self.send(8)
+            self.assertEqual(self.ack(), (8, []))
+            self.assertGreaterEqual(time.time() - start, ACK_DELAY * 0.8)
+
+            # ช่องว่าง → ACK ซ้ำพร้อม SACK ทันที, เติมช่องว่าง → ACK ทันที
+            start = time.time()
+            self.send(10)
+            self.assertEqual(self.ack(), (8, [(10, 11)]))
+            self.send(9)
+            self.assertEqual(self.ack(), (10, []))
+            self.assertLess(time.time() - start, ACK_DELAY)
+
+            digest = new_hash()
+            for seq in sorted(self.sent):
+                digest.update(self.sent[seq])
+            self.server.sendto(create_eof_packet(11, digest.digest()).to_bytes(), self.client_addr)
+            self.assertEqual(self.ack(), (11, []))
+        finally:
+            if self.result == []:
+                thread.join(1)
+                client.stop()   # test ล้มกลางทาง → ไม่ให้ client รอ DATA ค้างไว้
+            thread.join(5)
+        self.assertEqual(self.result, [0])
+        self.assertEqual(client.acks_sent, 6)
+        with open(save_as, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(self.sent[seq] for seq in sorted(self.sent)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import unittest
+
+from filesource import FileSource
+from proto import Packet, PacketType, ack_payload
+from server_gbn import DUP_ACK_THRESHOLD, GBNServer, GBNSession
+
+# server_gbn: ACK ซ้ำของ base-1 ครบ DUP_ACK_THRESHOLD ตัว → ส่งซ้ำทันทีครั้งเดียว (ไม่รอ RTO)
+# GBN แท้ถอยไปส่งตั้งแต่ base, มี SACK ส่งเฉพาะช่องว่าง และ ACK ซ้ำที่ตามมาไม่ทำให้ส่งซ้ำอีก
+
+MEDIUM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'medium.txt')
+CLIENT = ('127.0.0.1', 1)
+WINDOW = 8
+
+class RecordingMux:
+    def __init__(self):
+        self.data = []   # seq ของ DATA ที่ส่ง ตามลำดับ
+
+    def send(self, raw, client, seq=None):
+        if seq is not None:
+            self.data.append(seq)
+        return True
+
+    def flush(self):
+        pass
+
+class FastRetransmitTest(unittest.TestCase):
+    def setUp(self):
+        self.source = FileSource(MEDIUM, 1000)
+        self.mux = RecordingMux()
+
+    def tearDown(self):
+        self.source.close()
+
+    def session(self, fec=None):
+        s = GBNSession(GBNServer(0, window=WINDOW, cache_mb=0), self.mux, CLIENT, self.source, fec)
+        s.start()
+        self.assertEqual(self.mux.data, list(range(WINDOW)))
+        self.mux.data.clear()
+        return s
+
+    def ack(self, s, seq, sack=()):
+        s.on_packet(Packet(PacketType.ACK, seq, ack_payload(64, sack)))
+
+    def test_go_back_after_three_duplicates(self):
+        s = self.session()
+        self.ack(s, 0)                                  # #1 หาย, #2.. ตามมา
+        self.assertEqual(self.mux.data, [WINDOW])       # หน้าต่างเลื่อน 1
+        self.mux.data.clear()
+        for _ in range(DUP_ACK_THRESHOLD - 1):
+            self.ack(s, 0)
+        self.assertEqual((self.mux.data, s.fast_retx), ([], 0))
+        self.ack(s, 0)
+        self.assertEqual(s.fast_retx, 1)
+        self.assertEqual(self.mux.data, list(range(1, 1 + WINDOW)))   # ถอยไปส่งตั้งแต่ base
+        self.mux.data.clear()
+        for _ in range(2 * DUP_ACK_THRESHOLD):           # ACK ซ้ำจาก packet เก่าในเส้นทาง
+            self.ack(s, 0)
+        self.assertEqual((self.mux.data, s.fast_retx), ([], 1))
+
+    def test_sack_resends_only_holes(self):
+        s = self.session()
+        self.ack(s, 0)
+        self.mux.data.clear()
+        for i in range(DUP_ACK_THRESHOLD):
+            self.ack(s, 0, [(2, 4 + i)])                # #1 หาย, SACK โตขึ้นทีละตัว
+        self.assertEqual((s.fast_retx, s.sack_retx), (1, 1))
+        self.assertEqual(self.mux.data, [1])
+        self.mux.data.clear()
+        self.ack(s, 0, [(2, 7)])
+        self.assertEqual(self.mux.data, [])              # ยังอยู่ในช่วง recovery
+        self.ack(s, 6)                                   # เติมช่องว่างแล้ว → ส่งข้อมูลใหม่ต่อ
+        self.assertEqual(s.base, 7)
+        self.assertNotIn(1, self.mux.data)
+
+    def test_fec_waits_for_parity(self):
+        # FEC K=4: packet ที่หายอาจกู้ได้เมื่อ PARITY ท้ายบล็อกถึง → ต้องได้ ACK ซ้ำเพิ่มอีก K ตัว
+        s = self.session(fec=(4, 1))
+        self.ack(s, 0)
+        self.mux.data.clear()
+        for _ in range(DUP_ACK_THRESHOLD + 3):
+            self.ack(s, 0)
+        self.assertEqual(s.fast_retx, 0)
+        self.ack(s, 0)
+        self.assertEqual(s.fast_retx, 1)
+
+if __name__ == '__main__':
+    unittest.main()
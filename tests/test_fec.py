@@ -0,0 +1,88 @@
+import random
+import unittest
+
+from fec import FecDecoder, parity_packets
+
+# XOR parity ต้องกู้ DATA ได้เฉพาะแถบที่ขาดพอดีหนึ่งตัว และนับ recovered เฉพาะตอนกู้จริง
+
+SIZE = 16
+
+class ChunkSource:
+    # แทน FileSource: chunk ทั้งหมดอยู่ในหน่วยความจำ
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.num_chunks = len(chunks)
+        self.chunk_size = SIZE
+
+    def chunk(self, seq):
+        return self.chunks[seq]
+
+class FecDecoderTest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(16)
+        # ตัวสุดท้ายสั้นกว่าขนาดเต็ม (ท้ายไฟล์) ต้องกู้ได้ความยาวเดิม
+        self.chunks = [rnd.randbytes(SIZE) for _ in range(7)] + [rnd.randbytes(5)]
+        self.source = ChunkSource(self.chunks)
+
+    def feed(self, k, m, lost):
+        # ส่งทุกบล็อกยกเว้น seq ใน lost คืน (decoder, {seq: data ที่กู้ได้})
+        dec = FecDecoder(k, m, SIZE)
+        got = {}
+        for block in range((len(self.chunks) + k - 1) // k):
+            data = [(s, self.chunks[s]) for s in range(block * k, min(len(self.chunks), block * k + k))
+                    if s not in lost]
+            parity = parity_packets(self.source, block, k, m)
+            steps = [('d', d) for d in data] + [('p', p) for p in parity]   # PARITY ตามหลัง DATA ของบล็อก
+            for kind, (seq, payload) in steps:
+                res = dec.add_parity(seq, payload) if kind == 'p' else dec.add_data(seq, payload)
+                if res:
+                    got[res[0]] = res[1]
+        return dec, got
+
+    def test_one_lost_packet_recovered(self):
+        for lost in (0, 2, 7):
+            with self.subTest(lost=lost):
+                dec, got = self.feed(4, 1, {lost})
+                self.assertEqual(got, {lost: self.chunks[lost]})
+                self.assertEqual(dec.recovered, 1)
+
+    def test_one_lost_per_stripe(self):
+        # M=2: แถบ j เก็บ seq ที่ i % 2 == j → หายแถบละตัวกู้ได้ทั้งคู่
+        dec, got = self.feed(4, 2, {1, 2})
+        self.assertEqual(got, {1: self.chunks[1], 2: self.chunks[2]})
+        self.assertEqual(dec.recovered, 2)
+
+    def test_two_lost_packets_not_recovered(self):
+        dec, got = self.feed(4, 1, {0, 3})
+        self.assertEqual(got, {})
+        self.assertEqual(dec.recovered, 0)
+
+    def test_parity_after_all_data(self):
+        dec, got = self.feed(4, 1, set())
+        self.assertEqual(got, {})
+        self.assertEqual(dec.recovered, 0)
+        self.assertEqual(dec.stripes, {})
+
+    def test_late_parity_for_complete_stripe(self):
+        # แถบละหนึ่งตัว (K = M): PARITY ที่มาซ้ำหลังแถบครบแล้วต้องไม่ถูกนับว่ากู้ได้
+        dec, got = self.feed(4, 4, set())
+        for seq, payload in parity_packets(self.source, 0, 4, 4):
+            self.assertIsNone(dec.add_parity(seq, payload))
+        self.assertEqual(got, {})
+        self.assertEqual(dec.recovered, 0)
+
+    def test_late_parity_after_recovery(self):
+        dec, got = self.feed(4, 1, {5})
+        self.assertEqual(dec.recovered, 1)
+        for seq, payload in parity_packets(self.source, 1, 4, 1):
+            self.assertIsNone(dec.add_parity(seq, payload))
+        self.assertEqual(dec.recovered, 1)
+
+    def test_advance_drops_old_blocks(self):
+        dec, _ = self.feed(4, 1, {0, 1})
+        dec.advance(4)
+        self.assertEqual([key for key in dec.stripes if key[0] < 1], [])
+        self.assertEqual([key for key in dec.closed if key[0] < 1], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+import unittest
+
+from filesource import FileCache, FileSource
+from proto import Packet, PacketType
+
+# packet ใน FileCache ใช้ร่วมกันทุก session: key ต้องแยกขนาด payload/ช่วง byte และรุ่นของไฟล์
+# ไม่งั้น session หนึ่งจะได้ DATA ที่ encode ไว้ให้อีก session (ข้อมูลผิดแต่ checksum ถูก)
+
+def data_of(raw):
+    pkt = Packet(PacketType.ACK, 0)
+    assert pkt.load(memoryview(raw))
+    return pkt.seq_num, bytes(pkt.data)
+
+class FileCacheKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.data = random.Random(1023).randbytes(10000)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'file.bin')
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        self.cache = FileCache()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check(self, src, start, end):
+        # ทุก seq ต้องได้ chunk ของช่วงนี้เท่านั้น
+        for seq in range(src.num_chunks):
+            off = start + seq * src.chunk_size
+            self.assertEqual(data_of(src.encoded(seq)), (seq, self.data[off:min(off + src.chunk_size, end)]))
+
+    def test_sessions_with_different_payload_and_range(self):
+        # (chunk_size, start, end) ของแต่ละ session ที่เปิดพร้อมกันบน cache เดียว
+        shapes = [(1000, 0, 10000), (1400, 0, 10000), (1000, 0, 4500), (1000, 2000, 10000), (1000, 2500, 6000)]
+        sources = [FileSource(self.path, size, start=start, end=end, cache=self.cache)
+                   for size, start, end in shapes]
+        try:
+            self.assertEqual(self.cache.fd_misses, 1)   # ไฟล์เดียวกันเปิดครั้งเดียว
+            for _ in range(2):   # รอบสองต้องมาจาก cache และยังถูกต้อง
+                for src, (_, start, end) in zip(sources, shapes):
+                    self.check(src, start, end)
+            # chunk ที่ขนาด/ช่วงตรงกันทุกอย่าง (#0-#3 ของ 0-10000 กับ 0-4500) ใช้ packet เดียวกันได้
+            keys = {(size, start, seq, min(size, end - start - seq * size))
+                      for size, start, end in shapes for seq in range(-(-(end - start) // size))}
+            packets = sum(src.num_chunks for src in sources)
+            self.assertEqual(len(keys), packets - 4)
+            self.assertEqual(self.cache.misses, len(keys))
+            self.assertEqual(self.cache.hits, 2 * packets - len(keys))
+        finally:
+            for src in sources:
+                src.close()
+
+    def test_modified_file_changes_ident(self):
+        with FileSource(self.path, 1000, cache=self.cache) as src:
+            self.check(src, 0, len(self.data))
+            old_ident = src._handle.ident
+        # แก้เนื้อหาโดยขนาดเท่าเดิม แล้วตั้ง mtime ใหม่ให้ต่างแน่นอน (ระบบไฟล์ที่ mtime หยาบ)
+        self.data = bytes(b ^ 0xff for b in self.data)
+        with open(self.path, 'r+b') as f:
+            f.write(self.data)
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        with FileSource(self.path, 1000, cache=self.cache) as src:
+            self.assertNotEqual(src._handle.ident, old_ident)
+            self.assertEqual(self.cache.invalidations, 1)
+            self.check(src, 0, len(self.data))
+            self.assertEqual(self.cache.hits, 0)
+            self.assertEqual(self.cache.bytes, sum(len(src.encoded(seq)) for seq in range(src.num_chunks)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import pacing
+from pacing import BURST_PACKETS, BURST_TIME, PACING_GAIN, Pacer, make_pacer, parse_rate
+
+# token bucket ของ Pacer.take: หัก token เมื่อส่งได้, ไม่พอคืนเวลาที่ต้องรอพอดี, เติมตามเวลาแต่ไม่เกินความจุ
+
+PACKET = 1000
+
+class Clock:
+    # แทน time.perf_counter ให้เวลาเดินเฉพาะเมื่อสั่ง
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class PacerTakeTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(pacing, 'time', SimpleNamespace(perf_counter=self.clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def drain(self, pacer):
+        # ส่งได้ทันทีกี่ packet ก่อนต้องรอ
+        n = 0
+        while pacer.take(PACKET) == 0:
+            n += 1
+        return n
+
+    def test_burst_then_wait(self):
+        rate = 100_000   # ความจุ = BURST_PACKETS packet (มากกว่า rate * BURST_TIME)
+        p = Pacer(rate)
+        self.assertEqual(self.drain(p), BURST_PACKETS)
+        self.assertAlmostEqual(p.tokens, 0)
+        self.assertAlmostEqual(p.take(PACKET), PACKET / rate)
+        self.clock.now += 0.004                            # เติม 400 byte
+        self.assertAlmostEqual(p.take(PACKET), (PACKET - 400) / rate)
+        self.clock.now += 0.006
+        self.assertEqual(p.take(PACKET), 0)
+        self.assertAlmostEqual(p.tokens, 0)
+        self.assertEqual(p.waits, 3)
+
+    def test_refill_capped(self):
+        p = Pacer(100_000)
+        self.drain(p)
+        self.clock.now += 10.0                             # นานแค่ไหนก็เก็บได้ไม่เกินความจุ
+        self.assertEqual(self.drain(p), BURST_PACKETS)
+
+    def test_capacity_follows_rate(self):
+        rate = 10_000_000   # rate * BURST_TIME = 10 packet > BURST_PACKETS
+        self.assertEqual(self.drain(Pacer(rate)), int(rate * BURST_TIME) // PACKET)
+
+    def test_auto_rate(self):
+        p = Pacer()
+        self.assertEqual(p.take(PACKET), 0)                # ยังไม่มี RTT → ไม่ pace
+        p.update(cwnd=10, srtt=0.1, packet_size=PACKET)
+        self.assertAlmostEqual(p.rate, PACING_GAIN * 10 * PACKET / 0.1)
+        p.update(cwnd=10, srtt=0, packet_size=PACKET)      # sample ไม่ถูกต้อง → คงค่าเดิม
+        self.assertAlmostEqual(p.rate, PACING_GAIN * 10 * PACKET / 0.1)
+        fixed = Pacer(50_000)
+        fixed.update(cwnd=10, srtt=0.1, packet_size=PACKET)
+        self.assertEqual(fixed.rate, 50_000)               # rate ที่กำหนดไม่เปลี่ยนตามหน้าต่าง
+
+class ParseRateTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_rate('auto'), 'auto')
+        self.assertEqual(parse_rate('100'), 100 * 1024)
+        for bad in ('0', '-5'):
+            with self.assertRaises(ValueError):
+                parse_rate(bad)
+        self.assertIsNone(make_pacer(None))
+        self.assertIsNone(make_pacer(0))
+        self.assertIsNone(make_pacer('auto').target)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import random
+import struct
+import tempfile
+import unittest
+from array import array
+
+import checksum
+from filehash import HASH_SIZE, new_hash
+from filesource import FileSource
+from packetindex import HEADER, MAGIC, TABLE, PacketIndex, index_path, load_index
+
+# sidecar <file>.idx ต้องถอดกลับได้ตรงทุกค่า, ข้อมูลไม่ครบ/ผิดรูปต้องเป็น ValueError (server ใช้ต่อแบบไม่มี index)
+# sum16 เก็บแบบ big-endian ไม่ขึ้นกับเครื่อง และ index ที่ขนาด/mtime ไม่ตรงกับไฟล์ต้องไม่ถูกใช้
+
+SIZES = (1000, 1400)
+
+class PacketIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.data = random.Random(1024).randbytes(10001)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'file.bin')
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        self.index = PacketIndex.build(self.path, SIZES)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_build(self):
+        digest = new_hash()
+        digest.update(self.data)
+        self.assertEqual(self.index.file_hash, digest.digest())
+        for size in SIZES:
+            expected = [checksum.sum16(self.data[off:off + size]) for off in range(0, len(self.data), size)]
+            self.assertEqual(list(self.index.sums(size)), expected)
+        self.assertIsNone(self.index.sums(512))
+
+    def test_round_trip(self):
+        loaded = PacketIndex.from_bytes(self.index.to_bytes())
+        st = os.stat(self.path)
+        self.assertEqual((loaded.size, loaded.mtime_ns, loaded.file_hash),
+                         (st.st_size, st.st_mtime_ns, self.index.file_hash))
+        self.assertEqual(loaded.tables, self.index.tables)
+
+    def test_truncated(self):
+        raw = self.index.to_bytes()
+        for cut in list(range(0, HEADER.size + TABLE.size + 4)) + [len(raw) - 2, len(raw) - 1]:
+            with self.subTest(cut=cut):
+                with self.assertRaises(ValueError):
+                    PacketIndex.from_bytes(raw[:cut])
+        with self.assertRaises(ValueError):
+            PacketIndex.from_bytes(b'X' * len(raw))   # magic ไม่ตรง
+
+    def test_big_endian_on_disk(self):
+        # sum16 0x1234 ต้องเป็น bytes 12 34 เสมอ และ index ที่เขียนด้วยมือแบบ big-endian ต้องอ่านได้ค่าเดิม
+        index = PacketIndex(3, 7, b'\x00' * HASH_SIZE, {2: array('H', [0x1234, 0xabcd])})
+        raw = index.to_bytes()
+        self.assertEqual(raw[HEADER.size + TABLE.size:], b'\x12\x34\xab\xcd')
+        manual = HEADER.pack(MAGIC, 3, 7, 1, b'\x00' * HASH_SIZE) + TABLE.pack(2, 2) + struct.pack('!2H', 0x1234, 0xabcd)
+        self.assertEqual(raw, manual)
+        self.assertEqual(list(PacketIndex.from_bytes(manual).sums(2)), [0x1234, 0xabcd])
+
+    def test_stale_index_ignored(self):
+        self.index.save(index_path(self.path))
+        st = os.stat(self.path)
+        self.assertIsNotNone(load_index(self.path, st))
+        with FileSource(self.path, 1000) as src:
+            self.assertIsNotNone(src.index)
+
+        # mtime เปลี่ยน (ขนาดเท่าเดิม)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertIsNone(load_index(self.path, os.stat(self.path)))
+        with FileSource(self.path, 1000) as src:
+            self.assertIsNone(src.index)
+            self.assertIsNone(src.chunk_sum(0))
+
+        # ขนาดเปลี่ยน (ตั้ง mtime กลับเป็นค่าเดิมใน index)
+        with open(self.path, 'ab') as f:
+            f.write(b'x')
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertIsNone(load_index(self.path, os.stat(self.path)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from client_gbn import split_ranges
+from writebehind import ALIGN
+
+# split_ranges ของ fetch_parallel: ช่วงต้องต่อกันครอบ [0, size) พอดี, ไม่เกินจำนวน stream
+# และขอบทุกช่วง (ยกเว้นท้ายไฟล์) ลงตัวกับ ALIGN ให้การเขียนของแต่ละ stream ลงตัวกับ write-behind
+
+class SplitRangesTest(unittest.TestCase):
+    SIZES = [1, ALIGN - 1, ALIGN, ALIGN + 1, 3 * ALIGN, 10 * ALIGN + 5, 1000 * ALIGN - 7]
+
+    def test_cover_and_align(self):
+        for size in self.SIZES:
+            for streams in (1, 2, 3, 4, 7, 16):
+                with self.subTest(size=size, streams=streams):
+                    ranges = split_ranges(size, streams)
+                    self.assertLessEqual(len(ranges), streams)
+                    self.assertEqual(ranges[0][0], 0)
+                    self.assertEqual(ranges[-1][1], size)
+                    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                        self.assertEqual(end, start)
+                        self.assertEqual(start % ALIGN, 0)
+                    self.assertTrue(all(start < end for start, end in ranges))
+
+    def test_even_split(self):
+        self.assertEqual(split_ranges(4 * ALIGN, 4), [(i * ALIGN, (i + 1) * ALIGN) for i in range(4)])
+        # 5 ช่วงเท่าๆ กันไม่ลงตัวกับ ALIGN → ปัดขึ้นเป็น 2 ALIGN ได้แค่ 3 ช่วง (ช่วงสุดท้ายสั้นกว่า)
+        self.assertEqual(split_ranges(5 * ALIGN, 4), [(0, 2 * ALIGN), (2 * ALIGN, 4 * ALIGN), (4 * ALIGN, 5 * ALIGN)])
+        self.assertEqual(split_ranges(ALIGN // 2, 8), [(0, ALIGN // 2)])   # เล็กกว่า ALIGN → ช่วงเดียว
+
+    def test_degenerate(self):
+        self.assertEqual(split_ranges(0, 4), [])
+        self.assertEqual(split_ranges(3 * ALIGN, 0), [(0, 3 * ALIGN)])   # streams < 1 ถือเป็น 1
+
+if __name__ == '__main__':
+    unittest.main()
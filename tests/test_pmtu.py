@@ -0,0 +1,65 @@
+import socket
+import unittest
+from unittest import mock
+
+import pmtu
+from proto import MAX_PAYLOAD, MIN_PAYLOAD
+
+# binary search ของ probe_payload ต้องได้ขนาดที่ใหญ่ที่สุดที่ผ่าน (คลาดไม่เกิน step) และไม่เกินขนาดที่เส้นทางรับได้
+
+SERVER = ('127.0.0.1', 9)
+
+class ProbePayloadTest(unittest.TestCase):
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(3.0)
+        self.probes = []
+
+    def tearDown(self):
+        self.sock.close()
+
+    def search(self, limit, **kw):
+        # เส้นทางจำลอง: PROBE ที่ payload ไม่เกิน limit ผ่าน (limit=None = server ไม่ตอบเลย)
+        def probe_once(sock, server, payload):
+            self.probes.append(payload)
+            return limit is not None and payload <= limit
+        with mock.patch.object(pmtu, 'probe_once', probe_once):
+            return pmtu.probe_payload(self.sock, SERVER, **kw)
+
+    def test_finds_largest_within_step(self):
+        for limit in (MIN_PAYLOAD, MIN_PAYLOAD + 1, 1000, 1400, 1472, 8000, MAX_PAYLOAD - 1):
+            with self.subTest(limit=limit):
+                self.probes = []
+                found = self.search(limit)
+                self.assertLessEqual(found, limit)
+                self.assertLess(limit - found, pmtu.PROBE_STEP)
+                # hi, lo แล้วครึ่งช่วงไปเรื่อยๆ: ไม่เกิน log2(ช่วง/step) + 2 ครั้ง
+                steps = (MAX_PAYLOAD - MIN_PAYLOAD) // pmtu.PROBE_STEP
+                self.assertLessEqual(len(self.probes), steps.bit_length() + 2)
+
+    def test_fast_path_and_no_reply(self):
+        self.assertEqual(self.search(MAX_PAYLOAD), MAX_PAYLOAD)
+        self.assertEqual(self.probes, [MAX_PAYLOAD])   # ผ่านตั้งแต่ขนาดสูงสุด → ไม่ต้องค้นหา
+        self.probes = []
+        self.assertIsNone(self.search(None))
+        self.assertEqual(self.probes, [MAX_PAYLOAD, MIN_PAYLOAD])
+
+    def test_bounds_and_restore_timeout(self):
+        self.assertEqual(self.search(5000, lo=600, hi=1500), 1500)
+        self.assertEqual(self.search(1000, lo=600, hi=1500, step=1), 1000)   # step=1 → ได้ค่าตรงพอดี
+        self.assertEqual(self.sock.gettimeout(), 3.0)
+
+class ChoosePayloadTest(unittest.TestCase):
+    def test_fallback_when_unprobed(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            with mock.patch.object(pmtu, 'probe_once', lambda *a: False):
+                self.assertEqual(pmtu.choose_payload(sock, SERVER, 4000, probe=True), pmtu.PACKET_SIZE)
+            with mock.patch.object(pmtu, 'probe_once', lambda s, srv, payload: payload <= 2000):
+                self.assertEqual(pmtu.choose_payload(sock, SERVER, 1200, probe=True), 1200)   # ไม่เกินที่ขอ
+            self.assertEqual(pmtu.choose_payload(sock, SERVER, 1200), 1200)
+        finally:
+            sock.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import aio
+from client_sr import SRClient
+from filesource import CompressedSource
+from proto import Packet, PacketType, parse_info
+from sessions import PreparingSession
+
+# server ที่บีบอัดไฟล์นานกว่า timeout ของ client ต้องส่ง INFO keepalive ให้ client รอต่อจนได้ไฟล์ครบ
+
+MEDIUM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'medium.txt')
+PREPARE_DELAY = 2.5   # นานกว่า timeout ของ client ด้านล่าง
+CLIENT_TIMEOUT = 1.5  # นานกว่า KEEPALIVE_INTERVAL และ RTO เริ่มต้นของ server (ช่วงส่ง DATA ก็หายได้)
+
+class FakeMux:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, raw, client, seq=None):
+        self.sent.append(raw)
+        return True
+
+    def send_error(self, client, msg):
+        self.sent.append(msg)
+
+class GatedSource:
+    # prepare() ค้างจนกว่า release.set()
+    def __init__(self):
+        self.release = threading.Event()
+        self.filename = 'gated'
+
+    def prepare(self):
+        self.release.wait(5)
+
+    def close(self):
+        pass
+
+class Built:
+    def __init__(self, source):
+        self.source = source
+        self.started = False
+
+    def start(self):
+        self.started = True
+
+class PreparingSessionTest(unittest.TestCase):
+    def test_keepalive_until_prepared(self):
+        mux, source = FakeMux(), GatedSource()
+        s = PreparingSession(mux, ('127.0.0.1', 1), source, Built, keepalive=0.5)
+        s.start()
+        try:
+            self.assertEqual(s.keepalives, 1)   # ส่งทันทีที่เริ่มบีบ
+            s.on_timer(s.next_keepalive - 0.01)
+            self.assertEqual(s.keepalives, 1)
+            s.on_timer(s.next_keepalive)
+            self.assertEqual(s.keepalives, 2)
+            pkt = Packet(PacketType.INFO, 0)
+            for raw in mux.sent:
+                self.assertTrue(pkt.load(memoryview(raw)))
+                self.assertEqual(pkt.type, PacketType.INFO)
+                self.assertEqual(parse_info(pkt.data), {'preparing': '1'})
+        finally:
+            source.release.set()
+        s.future.result(5)
+        s.on_timer(s.next_keepalive + 10)
+        self.assertTrue(s.session.started)
+        self.assertEqual(s.keepalives, 2)   # เตรียมเสร็จแล้วไม่ส่ง keepalive อีก
+
+def slow_prepare(self, _prepare=CompressedSource.prepare):
+    threading.Event().wait(PREPARE_DELAY)
+    _prepare(self)
+
+@mock.patch.object(CompressedSource, 'prepare', slow_prepare)
+class SlowPrepareTransferTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.save_as = os.path.join(self.tmp.name, 'out')
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+
+    def tearDown(self):
+        self.sock.close()
+        self.tmp.cleanup()
+
+    def assertReceived(self):
+        with open(MEDIUM, 'rb') as a, open(self.save_as, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_aio_client(self):
+        async def run():
+            server = asyncio.ensure_future(aio.send_file(0, 'gbn', sock=self.sock, idle_timeout=5))
+            ok = await aio.fetch_file('127.0.0.1', self.port, MEDIUM, self.save_as, 'gbn',
+                                      timeout=CLIENT_TIMEOUT, compress='zlib')
+            return ok, await server
+        self.assertEqual(asyncio.run(run()), (True, True))
+        self.assertReceived()
+
+    def test_sr_client(self):
+        result = []
+        server = threading.Thread(target=lambda: result.append(
+            asyncio.run(aio.send_file(0, 'sr', sock=self.sock, idle_timeout=5))))
+        server.start()
+        client = SRClient('127.0.0.1', self.port, timeout=0.2, compress='zlib', idle_timeout=CLIENT_TIMEOUT)
+        self.assertEqual(client.request(MEDIUM, self.save_as), 0)
+        server.join(10)
+        self.assertEqual(result, [True])
+        self.assertReceived()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from proto import (
+    MAX_SACK_BLOCKS, NO_RWND, Packet, PacketType, ack_payload, parse_ack_sack, parse_ack_window,
+    sack_blocks, sack_holes
+)
+
+# ACK ที่แนบ rwnd/SACK ต้องถอดกลับได้ค่าเดิมหลังผ่าน wire format (รวม checksum)
+
+# (rwnd, sack) -> (rwnd ที่อ่านได้, sack ที่อ่านได้)
+ACK_CASES = [
+    (None, [], None, []),
+    (16, [], 16, []),
+    (70000, [], NO_RWND, []),                      # rwnd เกิน 16 bit ถูกจำกัดที่ NO_RWND
+    (None, [(5, 6)], None, [(5, 6)]),              # SACK อย่างเดียว → rwnd = NO_RWND = ไม่จำกัด
+    (8, [(5, 6)], 8, [(5, 6)]),
+    (8, [(3, 5), (7, 9), (12, 20)], 8, [(3, 5), (7, 9), (12, 20)]),
+    (None, [(i * 10, i * 10 + 1) for i in range(MAX_SACK_BLOCKS)], None,
+     [(i * 10, i * 10 + 1) for i in range(MAX_SACK_BLOCKS)]),
+    (4, [(i * 10, i * 10 + 1) for i in range(MAX_SACK_BLOCKS + 2)], 4,   # ส่งได้ไม่เกิน MAX_SACK_BLOCKS
+     [(i * 10, i * 10 + 1) for i in range(MAX_SACK_BLOCKS)]),
+    (None, [(2 ** 32 - 2, 2 ** 32 - 1)], None, [(2 ** 32 - 2, 2 ** 32 - 1)]),
+]
+
+class AckPayloadTest(unittest.TestCase):
+    def test_round_trip(self):
+        for rwnd, sack, want_rwnd, want_sack in ACK_CASES:
+            with self.subTest(rwnd=rwnd, blocks=len(sack)):
+                raw = Packet(PacketType.ACK, 41, ack_payload(rwnd, sack)).to_bytes()
+                pkt = Packet(PacketType.DATA, 0)
+                self.assertTrue(pkt.load(memoryview(raw)))
+                self.assertEqual(pkt.type, PacketType.ACK)
+                self.assertEqual(pkt.seq_num, 41)
+                self.assertEqual(parse_ack_window(pkt.data), want_rwnd)
+                self.assertEqual([tuple(b) for b in parse_ack_sack(pkt.data)], want_sack)
+
+    def test_plain_ack_is_empty(self):
+        self.assertEqual(bytes(ack_payload()), b'')
+        self.assertEqual(parse_ack_sack(b''), [])
+
+    def test_explicit_no_rwnd_without_sack(self):
+        # NO_RWND ที่ประกาศเองโดยไม่มี SACK คือค่าหน้าต่างจริง (65535 packet)
+        self.assertEqual(parse_ack_window(ack_payload(NO_RWND)), NO_RWND)
+
+class SackBlocksTest(unittest.TestCase):
+    CASES = [
+        ([], []),
+        ([7], [(7, 8)]),
+        ([3, 4, 5], [(3, 6)]),
+        ([3, 4, 6, 7, 9], [(3, 5), (6, 8), (9, 10)]),
+        ([1, 3, 5, 7, 9, 11], [(1, 2), (3, 4), (5, 6), (7, 8)]),   # เก็บเฉพาะช่วงใกล้ ACK ที่สุด
+        ([1, 3, 5, 7, 8, 9], [(1, 2), (3, 4), (5, 6), (7, 10)]),   # ช่วงสุดท้ายยังต่อยาวได้
+    ]
+
+    def test_blocks(self):
+        for seqs, want in self.CASES:
+            with self.subTest(seqs=seqs):
+                self.assertEqual(sack_blocks(seqs), want)
+
+    def test_limit(self):
+        self.assertEqual(sack_blocks([1, 3, 5], limit=1), [(1, 2)])
+
+class SackHolesTest(unittest.TestCase):
+    # (base, hi, sacked, skip) -> seq ที่ต้องส่งซ้ำ
+    CASES = [
+        (0, 0, set(), (), []),
+        (0, 4, set(), (), [0, 1, 2, 3]),
+        (10, 15, {11, 13}, (), [10, 12, 14]),
+        (10, 15, {10, 11, 12, 13, 14}, (), []),
+        (10, 15, {13}, {10, 11}, [12, 14]),            # ช่องว่างที่ส่งซ้ำไปแล้วในช่วง recovery
+        (10, 13, {2, 3, 20}, (), [10, 11, 12]),        # SACK นอกช่วงไม่มีผล
+    ]
+
+    def test_holes(self):
+        for base, hi, sacked, skip, want in self.CASES:
+            with self.subTest(base=base, hi=hi, sacked=sacked, skip=skip):
+                self.assertEqual(sack_holes(base, hi, sacked, skip), want)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import random
+import tempfile
+import unittest
+
+from filehash import new_hash
+from writebehind import ALIGN, WriteBehind
+
+# write-behind ที่เริ่มเขียนกลางไฟล์ (ranged stream/รับต่อ) และจองพื้นที่ไว้ ต้องได้ไฟล์ยาวและเนื้อหาตรงทุก byte
+
+class WriteBehindOffsetTest(unittest.TestCase):
+    START = 3 * ALIGN + 123   # ไม่ลงตัวกับ ALIGN
+
+    def setUp(self):
+        rnd = random.Random(1019)
+        self.prefix = rnd.randbytes(self.START)
+        self.payload = rnd.randbytes(5 * ALIGN + 777)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'out.part')
+        with open(self.path, 'wb') as f:
+            f.write(self.prefix)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, threaded, prealloc):
+        digest = new_hash()
+        with open(self.path, 'r+b') as f:
+            f.seek(self.START)
+            wb = WriteBehind(f, ALIGN, threaded, digest=digest)
+            wb.preallocate(prealloc)
+            for i in range(0, len(self.payload), 1000):   # DATA ทีละ packet เล็กๆ
+                wb.write(self.payload[i:i + 1000])
+            wb.close()
+        self.assertEqual(wb.start, self.START)
+        self.assertEqual(wb.flushed, len(self.payload))
+        self.assertEqual(digest.digest(), self.hash_of(self.payload))   # hash เฉพาะส่วนที่เขียนผ่าน WriteBehind
+        return wb
+
+    @staticmethod
+    def hash_of(data):
+        h = new_hash()
+        h.update(data)
+        return h.digest()
+
+    def test_preallocate_offset(self):
+        final = self.START + len(self.payload)
+        for threaded in (False, True):
+            # จองพอดี, จองเกิน (ขนาดที่ INFO บอกมากกว่าที่ได้รับจริง) → ตัดให้จบที่ข้อมูลที่เขียน
+            for prealloc in (final, final + 10 * ALIGN):
+                with self.subTest(threaded=threaded, prealloc=prealloc):
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(self.START)
+                    wb = self.write(threaded, prealloc)
+                    self.assertEqual(wb.preallocated, prealloc)
+                    self.assertEqual(os.path.getsize(self.path), final)
+                    with open(self.path, 'rb') as f:
+                        self.assertEqual(f.read(), self.prefix + self.payload)
+
+if __name__ == '__main__':
+    unittest.main()
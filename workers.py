@@ -0,0 +1,92 @@
+import os
+import socket
+import multiprocessing
+
+# โหมดหลาย process: fork N worker ที่ bind port เดียวกันด้วย SO_REUSEPORT
+# kernel กระจาย datagram ตาม (ip, port) ของ client → client หนึ่งรายอยู่กับ worker เดิมตลอด
+# แต่ละ worker รัน SessionMux ของตัวเอง แล้วส่งสถิติ (mux.stats()) กลับมาให้ parent รวม
+
+def supported():
+    return hasattr(socket, 'SO_REUSEPORT') and 'fork' in multiprocessing.get_all_start_methods()
+
+def reuseport_socket(port, host=''):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+def _worker(idx, port, serve, results):
+    stats = {}
+    try:
+        sock = reuseport_socket(port)
+        try:
+            stats = serve(sock) or {}
+        finally:
+            sock.close()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        stats = {'error': repr(e)}
+    finally:
+        stats.update(worker=idx, pid=os.getpid())
+        results.put(stats)
+
+def run(n, port, serve):
+    # serve(sock) -> dict สถิติ ถูกเรียกใน worker แต่ละตัว
+    # สร้าง state ที่สุ่ม (เช่น ErrorSim) ภายใน serve เพื่อไม่ให้ทุก worker ได้ลำดับสุ่มเดียวกันหลัง fork
+    if not supported():
+        print("[server] SO_REUSEPORT/fork not available, running a single worker")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('', port))
+        try:
+            per_worker = [dict(serve(sock) or {}, worker=0, pid=os.getpid())]
+        finally:
+            sock.close()
+        report(per_worker)
+        return per_worker
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(i, port, serve, results)) for i in range(n)]
+    for p in procs:
+        p.start()
+
+    # worker ทุกตัวส่งผลกลับเสมอ (แม้ถูก Ctrl-C) จึงรอเก็บครบ n ชุดได้
+    per_worker = []
+    while len(per_worker) < n:
+        try:
+            per_worker.append(results.get())
+        except KeyboardInterrupt:
+            continue
+    for p in procs:
+        p.join()
+    per_worker.sort(key=lambda s: s['worker'])
+    report(per_worker)
+    return per_worker
+
+def aggregate(per_worker):
+    total = {}
+    for key in ('sessions', 'succeeded', 'sent_packets', 'sent_bytes', 'dropped', 'corrupted'):
+        total[key] = sum(s.get(key, 0) for s in per_worker)
+    starts = [s['first_request'] for s in per_worker if s.get('first_request')]
+    ends = [s['last_done'] for s in per_worker if s.get('last_done')]
+    total['elapsed'] = max(ends) - min(starts) if starts and ends else 0.0
+    return total
+
+def report(per_worker):
+    total = aggregate(per_worker)
+    print("========== WORKER STATS ==========")
+    for s in per_worker:
+        if 'error' in s:
+            print(f"worker {s['worker']} (pid {s['pid']}): error {s['error']}")
+            continue
+        print(f"worker {s['worker']} (pid {s['pid']}): sessions={s.get('sessions', 0)} "
+              f"ok={s.get('succeeded', 0)} max_concurrent={s.get('max_concurrent', 0)} "
+              f"packets={s.get('sent_packets', 0)} bytes={s.get('sent_bytes', 0):,}")
+    kbps = total['sent_bytes'] / total['elapsed'] / 1024 if total['elapsed'] > 0 else 0
+    print(f"Total sessions   : {total['sessions']} (ok={total['succeeded']})")
+    print(f"Sent packets     : {total['sent_packets']} (dropped={total['dropped']}, corrupted={total['corrupted']})")
+    print(f"Sent bytes       : {total['sent_bytes']:,}")
+    print(f"Elapsed          : {total['elapsed']:.2f}s")
+    print(f"Throughput       : {kbps:.2f} KB/s")
+    return total
@@ -0,0 +1,109 @@
+import os
+import queue
+import threading
+
+# write-behind buffer สำหรับฝั่งรับ: รวม DATA ขนาดเล็กเป็นการเขียนก้อนใหญ่ที่ลงตัวกับ ALIGN
+# (threaded=True → เขียนจริงใน thread แยก ไม่ให้ดิสก์ที่ช้าทำให้การรับ/ส่ง ACK สะดุด)
+# และจองพื้นที่ไฟล์ล่วงหน้าเมื่อรู้ขนาด (preallocate) ลดการขยายไฟล์ทีละนิดและ fragmentation
+# digest: hash object ที่สะสมข้อมูลไปพร้อมการเขียนแต่ละก้อน (ทำใน thread เขียนด้วยถ้า threaded)
+
+ALIGN = 64 * 1024
+BUFFER_SIZE = 1024 * 1024
+QUEUE_DEPTH = 8   # จำนวนก้อนที่รอเขียนได้สูงสุดในโหมด thread (เต็มแล้ว write() จะรอ)
+
+def preallocate(f, size):
+    # จองพื้นที่ไฟล์ size bytes (ถ้าระบบไม่รองรับ posix_fallocate ใช้ truncate แทน) คืน True ถ้าสำเร็จ
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+        return True
+    except OSError:
+        return False
+
+class WriteBehind:
+    def __init__(self, f, buffer_size=BUFFER_SIZE, threaded=False, digest=None):
+        self.f = f
+        self.start = f.tell()   # offset ที่เริ่มเขียน (ranged stream เขียนต่อกลางไฟล์)
+        self.digest = digest
+        self.buffer_size = max(ALIGN, buffer_size - buffer_size % ALIGN)
+        self._buf = bytearray()
+        self._queue = None
+        self._thread = None
+        self._error = None
+        if threaded:
+            self._queue = queue.Queue(QUEUE_DEPTH)
+            self._thread = threading.Thread(target=self._writer, daemon=True)
+            self._thread.start()
+
+        # สถิติ
+        self.bytes = 0
+        self.flushed = 0   # byte ที่ส่งให้ระบบปฏิบัติการแล้ว (ใช้บันทึก checkpoint)
+        self.writes = 0
+        self.preallocated = 0
+
+    def write(self, data):
+        self._buf += data
+        self.bytes += len(data)
+        if len(self._buf) >= self.buffer_size:
+            # เขียนเฉพาะส่วนที่ลงตัวกับ ALIGN เศษเก็บไว้รอบหน้า (offset ในไฟล์จึงลงตัวเสมอ)
+            n = len(self._buf) - len(self._buf) % ALIGN
+            self._submit(bytes(self._buf[:n]))
+            del self._buf[:n]
+        return len(data)
+
+    def preallocate(self, size):
+        # จองพื้นที่ไฟล์ให้ยาว size bytes ล่วงหน้า (ถ้าระบบไม่รองรับก็ข้ามไป) ขนาดจริงจะถูกตัดให้ตรงตอน close()
+        if size <= 0 or self.preallocated:
+            return
+        if preallocate(self.f, size):
+            self.preallocated = size
+
+    def _submit(self, block):
+        if self._error is not None:
+            raise self._error
+        self.writes += 1
+        if self._queue is not None:
+            self._queue.put(block)
+        else:
+            self._write(block)
+
+    def _write(self, block):
+        if self.digest is not None:
+            self.digest.update(block)
+        self.f.write(block)
+        self.f.flush()
+        self.flushed += len(block)
+
+    def _writer(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            if self._error is None:
+                try:
+                    self._write(block)
+                except OSError as e:
+                    self._error = e
+
+    def close(self):
+        # เขียนที่ค้างทั้งหมด รอ thread เขียนจบ แล้ว (ถ้าจองพื้นที่ไว้) ตัดไฟล์ให้จบที่ข้อมูลที่เขียนจริง
+        if self._buf:
+            self._submit(bytes(self._buf))
+            self._buf.clear()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+        self.f.flush()
+        end = self.start + self.bytes
+        if self.preallocated and self.preallocated != end:
+            self.f.truncate(end)
+
+    def summary(self):
+        avg = self.bytes / self.writes / 1024 if self.writes else 0
+        mode = 'thread' if self._queue is not None else 'inline'
+        return f"{self.writes} writes ({mode}), avg {avg:.0f} KB, preallocated {self.preallocated:,} bytes"